@@ -4,6 +4,7 @@ GUIアプリケーションを起動するためのメインプログラム
 
 from gui.views.main_view import MainWindow
 from gui.views.splash_view import SplashScreen
+from gui.workers.model_warmup_worker import ModelWarmupWorker
 from PySide6.QtCore import QTimer
 from PySide6.QtWidgets import QApplication
 import sys
@@ -46,6 +47,12 @@ def main() -> None:
 
     splash_window = SplashScreen()
     splash_window.show()
+
+    # スプラッシュ画面の表示中に推論モデルを読み込んでおく
+    warmup_worker = ModelWarmupWorker()
+    app.aboutToQuit.connect(warmup_worker.wait)
+    warmup_worker.start()
+
     window = MainWindow()
 
     QTimer.singleShot(SPLASH_SHOW_MS, window.show)
@@ -4,15 +4,27 @@ import cv2
 import numpy as np
 import time
 import logging
-from typing import Optional
+import threading
+from collections import deque
+from typing import Deque, List, Optional, Tuple
 
 
 class FrameCapture:
-    """フレームのキャプチャに関するクラス"""
+    """フレームのキャプチャに関するクラス
+
+    use_grabber を有効にすると、専用スレッドがカメラから常にフレームを読み込み、
+    取得時刻とともに直近 buffer_size 枚をリングバッファに保持する。
+    推論などの処理中もカメラの読み込みが止まらないため、古いフレームが返されることがない
+    """
+
+    GRAB_RETRY_INTERVAL = 0.01
+    GRAB_RETRY_MAX_INTERVAL = 0.5
 
     def __init__(
         self,
         device_num: int = 0,
+        use_grabber: bool = False,
+        buffer_size: int = 30,
     ) -> None:
 
         self.logger = logging.getLogger("__main__").getChild(__name__)
@@ -21,9 +33,117 @@ class FrameCapture:
         if not self.cap.isOpened():
             raise Exception("Failed to open camera.")
 
+        self._cap_lock = threading.Lock()
+        self._buffer: Deque[Tuple[int, float, np.ndarray]] = deque(maxlen=buffer_size)
+        self._buffer_cond = threading.Condition()
+        self._latest_seq = 0
+        self._is_grabbing = False
+        self._grab_thread: Optional[threading.Thread] = None
+
         # カメラに接続するまで待機
         time.sleep(0.1)
 
+        if use_grabber:
+            self.start_grabber()
+
+    def start_grabber(self) -> None:
+        """バックグラウンドでのフレーム読み込みを開始する"""
+        if self._is_grabbing:
+            return
+        self._is_grabbing = True
+        self._grab_thread = threading.Thread(target=self._grab_loop, daemon=True)
+        self._grab_thread.start()
+        self.logger.debug("Frame grabber started.")
+
+    def stop_grabber(self) -> None:
+        """バックグラウンドでのフレーム読み込みを停止する"""
+        if not self._is_grabbing:
+            return
+        self._is_grabbing = False
+        with self._buffer_cond:
+            self._buffer_cond.notify_all()
+        if self._grab_thread is not None:
+            self._grab_thread.join()
+            self._grab_thread = None
+        self.logger.debug("Frame grabber stopped.")
+
+    def _grab_loop(self) -> None:
+        """カメラからフレームを読み込み続け、リングバッファに追加する
+
+        読み込みに失敗した場合は待機時間を倍にしながら再試行し、ログは失敗し始めたときと回復したときだけ出力する
+        """
+        num_failures = 0
+        retry_interval = self.GRAB_RETRY_INTERVAL
+        while self._is_grabbing:
+            with self._cap_lock:
+                ret, frame = self.cap.read()
+            timestamp = time.time()
+
+            if not ret:
+                if num_failures == 0:
+                    self.logger.error("Failed to capture frame. Retrying...")
+                num_failures += 1
+                time.sleep(retry_interval)
+                retry_interval = min(retry_interval * 2, self.GRAB_RETRY_MAX_INTERVAL)
+                continue
+
+            if num_failures > 0:
+                self.logger.info(
+                    f"Frame capture recovered after {num_failures} failures"
+                )
+                num_failures = 0
+                retry_interval = self.GRAB_RETRY_INTERVAL
+
+            with self._buffer_cond:
+                self._latest_seq += 1
+                self._buffer.append((self._latest_seq, timestamp, frame))
+                self._buffer_cond.notify_all()
+
+    def get_latest_frame(self) -> Optional[Tuple[np.ndarray, float]]:
+        """バッファ内の最新のフレームを待たずに取得する
+
+        Returns:
+            Optional[Tuple[np.ndarray, float]]: フレームと取得時刻。フレームがない場合はNone
+        """
+        with self._buffer_cond:
+            if len(self._buffer) == 0:
+                return None
+            _, timestamp, frame = self._buffer[-1]
+            return frame, timestamp
+
+    def get_fresh_frames(
+        self, num_frames: int, timeout: float = 5.0
+    ) -> List[Tuple[np.ndarray, float]]:
+        """呼び出し以降に読み込まれたフレームを順に取得する
+
+        バッファに溜まっている古いフレームは使わず、新しいフレームが num_frames 枚そろうまで待機する
+
+        Args:
+            num_frames (int): 取得するフレーム数
+            timeout (float, optional): 最大の待機時間（秒）
+
+        Returns:
+            List[Tuple[np.ndarray, float]]: フレームと取得時刻のリスト。タイムアウトした場合はそれまでに取得できた分
+        """
+        frames: List[Tuple[np.ndarray, float]] = []
+        deadline = time.time() + timeout
+        with self._buffer_cond:
+            read_seq = self._latest_seq
+            while len(frames) < num_frames:
+                for seq, timestamp, frame in self._buffer:
+                    if seq > read_seq and len(frames) < num_frames:
+                        frames.append((frame, timestamp))
+                        read_seq = seq
+
+                remaining = deadline - time.time()
+                if len(frames) >= num_frames or not self._is_grabbing:
+                    break
+                if remaining <= 0:
+                    self.logger.error("Timed out waiting for frames")
+                    break
+                self._buffer_cond.wait(remaining)
+        return frames
+
     def show_camera_feed(self) -> None:
         """カメラフィードを表示する
 
@@ -44,8 +164,16 @@ class FrameCapture:
         cv2.waitKey(1)
 
     def capture(self) -> Optional[np.ndarray]:
-        """フレームを取得する"""
-        ret, frame = self.cap.read()
+        """フレームを取得する
+
+        バックグラウンドでの読み込み中は、呼び出し以降に読み込まれたフレームを返す
+        """
+        if self._is_grabbing:
+            frames = self.get_fresh_frames(1)
+            return frames[0][0] if len(frames) > 0 else None
+
+        with self._cap_lock:
+            ret, frame = self.cap.read()
         if ret:
             return frame
         else:
@@ -54,6 +182,7 @@ class FrameCapture:
 
     def release(self) -> None:
         """カメラリソースを解放する"""
+        self.stop_grabber()
         self.cap.release()
         cv2.destroyAllWindows()
 
@@ -67,8 +196,9 @@ class FrameCapture:
         Returns:
             tuple[float, float]: 設定された幅と高さ
         """
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        with self._cap_lock:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
         self.logger.debug(
             "set_cap_size called: {0} x {1}".format(
                 self.cap.get(cv2.CAP_PROP_FRAME_WIDTH),
@@ -0,0 +1,104 @@
+"""表示の変化を桁ごとに検出する機能
+
+数分に1回しか値が変わらない表示器を長時間解析する場合に、変化していない桁の推論を省くために使う
+"""
+
+from typing import Optional
+import logging
+import cv2
+import numpy as np
+
+logger = logging.getLogger("__main__").getChild(__name__)
+
+# 桁画像を比較する際の縮小サイズ
+SIGNATURE_SIZE = 16
+
+# 変化がなくても推論し直すまでの最大のサンプル数
+MAX_REUSE_SAMPLES = 30
+
+
+class DigitChangeDetector:
+    """二値化した桁画像を縮小したシグネチャを比較し、前回推論した時点から変化した桁を検出するクラス
+
+    比較の基準は最後に推論した時点のシグネチャとするため、少しずつ変化する場合も累積した変化で検出できる
+    """
+
+    def __init__(
+        self,
+        num_digits: int,
+        threshold: float,
+        signature_size: int = SIGNATURE_SIZE,
+        max_reuse_samples: int = MAX_REUSE_SAMPLES,
+    ) -> None:
+        """
+        Args:
+            num_digits (int): 桁数
+            threshold (float): 変化したとみなすシグネチャの画素の割合 (0-1)
+            signature_size (int, optional): シグネチャの縦横の大きさ
+            max_reuse_samples (int, optional): 変化がなくても推論し直すまでの最大のサンプル数。0の場合は推論し直さない
+        """
+        self.num_digits = num_digits
+        self.threshold = threshold
+        self.signature_size = signature_size
+        self.max_reuse_samples = max_reuse_samples
+        self._reference: Optional[np.ndarray] = None
+        self._reuse_counts = np.zeros(num_digits, dtype=np.int64)
+
+    def compute_signature(self, digit_images: np.ndarray) -> np.ndarray:
+        """桁ごとのシグネチャを計算する
+
+        サンプル内の全フレームの平均を縮小し、二値化する
+
+        Args:
+            digit_images (np.ndarray): CNNCore.prepare_batch の出力 (フレーム数 * num_digits, height, width, channels)
+
+        Returns:
+            np.ndarray: (num_digits, signature_size, signature_size) 形状のブール配列
+        """
+        _, height, width, channels = digit_images.shape
+        mean_images = digit_images.reshape(
+            -1, self.num_digits, height, width, channels
+        ).mean(axis=(0, 4), dtype=np.float32)
+        size = (self.signature_size, self.signature_size)
+        return np.stack(
+            [
+                cv2.resize(image, size, interpolation=cv2.INTER_AREA) > 0.5
+                for image in mean_images
+            ]
+        )
+
+    def detect(self, digit_images: np.ndarray) -> np.ndarray:
+        """前回推論した時点から変化した桁を検出する
+
+        変化した桁は推論されるものとして基準のシグネチャを更新する
+
+        Args:
+            digit_images (np.ndarray): CNNCore.prepare_batch の出力
+
+        Returns:
+            np.ndarray: (num_digits,) 形状の変化した桁を示すブール配列。初回は全ての桁がTrue
+        """
+        if len(digit_images) == 0:
+            return np.ones(self.num_digits, dtype=bool)
+
+        signature = self.compute_signature(digit_images)
+        if self._reference is None:
+            changed = np.ones(self.num_digits, dtype=bool)
+            self._reference = signature
+        else:
+            diff_rates = np.count_nonzero(signature != self._reference, axis=(1, 2)) / (
+                self.signature_size**2
+            )
+            changed = diff_rates > self.threshold
+            if self.max_reuse_samples > 0:
+                changed |= self._reuse_counts >= self.max_reuse_samples
+            self._reference[changed] = signature[changed]
+
+        self._reuse_counts[changed] = 0
+        self._reuse_counts[~changed] += 1
+        return changed
+
+    def reset(self) -> None:
+        """基準のシグネチャを破棄し、次回は全ての桁を変化したとみなす"""
+        self._reference = None
+        self._reuse_counts[:] = 0
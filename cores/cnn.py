@@ -1,9 +1,15 @@
 """CNNを使用した7セグメント数字認識機能"""
 
 from cores.detector import Detector
+from cores.inference_options import resolve_inference_options
 import os
+import re
 import logging
-from typing import Optional, Union, List, Tuple, Any
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Union, List, Tuple, Any, Dict, Sequence, Iterable
+from pathlib import Path
 import cv2
 import numpy as np
 
@@ -12,12 +18,36 @@ os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 logging.getLogger("tensorflow").setLevel(logging.ERROR)
 logging.getLogger("h5py").setLevel(logging.ERROR)
 
+MODEL_DIR = Path(__file__).resolve().parent / ".." / "model"
+
+# 入力サイズを含むモデルファイル名 (model_{height}x{width}*)
+MODEL_SIZE_PATTERN = re.compile(r"^model_(\d+)x(\d+)")
+
+# 確率による早期終了の判定に必要な最小のフレーム数
+EARLY_EXIT_MIN_FRAMES = 3
+
+# 推論結果のキャッシュのキーにする桁画像の縮小サイズ
+CACHE_FINGERPRINT_SIZE = 16
+
+# 確率の対数を取る際の下限
+LOG_PROB_EPS = 1e-7
+
 
 class CNNCore(Detector):
     """CNNを使用した7セグメント数字認識のための基底クラス"""
 
-    def __init__(self, num_digits: int) -> None:
+    def __init__(
+        self, num_digits: int, inference_options: Optional[Dict[str, Any]] = None
+    ) -> None:
         self.num_digits = num_digits
+        self.inference_options = resolve_inference_options(inference_options)
+        self.last_used_frames = 0  # 直前の推論で実際に推論したフレーム数
+        self.last_confidences: List[float] = []  # 直前の推論の桁ごとの確信度
+        self.last_entropies: List[float] = []  # 直前の推論の桁ごとのエントロピー
+        # 直前の推論の桁ごとのクラス番号、エラー率、確信度、エントロピー
+        self._last_digits: Optional[
+            Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+        ] = None
         self.model: Optional[Any]
 
         self.logger = logging.getLogger("__main__").getChild(__name__)
@@ -30,6 +60,114 @@ class CNNCore(Detector):
         self.color_setting = 1  # 学習済みモデルと同じ画像のカラー設定にする。モノクロ・グレースケールの場合は「1」。カラーの場合は「3」
         self.cv2_color_setting = 0  # 同上。cv2.imreadではモノクロ・グレースケールの場合は「0」。カラーの場合は「1」
         self.crop_size = 100  # 画像をトリミングするサイズ
+        self.denoise_ksize = 9  # ノイズ除去のメディアンフィルタの大きさ
+
+        # 前処理の作業用バッファ。スレッドごとに形状別に確保して使い回す
+        self._buffers = threading.local()
+
+        # フィンガープリントをキーとする推論結果の LRU キャッシュ
+        self._cache: OrderedDict[bytes, np.ndarray] = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._block_mean_weights: Dict[int, np.ndarray] = {}
+
+        # モデルは最初の推論時に読み込む
+        self._model_lock = threading.RLock()
+        self._is_model_loaded = False
+        self._is_model_loading = False
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def set_input_shape(self, input_shape: Sequence[Any]) -> None:
+        """モデルの入力形状に合わせて前処理の画像サイズを設定する
+
+        ノイズ除去の窓の大きさは 100x100 のときの 9 を基準に、画像サイズに比例させる。
+        形状が不明な場合は既定の 100x100 のままにする
+
+        Args:
+            input_shape (Sequence[Any]): モデルの入力形状 (N, height, width, channels)
+        """
+        _, height, width, channels = input_shape
+        if not all(
+            isinstance(x, (int, np.integer)) and x > 0
+            for x in (height, width, channels)
+        ):
+            self.logger.warning(
+                f"Unknown model input shape: {input_shape}. Using {self.image_width}x{self.image_height}."
+            )
+            return
+
+        self.image_height = int(height)
+        self.image_width = int(width)
+        self.color_setting = int(channels)
+        self.cv2_color_setting = 0 if self.color_setting == 1 else 1
+        self.crop_size = self.image_width
+        self.denoise_ksize = max(3, round(9 * self.crop_size / 100) // 2 * 2 + 1)
+        self.logger.debug(
+            f"Model input size: {self.image_width}x{self.image_height}x{self.color_setting}"
+        )
+
+    def set_input_shape_from_filename(self, model_filename: str) -> bool:
+        """モデルファイル名 (model_{height}x{width}*) から前処理の画像サイズを設定する
+
+        モデルを読み込む前に切り出しサイズを決めるために使う。チャンネル数はグレースケールとみなす
+
+        Args:
+            model_filename (str): モデルファイル名
+
+        Returns:
+            bool: ファイル名から入力サイズが分かった場合はTrue
+        """
+        match = MODEL_SIZE_PATTERN.match(Path(model_filename).name)
+        if match is None:
+            return False
+        self.set_input_shape((None, int(match.group(1)), int(match.group(2)), 1))
+        return True
+
+    def ensure_model_loaded(self) -> None:
+        """モデルが読み込まれていなければ読み込み、ダミーの入力で1回推論してグラフを初期化する
+
+        推論ランタイムの import とモデルの読み込みは時間がかかるため、最初の推論まで遅らせる。
+        読み込み中に他のスレッドから呼ばれた場合は、初期化が終わるまで待機する
+        """
+        if self._is_model_loaded:
+            return
+        with self._model_lock:
+            # 初期化中の推論からの呼び出しはそのまま返す
+            if self._is_model_loaded or self._is_model_loading:
+                return
+            self._is_model_loading = True
+            try:
+                self._load_model()
+                self._warm_up()
+                self._is_model_loaded = True
+            finally:
+                self._is_model_loading = False
+
+    def _warm_up(self) -> None:
+        """ダミーの入力で1回推論し、推論ランタイムのグラフやメモリを初期化する"""
+        start = time.perf_counter()
+        self.inference_batch(
+            np.zeros(
+                (
+                    self.num_digits,
+                    self.image_height,
+                    self.image_width,
+                    self.color_setting,
+                ),
+                dtype=np.float32,
+            )
+        )
+        self.logger.debug(f"Warm-up took {time.perf_counter() - start:.3f} sec")
+
+    def _load_model(self) -> None:
+        """推論ランタイムを import してモデルを読み込む
+
+        このメソッドはサブクラスで実装する必要がある
+
+        Raises:
+            NotImplementedError: サブクラスで実装されていない場合
+        """
+        raise NotImplementedError("This method must be implemented in the subclass")
 
     def inference_7seg_classifier(self, image_bin: np.ndarray) -> List[int]:
         """画像から7セグメント数字を推論する
@@ -37,14 +175,133 @@ class CNNCore(Detector):
         Args:
             image_bin (np.ndarray): 推論対象の画像
 
+        Returns:
+            List[int]: 各桁の推論結果
+        """
+        # 各桁に分割
+        preprocessed_images = self.preprocess_image(image_bin)
+
+        # 各行に対して最大値のインデックスを取得
+        return self.inference_batch(preprocessed_images).argmax(axis=1)
+
+    def inference_batch(self, images: np.ndarray) -> np.ndarray:
+        """前処理済みの桁画像をまとめて推論する
+
+        Args:
+            images (np.ndarray): (N, height, width, channels) 形状の桁画像
+
         Raises:
             NotImplementedError: サブクラスで実装されていない場合
 
         Returns:
-            List[int]: 各桁の推論結果
+            np.ndarray: (N, num_classes) 形状の各クラスの確率
         """
         raise NotImplementedError("This method must be implemented in the subclass")
 
+    def inference_cached(self, images: np.ndarray) -> np.ndarray:
+        """推論結果のキャッシュを使って桁画像をまとめて推論する
+
+        桁画像を縮小して二値化したフィンガープリントをキーに、各クラスの確率を LRU キャッシュに保存する。
+        キャッシュにない桁画像のうち、フィンガープリントが同じものは1回だけ推論する。
+        cache_size が 0 の場合は inference_batch と同じ
+
+        Args:
+            images (np.ndarray): (N, height, width, channels) 形状の桁画像
+
+        Returns:
+            np.ndarray: (N, num_classes) 形状の各クラスの確率
+        """
+        cache_size = self.inference_options["cache_size"]
+        if cache_size == 0 or len(images) == 0:
+            return self.inference_batch(images)
+
+        keys = self.compute_fingerprints(images)
+        probs = np.empty((len(keys), len(self.folder)), dtype=np.float32)
+        misses: Dict[bytes, List[int]] = {}
+        with self._cache_lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is None:
+                    misses.setdefault(key, []).append(i)
+                else:
+                    self._cache.move_to_end(key)
+                    probs[i] = cached
+            num_misses = sum(len(indices) for indices in misses.values())
+            self.cache_hits += len(keys) - num_misses
+            self.cache_misses += num_misses
+
+        if misses:
+            first_indices = [indices[0] for indices in misses.values()]
+            miss_probs = self.inference_batch(images[first_indices])
+            with self._cache_lock:
+                for (key, indices), p in zip(misses.items(), miss_probs):
+                    self._cache[key] = p.copy()
+                    probs[indices] = p
+                while len(self._cache) > cache_size:
+                    self._cache.popitem(last=False)
+
+        return probs
+
+    def compute_fingerprints(self, images: np.ndarray) -> List[bytes]:
+        """桁画像をブロックごとに平均して縮小・二値化し、ビット列に詰めたフィンガープリントを計算する
+
+        縮小は行方向と列方向の平均化行列の積で全桁をまとめて行う
+
+        Args:
+            images (np.ndarray): (N, height, width, channels) 形状の桁画像
+
+        Returns:
+            List[bytes]: 桁画像ごとのフィンガープリント
+        """
+        _, height, width, channels = images.shape
+        row_weights = self._get_block_mean_weights(height)
+        col_weights = self._get_block_mean_weights(width)
+        gray = images[..., 0] if channels == 1 else images.mean(axis=3)
+        small = row_weights @ gray @ col_weights.T
+        bits = np.packbits(small.reshape(len(images), -1) > 0.5, axis=1)
+        return [row.tobytes() for row in bits]
+
+    def _get_block_mean_weights(self, length: int) -> np.ndarray:
+        """長さ length の軸を CACHE_FINGERPRINT_SIZE 個のブロックの平均に縮小する行列を取得する
+
+        Args:
+            length (int): 縮小前の長さ
+
+        Returns:
+            np.ndarray: (CACHE_FINGERPRINT_SIZE, length) 形状の行列
+        """
+        weights = self._block_mean_weights.get(length)
+        if weights is None:
+            bounds = (
+                np.arange(CACHE_FINGERPRINT_SIZE + 1) * length // CACHE_FINGERPRINT_SIZE
+            )
+            weights = np.zeros((CACHE_FINGERPRINT_SIZE, length), dtype=np.float32)
+            for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+                weights[i, start:end] = 1 / max(end - start, 1)
+            self._block_mean_weights[length] = weights
+        return weights
+
+    def get_cache_info(self) -> Dict[str, int]:
+        """推論結果のキャッシュの状態を取得する
+
+        Returns:
+            Dict[str, int]: ヒット数、ミス数、保存されている件数、最大の件数
+        """
+        with self._cache_lock:
+            return {
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+                "size": len(self._cache),
+                "max_size": self.inference_options["cache_size"],
+            }
+
+    def clear_cache(self) -> None:
+        """推論結果のキャッシュと統計を破棄する"""
+        with self._cache_lock:
+            self._cache.clear()
+            self.cache_hits = 0
+            self.cache_misses = 0
+
     def preprocess_image(self, image: np.ndarray) -> np.ndarray:
         """画像を準備する
 
@@ -56,22 +313,12 @@ class CNNCore(Detector):
         Returns:
             np.ndarray: 画像の準備結果
         """
-        images = []
-        for index in range(self.num_digits):
-            # 画像を一桁にトリミング
-            img = image[
-                0 : self.crop_size,
-                index * self.crop_size : (index + 1) * self.crop_size,
-            ]
-            img = cv2.resize(img, (self.image_width, self.image_height))
-            img_ = (
-                img.reshape(
-                    self.image_width, self.image_height, self.color_setting
-                ).astype("float32")
-                / 255
-            )
-            images.append(img_)
-        return np.array(images, dtype=np.float32)
+        images = np.empty(
+            (self.num_digits, self.image_height, self.image_width, self.color_setting),
+            dtype=np.float32,
+        )
+        self._write_digits(image, images)
+        return images
 
     def predict(
         self,
@@ -87,43 +334,430 @@ class CNNCore(Detector):
         Returns:
             tuple[int, float]: 推論結果とエラー率
         """
+        if not self.inference_options["early_exit"]:
+            return self.predict_prepared(self.prepare_batch(images, binarize_th))
+
+        # 早期終了する場合は、前処理も推論に必要な分だけ行う
+        images_: List[Any] = images if isinstance(images, list) else [images]
+        step = self.inference_options["micro_batch_frames"]
+        batches = (
+            (
+                len(images_[i : i + step]),
+                self.prepare_batch(images_[i : i + step], binarize_th),
+            )
+            for i in range(0, len(images_), step)
+        )
+        return self._predict_early_exit(batches, len(images_))
+
+    def predict_with_confidence(
+        self,
+        images: Union[str, np.ndarray, List[np.ndarray], List[str]],
+        binarize_th: Optional[int] = None,
+    ) -> Tuple[int, float, List[float], List[float]]:
+        """画像のリストから7セグメント数字を推論し、桁ごとの確信度とエントロピーも返す
 
+        Args:
+            images (Union[str, np.ndarray, List[np.ndarray], List[str]]): 推論対象の画像またはパスのリスト
+            binarize_th (Optional[int], optional): 二値化の閾値。Noneの場合は自動設定。デフォルトはNone。
+
+        Returns:
+            Tuple[int, float, List[float], List[float]]: 推論結果、エラー率、桁ごとの確信度、桁ごとのエントロピー
+        """
+        result, failed_rate = self.predict(images, binarize_th)
+        return result, failed_rate, self.last_confidences, self.last_entropies
+
+    def prepare_batch(
+        self,
+        images: Union[str, np.ndarray, List[np.ndarray], List[str]],
+        binarize_th: Optional[int] = None,
+    ) -> np.ndarray:
+        """画像のリストを二値化し、全フレームの全桁を1つの入力テンソルにまとめる
+
+        Args:
+            images (Union[str, np.ndarray, List[np.ndarray], List[str]]): 推論対象の画像またはパスのリスト
+            binarize_th (Optional[int], optional): 二値化の閾値。Noneの場合は自動設定。デフォルトはNone。
+
+        Returns:
+            np.ndarray: (フレーム数 * num_digits, height, width, channels) 形状の桁画像
+        """
         images_ = images if isinstance(images, list) else [images]
 
-        results = np.zeros((0, self.num_digits))
+        # 全フレームの桁画像を書き込む入力テンソル。後段の推論と並行して使われるため毎回確保する
+        digit_images = np.empty(
+            (
+                len(images_) * self.num_digits,
+                self.image_height,
+                self.image_width,
+                self.color_setting,
+            ),
+            dtype=np.float32,
+        )
 
+        num_prepared = 0
         for image in images_:
+            image_bin = self._binarize(image, binarize_th)
+            if image_bin is None:
+                self.logger.error("Error: Could not read image file.")
+                continue
 
-            image_gs = self.load_image(image)
+            start = num_prepared * self.num_digits
+            self._write_digits(image_bin, digit_images[start : start + self.num_digits])
+            num_prepared += 1
+
+        return digit_images[: num_prepared * self.num_digits]
+
+    def _get_buffer(self, name: str, shape: Tuple[int, ...]) -> np.ndarray:
+        """前処理の作業用の uint8 バッファを取得する
+
+        同じスレッドで同じ形状のバッファを要求した場合は前回のバッファを返す
+
+        Args:
+            name (str): バッファの用途
+            shape (Tuple[int, ...]): バッファの形状
+
+        Returns:
+            np.ndarray: 作業用バッファ
+        """
+        buffers = getattr(self._buffers, "buffers", None)
+        if buffers is None:
+            buffers = self._buffers.buffers = {}
+        key = (name, shape)
+        if key not in buffers:
+            buffers[key] = np.empty(shape, dtype=np.uint8)
+        return buffers[key]
+
+    def _binarize(
+        self, image: Union[str, np.ndarray], binarize_th: Optional[int]
+    ) -> Optional[np.ndarray]:
+        """1フレームをグレースケール化、リサイズ、二値化、ノイズ除去する
+
+        preprocess_binarization と同じ処理を、作業用バッファを使い回して行う
+
+        Args:
+            image (Union[str, np.ndarray]): 画像のパスまたは画像データ
+            binarize_th (Optional[int]): 二値化の閾値。Noneの場合は大津の2値化を行う
+
+        Returns:
+            Optional[np.ndarray]: (crop_size, crop_size * num_digits) 形状の二値画像。読み込みに失敗した場合はNone。
+                返り値は作業用バッファのため、次の呼び出しで上書きされる
+        """
+        size = (self.crop_size, self.crop_size * self.num_digits)
 
+        if isinstance(image, np.ndarray) and image.ndim == 3:
+            image_gs = cv2.cvtColor(
+                image, cv2.COLOR_BGR2GRAY, dst=self._get_buffer("gray", image.shape[:2])
+            )
+        else:
+            image_gs = self.load_image(image)
             if image_gs is None:
-                self.logger.error("Error: Could not read image file.")
-                continue
+                return None
 
+        if image_gs.shape != size:
             image_gs = cv2.resize(
-                image_gs, (self.crop_size * self.num_digits, self.crop_size)
+                image_gs, size[::-1], dst=self._get_buffer("resized", size)
+            )
+
+        image_bin = self._get_buffer("binary", size)
+        if binarize_th is None:
+            # 大津の2値化
+            cv2.threshold(
+                image_gs, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=image_bin
+            )
+        else:
+            cv2.threshold(image_gs, binarize_th, 255, cv2.THRESH_BINARY, dst=image_bin)
+
+        # 二値画像の白画素数だけで黒画素が多いかを判定し、背景が黒になるよう反転する
+        if cv2.countNonZero(image_bin) * 2 < image_bin.size:
+            cv2.bitwise_not(image_bin, dst=image_bin)
+
+        # ノイズ除去
+        image_denoised = self._get_buffer("denoised", size)
+        ksize = self.denoise_ksize
+        if ksize > 15:
+            return cv2.medianBlur(image_bin, ksize, dst=image_denoised)
+
+        # 二値画像ではメディアンフィルタは窓内の白画素が過半数かどうかと等しいため、
+        # 高速な平均フィルタと閾値処理で medianBlur と同じ結果を得る (uint8 の丸めで区別できるのは ksize <= 15)
+        cv2.blur(
+            image_bin,
+            (ksize, ksize),
+            dst=image_denoised,
+            borderType=cv2.BORDER_REPLICATE,
+        )
+        cv2.threshold(image_denoised, 127, 255, cv2.THRESH_BINARY, dst=image_denoised)
+        return image_denoised
+
+    def _write_digits(self, image_bin: np.ndarray, out: np.ndarray) -> None:
+        """二値画像を桁ごとに分割し、正規化して入力テンソルに書き込む
+
+        Args:
+            image_bin (np.ndarray): (crop_size, crop_size * num_digits) 形状の二値画像
+            out (np.ndarray): (num_digits, height, width, channels) 形状の書き込み先
+        """
+        if (
+            self.color_setting == 1
+            and self.crop_size == self.image_height == self.image_width
+            and image_bin.shape[1] == self.crop_size * self.num_digits
+        ):
+            # 桁の切り出しとリサイズが不要な場合は、桁ごとの画像のビューから直接書き込む
+            digits = image_bin[: self.crop_size].reshape(
+                self.crop_size, self.num_digits, self.crop_size
+            )
+            np.divide(digits.transpose(1, 0, 2), np.float32(255), out=out[..., 0])
+            return
+
+        for index in range(self.num_digits):
+            # 画像を一桁にトリミング
+            img = image_bin[
+                0 : self.crop_size,
+                index * self.crop_size : (index + 1) * self.crop_size,
+            ]
+            if img.shape[:2] != (self.image_height, self.image_width):
+                img = cv2.resize(img, (self.image_width, self.image_height))
+            np.divide(
+                img.reshape(self.image_height, self.image_width, self.color_setting),
+                np.float32(255),
+                out=out[index],
+            )
+
+    def predict_prepared(self, digit_images: np.ndarray) -> tuple[int, float]:
+        """prepare_batch で前処理した桁画像から7セグメント数字を推論する
+
+        モデルの呼び出しは1回にまとめて行う。early_exit が有効な場合は数フレームずつ推論し、結果が確定した時点で終了する
+
+        Args:
+            digit_images (np.ndarray): prepare_batch の出力
+
+        Returns:
+            tuple[int, float]: 推論結果とエラー率
+        """
+        if self.inference_options["early_exit"]:
+            step = self.inference_options["micro_batch_frames"] * self.num_digits
+            batches = (
+                (
+                    len(digit_images[i : i + step]) // self.num_digits,
+                    digit_images[i : i + step],
+                )
+                for i in range(0, len(digit_images), step)
+            )
+            return self._predict_early_exit(
+                batches, len(digit_images) // self.num_digits
+            )
+
+        if len(digit_images) > 0:
+            probs = self.inference_cached(digit_images).reshape(
+                -1, self.num_digits, len(self.folder)
             )
+        else:
+            probs = np.zeros((0, self.num_digits, len(self.folder)), dtype=np.float32)
+        return self._aggregate(probs)
+
+    def _predict_early_exit(
+        self, batches: Iterable[Tuple[int, np.ndarray]], num_frames: int
+    ) -> tuple[int, float]:
+        """数フレームずつ推論し、全ての桁の結果が確定した時点で残りのフレームを推論せずに終了する
+
+        各桁について、次のいずれかを満たした場合に確定とみなす
+
+        - 1位のクラスの票数が、2位の票数と残りのフレーム数の和より多い（残りで逆転できない）。aggregation が "vote" の場合のみ
+        - EARLY_EXIT_MIN_FRAMES 枚以上で全フレームの結果が一致し、1位のクラスの平均確率が early_exit_confidence 以上
+
+        Args:
+            batches (Iterable[Tuple[int, np.ndarray]]): 元のフレーム数と前処理済みの桁画像の組
+            num_frames (int): 全体のフレーム数
+
+        Returns:
+            tuple[int, float]: 推論結果とエラー率（推論したフレームにおける割合）
+        """
+        num_classes = len(self.folder)
+        counts = np.zeros((self.num_digits, num_classes), dtype=np.int64)
+        prob_sums = np.zeros((self.num_digits, num_classes), dtype=np.float64)
+        batch_probs = []
+        num_seen = 0
+        for num_batch_frames, digit_images in batches:
+            num_seen += num_batch_frames
+            if len(digit_images) == 0:
+                continue
 
-            image_bin = self.preprocess_binarization(
-                image_gs, binarize_th, output_grayscale=True
+            probs = self.inference_cached(digit_images).reshape(
+                -1, self.num_digits, num_classes
+            )
+            predictions = probs.argmax(axis=2)
+            batch_probs.append(probs)
+            counts += (predictions[..., np.newaxis] == np.arange(num_classes)).sum(
+                axis=0
             )
+            prob_sums += probs.sum(axis=0)
+
+            if self._is_settled(counts, prob_sums, num_frames - num_seen):
+                break
+
+        self.logger.debug(
+            f"Early exit: inferred {sum(len(p) for p in batch_probs)} of {num_frames} frames"
+        )
+        return self._aggregate(
+            np.concatenate(batch_probs)
+            if batch_probs
+            else np.zeros((0, self.num_digits, num_classes), dtype=np.float32)
+        )
 
-            argmax_indices = self.inference_7seg_classifier(image_bin)
+    def _is_settled(
+        self, counts: np.ndarray, prob_sums: np.ndarray, num_remaining: int
+    ) -> bool:
+        """全ての桁の多数決の結果が確定したかどうかを判定する
 
-            results = np.vstack([results, argmax_indices])
+        Args:
+            counts (np.ndarray): (num_digits, num_classes) 形状の各クラスの票数
+            prob_sums (np.ndarray): (num_digits, num_classes) 形状の各クラスの確率の合計
+            num_remaining (int): 未推論のフレーム数
 
-        # 最頻値を取得
-        result, errors_per_digit = self.find_mode_per_column_np(results)
+        Returns:
+            bool: 全ての桁の結果が確定した場合はTrue
+        """
+        sorted_counts = np.sort(counts, axis=1)
+        if self.inference_options["aggregation"] == "vote":
+            is_unbeatable = sorted_counts[:, -1] - sorted_counts[:, -2] > num_remaining
+        else:
+            # 確率で集約する場合は票数では結果が確定しない
+            is_unbeatable = np.zeros(self.num_digits, dtype=bool)
+
+        confidence_th = self.inference_options["early_exit_confidence"]
+        num_used = int(counts[0].sum())
+        if confidence_th > 0 and num_used >= EARLY_EXIT_MIN_FRAMES:
+            leaders = counts.argmax(axis=1)
+            is_unanimous = sorted_counts[:, -1] == num_used
+            confidence = prob_sums[np.arange(self.num_digits), leaders] / num_used
+            is_unbeatable |= is_unanimous & (confidence >= confidence_th)
+
+        return bool(np.all(is_unbeatable))
+
+    def predict_changed(
+        self, digit_images: np.ndarray, changed_digits: np.ndarray
+    ) -> tuple[int, float]:
+        """prepare_batch で前処理した桁画像のうち、変化した桁だけを推論する
+
+        変化していない桁は前回の推論結果、エラー率、確信度、エントロピーをそのまま使う。
+        前回の結果がない場合や全ての桁が変化した場合は predict_prepared と同じ
+
+        Args:
+            digit_images (np.ndarray): prepare_batch の出力
+            changed_digits (np.ndarray): (num_digits,) 形状の変化した桁を示すブール配列
+
+        Returns:
+            tuple[int, float]: 推論結果とエラー率
+        """
+        if self._last_digits is None or np.all(changed_digits):
+            return self.predict_prepared(digit_images)
+
+        labels, errors_per_digit, confidences, entropies = (
+            x.copy() for x in self._last_digits
+        )
+        self.last_used_frames = 0
+        num_changed = int(np.count_nonzero(changed_digits))
+        if num_changed > 0 and len(digit_images) > 0:
+            input_shape = digit_images.shape[1:]
+            changed_images = digit_images.reshape(-1, self.num_digits, *input_shape)[
+                :, changed_digits
+            ].reshape(-1, *input_shape)
+            probs = self.inference_cached(changed_images).reshape(
+                -1, num_changed, len(self.folder)
+            )
+            self.last_used_frames = len(probs)
+            (
+                labels[changed_digits],
+                errors_per_digit[changed_digits],
+                confidences[changed_digits],
+                entropies[changed_digits],
+            ) = self._aggregate_digits(probs)
+
+        self.logger.debug(f"Reused digits: {np.flatnonzero(~changed_digits)}")
+        return self._set_result(labels, errors_per_digit, confidences, entropies)
+
+    def _aggregate(self, probs: np.ndarray) -> tuple[int, float]:
+        """各フレームの推論確率を桁ごとに集約する
+
+        Args:
+            probs (np.ndarray): (フレーム数, num_digits, クラス数) 形状の推論確率
+
+        Returns:
+            tuple[int, float]: 推論結果とエラー率
+        """
+        self.last_used_frames = len(probs)
+        return self._set_result(*self._aggregate_digits(probs))
+
+    def _aggregate_digits(
+        self, probs: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """各フレームの推論確率を桁ごとに集約する
+
+        集約方法は aggregation の設定に従う。
+        エラー率は各フレームの推論結果が集約結果と一致しない割合とする。
+        確信度は集約結果の平均確率、エントロピーは平均確率分布のエントロピー（nat）とする
+
+        Args:
+            probs (np.ndarray): (フレーム数, 桁数, クラス数) 形状の推論確率
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: 桁ごとのクラス番号、エラー率、確信度、エントロピー
+        """
+        num_frames, num_digits, num_classes = probs.shape
+        predictions = probs.argmax(axis=2)
+
+        aggregation = self.inference_options["aggregation"]
+        if aggregation == "vote" or num_frames == 0:
+            # 最頻値を取得
+            labels, errors_per_digit = self.find_mode_per_column_np(predictions)
+        else:
+            if aggregation == "mean":
+                scores = probs.sum(axis=0)
+            else:
+                scores = np.log(np.clip(probs, LOG_PROB_EPS, 1)).sum(axis=0)
+            labels = scores.argmax(axis=1)
+            errors_per_digit = np.mean(predictions != labels, axis=0)
+
+        mean_probs = (
+            probs.mean(axis=0, dtype=np.float64)
+            if num_frames > 0
+            else np.full((num_digits, num_classes), 1 / num_classes)
+        )
+        confidences = mean_probs[np.arange(num_digits), labels]
+        entropies = -np.sum(
+            mean_probs * np.log(np.clip(mean_probs, LOG_PROB_EPS, 1)), axis=1
+        )
+        return labels, errors_per_digit, confidences, entropies
+
+    def _set_result(
+        self,
+        labels: np.ndarray,
+        errors_per_digit: np.ndarray,
+        confidences: np.ndarray,
+        entropies: np.ndarray,
+    ) -> tuple[int, float]:
+        """桁ごとの集約結果を保存し、推論結果とエラー率に変換する
+
+        Args:
+            labels (np.ndarray): 桁ごとのクラス番号
+            errors_per_digit (np.ndarray): 桁ごとのエラー率
+            confidences (np.ndarray): 桁ごとの確信度
+            entropies (np.ndarray): 桁ごとのエントロピー
+
+        Returns:
+            tuple[int, float]: 推論結果とエラー率
+        """
+        self._last_digits = (labels, errors_per_digit, confidences, entropies)
+        self.last_confidences = confidences.tolist()
+        self.last_entropies = entropies.tolist()
 
         # 最後にラベルに対応させる
-        result_digits = self.folder[result.astype(int)]
+        result_digits = self.folder[labels.astype(int)]
         result_str = "".join(result_digits)
         result_int = int(result_str) if result_str != "" else 0
 
         failed_rate = np.mean(errors_per_digit)
 
-        self.logger.debug("Detected label: %s", result)
+        self.logger.debug("Detected label: %s", labels)
         self.logger.debug("Error: %s", failed_rate)
+        self.logger.debug("Confidence: %s", self.last_confidences)
         return result_int, failed_rate
 
     def find_mode_per_column_np(
@@ -131,74 +765,87 @@ class CNNCore(Detector):
     ) -> Tuple[np.ndarray, np.ndarray]:
         """各列の最頻値を取得する
 
+        全桁をまとめて各クラスの出現回数を数え、ループを使わずに最頻値を求める。
+        出現回数が同じ場合は小さいクラスを優先する
+
         Args:
             predictions (np.ndarray): 推論結果の配列
 
         Returns:
             Tuple[np.ndarray, np.ndarray]: 最頻値の配列と各桁のエラー率の配列
         """
-        result = []
-        errors_per_digit = []
-        for i in range(predictions.shape[1]):  # 各桁に対して
-            digit_predictions = predictions[:, i]  # 各列を抽出
+        num_samples, num_columns = predictions.shape
+        num_classes = len(self.folder)
 
-            values, counts = np.unique(digit_predictions, return_counts=True)
-            mode_value = values[np.argmax(counts)]  # 最も頻出する値を取得
+        # 列ごとにクラス番号をずらして1回の bincount で全列の出現回数を数える
+        offsets = np.arange(num_columns) * num_classes
+        counts = np.bincount(
+            (predictions.astype(np.intp) + offsets).ravel(),
+            minlength=num_columns * num_classes,
+        ).reshape(num_columns, num_classes)
 
-            incorrect_predictions = np.sum(digit_predictions != mode_value)
-            error_rate = incorrect_predictions / len(digit_predictions)
+        result = counts.argmax(axis=1)
+        mode_counts = counts[np.arange(num_columns), result]
+        errors_per_digit = 1 - mode_counts / max(num_samples, 1)
+        return result, errors_per_digit
 
-            result.append(mode_value)
-            errors_per_digit.append(error_rate)
-        return np.array(result), np.array(errors_per_digit)
 
+def get_default_model_filename(
+    extension: str, precision: str = "float", model_size: int = 100
+) -> str:
+    """デフォルトのモデルファイル名を取得する
 
-def cnn_init(num_digits: int, model_filename: Optional[str] = None) -> CNNCore:
-    """インストールされているライブラリに応じてCNNモデルを選択する
+    指定のモデルが見つからない場合は、同じ入力サイズの float のモデル、100x100 の float のモデルの順に使う
 
     Args:
-        num_digits (int): 推論する桁数
-        model_filename (Optional[str], optional): モデルファイル名。Noneの場合はデフォルトのモデルを使用。デフォルトはNone。
+        extension (str): モデルファイルの拡張子
+        precision (str, optional): モデルの精度。get_supported_precisions() を参照
+        model_size (int, optional): モデルの入力サイズ
+
+    Returns:
+        str: モデルファイル名
     """
-    logger = logging.getLogger("__main__").getChild(__name__)
+    candidates = []
+    if precision == "int8":
+        candidates.append(f"model_{model_size}x{model_size}_int8.{extension}")
+    candidates.append(f"model_{model_size}x{model_size}.{extension}")
+    candidates.append(f"model_100x100.{extension}")
+
+    for model_filename in candidates:
+        if (MODEL_DIR / model_filename).exists():
+            break
+    if model_filename != candidates[0]:
+        logging.getLogger("__main__").getChild(__name__).warning(
+            f"Model not found: {candidates[0]}. Using {model_filename}."
+        )
+    return model_filename
 
-    try:
-        from cores.cnn_tflite import CNNLite
 
-        logger.info("TensorFlow Lite Runtime detected. Using TFLite model.")
+def cnn_init(
+    num_digits: int,
+    model_filename: Optional[str] = None,
+    inference_options: Optional[Dict[str, Any]] = None,
+) -> CNNCore:
+    """インストールされているライブラリと設定に応じてCNNモデルを選択する
 
-        model_filename = (
-            "model_100x100.tflite" if model_filename is None else model_filename
-        )
-        return CNNLite(num_digits=num_digits, model_filename=model_filename)
-    except ImportError:
-        logger.debug(
-            "TensorFlow Lite runtime not found. Attempting to import TensorFlow."
-        )
+    推論ランタイムは import せずに選び、最初の推論時に読み込む。選び方は cores.inference_backend を参照
 
-    try:
-        from cores.cnn_tf import CNNTf
+    Args:
+        num_digits (int): 推論する桁数
+        model_filename (Optional[str], optional): モデルファイル名。Noneの場合はデフォルトのモデルを使用。デフォルトはNone。
+        inference_options (Optional[Dict[str, Any]], optional): 推論ランタイムの設定。cores.inference_options を参照。Noneの場合は既定の設定
 
-        logger.info("TensorFlow detected. Using Keras model.")
-        model_filename = (
-            "model_100x100.keras" if model_filename is None else model_filename
-        )
-        return CNNTf(num_digits=num_digits, model_filename=model_filename)
-    except ImportError:
-        logger.debug("TensorFlow not found. Attempting to import ONNX Runtime.")
+    Raises:
+        ImportError: 使用できる推論ランタイムがない場合
+    """
+    from cores.inference_backend import create_detector
 
+    logger = logging.getLogger("__main__").getChild(__name__)
+    options = resolve_inference_options(inference_options)
     try:
-        from cores.cnn_onnx import CNNOnnx
-
-        logger.info("ONNX Runtime detected. Using ONNX model.")
-        model_filename = (
-            "model_100x100.onnx" if model_filename is None else model_filename
-        )
-        return CNNOnnx(num_digits=num_digits, model_filename=model_filename)
+        return create_detector(num_digits, model_filename, options)
     except ImportError:
         logger.error(
             "No compatible machine learning library found. Cannot select a model."
         )
-        raise ImportError(
-            "No compatible model library found. Please install TensorFlow, TensorFlow Lite, or ONNX Runtime."
-        )
+        raise
@@ -9,20 +9,19 @@ Requirements:
 Alternative_Implementations:
     - cnn_tf.py: TensorFlowを使用したバージョン
     - cnn_tflite.py: TensorFlow Liteを使用したバージョン
-"""
 
-try:
-    import onnxruntime as ort
-except ImportError:
-    pass
+Notes:
+    - onnxruntime はモデルを読み込む際に import するため、このモジュールの import だけではランタイムを読み込まない
+"""
 
 from cores.cnn import CNNCore
 import logging
-from typing import TYPE_CHECKING, List
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 import numpy as np
 from pathlib import Path
 
 if TYPE_CHECKING:
+    import onnxruntime as ort
     from onnxruntime.capi.onnxruntime_inference_collection import InferenceSession
 
 FILE = Path(__file__).resolve()
@@ -34,8 +33,13 @@ class CNNOnnx(CNNCore):
 
     model: "InferenceSession"
 
-    def __init__(self, num_digits: int, model_filename: str) -> None:
-        super().__init__(num_digits)
+    def __init__(
+        self,
+        num_digits: int,
+        model_filename: str,
+        inference_options: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        super().__init__(num_digits, inference_options)
         self.logger = logging.getLogger("__main__").getChild(__name__)
 
         # 学習済みモデルの絶対パスを取得
@@ -46,37 +50,84 @@ class CNNOnnx(CNNCore):
         if not self.model_path.exists():
             raise FileNotFoundError(f"Model file not found: {self.model_path}")
 
+        # 入力サイズが分からない場合はすぐに読み込む
+        if not self.set_input_shape_from_filename(model_filename):
+            self.ensure_model_loaded()
+
+    def _load_model(self) -> None:
+        """ONNX Runtime を import してセッションを作成する"""
+        import onnxruntime as ort
+
         # ONNXランタイムセッションの作成
-        self.model = ort.InferenceSession(self.model_path)
+        providers = self.inference_options["providers"] or None
+        self.model = ort.InferenceSession(
+            self.model_path,
+            sess_options=self._create_session_options(),
+            providers=providers,
+        )
         self.input_name = self.model.get_inputs()[0].name
+        self.set_input_shape(self.model.get_inputs()[0].shape)
         self.logger.info("ONNX Model loaded.")
 
-    def inference_7seg_classifier(self, image: np.ndarray) -> List[int]:
-        """画像から7セグメント数字を推論する
-
-        Args:
-            image (np.ndarray): 推論対象の画像
+    def _create_session_options(self) -> "ort.SessionOptions":
+        """推論ランタイムの設定からセッションの設定を作成する
 
         Returns:
-            List[int]: 各桁の推論結果
+            ort.SessionOptions: セッションの設定
         """
-        # 各桁に分割
-        preprocessed_images = self.preprocess_image(image)
-
-        predictions = []
-        for preprocessed_image in preprocessed_images:
-            img_ = np.expand_dims(
-                preprocessed_image, axis=0
-            )  # バッチサイズの次元を追加
+        import onnxruntime as ort
+
+        graph_optimization_levels = {
+            "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+        }
+        options = self.inference_options
+
+        sess_options = ort.SessionOptions()
+        sess_options.intra_op_num_threads = options["num_threads"]
+        sess_options.inter_op_num_threads = options["inter_op_threads"]
+        sess_options.graph_optimization_level = graph_optimization_levels[
+            options["graph_optimization"]
+        ]
+        sess_options.enable_cpu_mem_arena = options["memory_arena"]
+        self.logger.debug(f"ONNX Runtime options: {options}")
+        return sess_options
+
+    def get_providers(self) -> List[str]:
+        """セッションで使用している実行プロバイダを取得する
 
-            # ONNX推論
-            output = self.model.run(None, {self.input_name: img_})[0]
-            predictions.append(output)
+        Returns:
+            List[str]: 実行プロバイダのリスト
+        """
+        self.ensure_model_loaded()
+        return self.model.get_providers()
 
-        # (num_digits, num_classes) 形状に変換
-        predictions_ = np.array(predictions).squeeze()
+    def inference_batch(self, images: np.ndarray) -> np.ndarray:
+        """前処理済みの桁画像をまとめて推論する
 
-        # 各行に対して最大値のインデックスを取得
-        argmax_indices = predictions_.argmax(axis=1)
+        Args:
+            images (np.ndarray): (N, height, width, channels) 形状の桁画像
 
-        return argmax_indices
+        Returns:
+            np.ndarray: (N, num_classes) 形状の各クラスの確率
+        """
+        self.ensure_model_loaded()
+
+        # バッチ次元が固定されたモデルの場合はその大きさごとに分割して推論
+        batch_size = self.model.get_inputs()[0].shape[0]
+        if not isinstance(batch_size, int) or batch_size <= 0:
+            return self.model.run(None, {self.input_name: images})[0]
+
+        outputs = []
+        for i in range(0, len(images), batch_size):
+            chunk = images[i : i + batch_size]
+            num_images = len(chunk)
+            if num_images < batch_size:
+                # 端数はゼロ埋めしてから推論し、結果を切り詰める
+                padding = np.zeros((batch_size - num_images, *chunk.shape[1:]))
+                chunk = np.concatenate([chunk, padding.astype(chunk.dtype)])
+            output = self.model.run(None, {self.input_name: chunk})[0]
+            outputs.append(output[:num_images])
+        return np.concatenate(outputs)
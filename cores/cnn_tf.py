@@ -12,17 +12,13 @@ Alternative_Implementations:
 
 Notes:
     - TensorFlowがインストールされていない場合は、ライブラリをインストールするか、代替実装を利用すること
+    - tensorflow の import は数秒かかるため、モデルを読み込む際に import する
 """
 
-try:
-    from tensorflow.keras.models import load_model
-except ImportError:
-    pass
-
 from cores.cnn import CNNCore
 import os
 import logging
-from typing import TYPE_CHECKING, List
+from typing import TYPE_CHECKING, Any, Dict, Optional
 import numpy as np
 from pathlib import Path
 
@@ -43,8 +39,13 @@ class CNNTf(CNNCore):
 
     model: "Model"
 
-    def __init__(self, num_digits: int, model_filename: str) -> None:
-        super().__init__(num_digits)
+    def __init__(
+        self,
+        num_digits: int,
+        model_filename: str,
+        inference_options: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        super().__init__(num_digits, inference_options)
         self.logger = logging.getLogger("__main__").getChild(__name__)
 
         # 学習済みモデルの絶対パスを取得
@@ -55,26 +56,49 @@ class CNNTf(CNNCore):
         if not self.model_path.exists():
             raise FileNotFoundError(f"Model file not found: {self.model_path}")
 
+        # 入力サイズが分からない場合はすぐに読み込む
+        if not self.set_input_shape_from_filename(model_filename):
+            self.ensure_model_loaded()
+
+    def _load_model(self) -> None:
+        """TensorFlow を import してモデルを読み込む"""
+        from tensorflow.keras.models import load_model
+
+        self._configure_threads()
         self.model = load_model(self.model_path)
+        self.set_input_shape(self.model.input_shape)
         self.logger.info("CNN Model loaded.")
 
-    def inference_7seg_classifier(self, image: np.ndarray) -> List[int]:
-        """画像から7セグメント数字を推論する
+    def _configure_threads(self) -> None:
+        """推論ランタイムの設定に従って TensorFlow のスレッド数を設定する
+
+        TensorFlow の初期化後は変更できないため、その場合は警告を出して既存の設定を使う
+        """
+        import tensorflow as tf
+
+        options = self.inference_options
+        try:
+            if options["num_threads"] > 0:
+                tf.config.threading.set_intra_op_parallelism_threads(
+                    options["num_threads"]
+                )
+            if options["inter_op_threads"] > 0:
+                tf.config.threading.set_inter_op_parallelism_threads(
+                    options["inter_op_threads"]
+                )
+        except RuntimeError as e:
+            self.logger.warning(f"Could not configure TensorFlow threads: {e}")
+
+    def inference_batch(self, images: np.ndarray) -> np.ndarray:
+        """前処理済みの桁画像をまとめて推論する
 
         Args:
-            image (np.ndarray): 推論対象の画像
+            images (np.ndarray): (N, height, width, channels) 形状の桁画像
 
         Returns:
-            List[int]: 各桁の推論結果
+            np.ndarray: (N, num_classes) 形状の各クラスの確率
         """
-        # 各桁に分割
-        preprocessed_images = self.preprocess_image(image)
-
-        predictions = self.model.predict(
-            np.array(preprocessed_images), verbose=0
+        self.ensure_model_loaded()
+        return self.model.predict(
+            images, batch_size=len(images), verbose=0
         )  # verbose=0: ログ出力を抑制
-
-        # 各行に対して最大値のインデックスを取得
-        argmax_indices = predictions.argmax(axis=1)
-
-        return argmax_indices
@@ -12,17 +12,13 @@ Alternative_Implementations:
 
 Notes:
     - TensorFlow Liteがインストールされていない場合は、ライブラリをインストールするか、代替実装を利用すること
+    - tflite_runtime はモデルを読み込む際に import するため、このモジュールの import だけではランタイムを読み込まない
 """
 
-try:
-    from tflite_runtime import interpreter as tflite
-except ImportError:
-    pass
-
 from cores.cnn import CNNCore
 import os
 import logging
-from typing import TYPE_CHECKING, List, Any, Dict
+from typing import TYPE_CHECKING, List, Any, Dict, Optional
 import numpy as np
 from pathlib import Path
 
@@ -45,8 +41,13 @@ class CNNLite(CNNCore):
     input_details: List[Dict[str, Any]]
     output_details: List[Dict[str, Any]]
 
-    def __init__(self, num_digits: int, model_filename: str) -> None:
-        super().__init__(num_digits)
+    def __init__(
+        self,
+        num_digits: int,
+        model_filename: str,
+        inference_options: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        super().__init__(num_digits, inference_options)
         self.logger = logging.getLogger("__main__").getChild(__name__)
 
         # 学習済みモデルの絶対パスを取得
@@ -57,42 +58,90 @@ class CNNLite(CNNCore):
         if not self.model_path.exists():
             raise FileNotFoundError(f"Model file not found: {self.model_path}")
 
+        # 入力サイズが分からない場合はすぐに読み込む
+        if not self.set_input_shape_from_filename(model_filename):
+            self.ensure_model_loaded()
+
+    def _load_model(self) -> None:
+        """TensorFlow Lite Runtime を import してインタプリタを作成する"""
         # TensorFlow Lite モデルの読み込み
-        self.model = tflite.Interpreter(model_path=self.model_path)
+        self.model = self._create_interpreter()
         self.model.allocate_tensors()
         self.input_details = self.model.get_input_details()
         self.output_details = self.model.get_output_details()
+        self.set_input_shape(self.input_details[0]["shape"])
         self.logger.info("TFLite Model loaded.")
 
-    # 画像から数字を推論
-    def inference_7seg_classifier(self, image: np.ndarray) -> List[int]:
-        """画像から7セグメント数字を推論する
+    def _create_interpreter(self) -> "Interpreter":
+        """推論ランタイムの設定に従ってインタプリタを作成する
+
+        Returns:
+            Interpreter: インタプリタ
+        """
+        from tflite_runtime import interpreter as tflite
+
+        options = self.inference_options
+        kwargs: Dict[str, Any] = {"model_path": str(self.model_path)}
+        if options["num_threads"] > 0:
+            kwargs["num_threads"] = options["num_threads"]
+        if not options["xnnpack"]:
+            # XNNPACK などの既定のデリゲートを使わない
+            kwargs["experimental_op_resolver_type"] = (
+                tflite.OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+            )
+        self.logger.debug(f"TFLite options: {options}")
+        return tflite.Interpreter(**kwargs)
+
+    def inference_batch(self, images: np.ndarray) -> np.ndarray:
+        """前処理済みの桁画像をまとめて推論する
+
+        入力テンソルのバッチ次元が異なる場合は、テンソルをリサイズしてから推論する
 
         Args:
-            image (np.ndarray): 推論対象の画像
+            images (np.ndarray): (N, height, width, channels) 形状の桁画像
 
         Returns:
-            List[int]: 各桁の推論結果
+            np.ndarray: (N, num_classes) 形状の各クラスの確率
         """
-        # 各桁に分割
-        preprocessed_images = self.preprocess_image(image)
+        self.ensure_model_loaded()
+        input_index = self.input_details[0]["index"]
+        if self.input_details[0]["shape"][0] != len(images):
+            self.model.resize_tensor_input(input_index, list(images.shape))
+            self.model.allocate_tensors()
+            self.input_details = self.model.get_input_details()
+            self.output_details = self.model.get_output_details()
 
-        # 1桁ずつ処理
-        predictions = []
-        for preprocessed_image in preprocessed_images:
-            img_ = np.expand_dims(
-                preprocessed_image, axis=0
-            )  # バッチサイズの次元を追加
+        self.model.set_tensor(input_index, self._quantize(images))
+        self.model.invoke()
+        return self._dequantize(self.model.get_tensor(self.output_details[0]["index"]))
 
-            self.model.set_tensor(self.input_details[0]["index"], img_)
-            self.model.invoke()
-            output_data = self.model.get_tensor(self.output_details[0]["index"])
-            predictions.append(output_data)
+    def _quantize(self, images: np.ndarray) -> np.ndarray:
+        """入力が整数型のモデルの場合は、入力の量子化パラメータで画像を量子化する
 
-        # (num_digits, num_classes) 形状に変換
-        predictions_ = np.array(predictions).squeeze()
+        Args:
+            images (np.ndarray): float32 の桁画像
+
+        Returns:
+            np.ndarray: モデルの入力型に合わせた桁画像
+        """
+        dtype = self.input_details[0]["dtype"]
+        if not np.issubdtype(dtype, np.integer):
+            return images
+        scale, zero_point = self.input_details[0]["quantization"]
+        info = np.iinfo(dtype)
+        quantized = np.round(images / scale + zero_point)
+        return np.clip(quantized, info.min, info.max).astype(dtype)
 
-        # 各行に対して最大値のインデックスを取得
-        argmax_indices = predictions_.argmax(axis=1)
+    def _dequantize(self, output: np.ndarray) -> np.ndarray:
+        """出力が整数型のモデルの場合は、出力の量子化パラメータで float32 に戻す
 
-        return argmax_indices
+        Args:
+            output (np.ndarray): モデルの出力
+
+        Returns:
+            np.ndarray: float32 の出力
+        """
+        if not np.issubdtype(output.dtype, np.integer):
+            return output
+        scale, zero_point = self.output_details[0]["quantization"]
+        return ((output.astype(np.float32) - zero_point) * scale).astype(np.float32)
@@ -70,8 +70,8 @@ class Detector(ABC):
             _, image_bin = cv2.threshold(image, binarize_th, 255, cv2.THRESH_BINARY)
 
         # 背景が黒（0）のピクセルが全体の50%未満の場合は反転（使用する学習モデルの特性上の理由）
-        black_pixels = np.sum(image_bin == 0)
-        white_pixels = np.sum(image_bin == 255)
+        white_pixels = cv2.countNonZero(image_bin)
+        black_pixels = image_bin.size - white_pixels
         if black_pixels > white_pixels:
             image_bin = cv2.bitwise_not(image_bin)
 
@@ -0,0 +1,201 @@
+"""切り出したフレームを1つのファイルにまとめて保存・読み込みする機能
+
+フレームは同じ形状の uint8 配列として frames.bin に追記し、フレームごとのメタデータは
+frames_index.bin に固定長のレコードとして追記する。形状などの情報は frames.json に保存する。
+読み込み時は np.memmap を使うため、フレームをコピーせずに参照できる
+"""
+
+from pathlib import Path
+from typing import Generator, List, Optional, Tuple, Union
+import json
+import logging
+import numpy as np
+
+logger = logging.getLogger("__main__").getChild(__name__)
+
+DATA_FILENAME = "frames.bin"
+INDEX_FILENAME = "frames_index.bin"
+META_FILENAME = "frames.json"
+
+# フレームごとのメタデータ
+# frame_index: 動画内のフレーム番号など、フレームを識別する番号
+# sample_id: フレームが属するサンプルの番号
+# timestamp: フレームの取得時刻（秒）
+INDEX_DTYPE = np.dtype(
+    [("frame_index", "<i8"), ("sample_id", "<i8"), ("timestamp", "<f8")]
+)
+
+
+def is_frame_archive(archive_dir: Union[str, Path]) -> bool:
+    """指定したディレクトリにフレームアーカイブが存在するかどうかを判定する
+
+    Args:
+        archive_dir (Union[str, Path]): ディレクトリのパス
+
+    Returns:
+        bool: フレームアーカイブが存在する場合はTrue
+    """
+    return (Path(archive_dir) / META_FILENAME).exists()
+
+
+class FrameArchiveWriter:
+    """フレームをチャンク単位でアーカイブに追記するクラス
+
+    スレッドセーフではないため、1つのスレッドから呼び出すこと
+    """
+
+    def __init__(self, out_dir: Union[str, Path], chunk_frames: int = 64) -> None:
+        """
+        Args:
+            out_dir (Union[str, Path]): 保存先ディレクトリ
+            chunk_frames (int, optional): まとめて書き込むフレーム数
+        """
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.chunk_frames = max(1, chunk_frames)
+        self.count = 0
+
+        self._shape: Optional[Tuple[int, ...]] = None
+        self._chunk: Optional[np.ndarray] = None
+        self._chunk_index = np.zeros(self.chunk_frames, dtype=INDEX_DTYPE)
+        self._num_buffered = 0
+        self._data_file = open(self.out_dir / DATA_FILENAME, "wb")
+        self._index_file = open(self.out_dir / INDEX_FILENAME, "wb")
+
+    def __enter__(self) -> "FrameArchiveWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def append(
+        self,
+        frame: np.ndarray,
+        frame_index: int,
+        sample_id: int = -1,
+        timestamp: float = 0.0,
+    ) -> None:
+        """フレームを1枚追加する
+
+        Args:
+            frame (np.ndarray): フレーム
+            frame_index (int): フレーム番号
+            sample_id (int, optional): サンプルの番号
+            timestamp (float, optional): フレームの取得時刻（秒）
+
+        Raises:
+            ValueError: 最初のフレームと形状が異なる場合
+        """
+        if self._shape is None:
+            self._shape = frame.shape
+            self._chunk = np.empty((self.chunk_frames, *frame.shape), dtype=np.uint8)
+            self._write_meta()
+        elif frame.shape != self._shape:
+            raise ValueError(
+                f"Frame shape {frame.shape} does not match the archive shape {self._shape}"
+            )
+
+        assert self._chunk is not None
+        self._chunk[self._num_buffered] = frame
+        self._chunk_index[self._num_buffered] = (frame_index, sample_id, timestamp)
+        self._num_buffered += 1
+        if self._num_buffered == self.chunk_frames:
+            self.flush()
+
+    def flush(self) -> None:
+        """バッファに溜まっているフレームを書き込む"""
+        if self._num_buffered == 0 or self._chunk is None:
+            return
+        self._chunk[: self._num_buffered].tofile(self._data_file)
+        self._chunk_index[: self._num_buffered].tofile(self._index_file)
+        self._data_file.flush()
+        self._index_file.flush()
+        self.count += self._num_buffered
+        self._num_buffered = 0
+
+    def close(self) -> None:
+        """残りのフレームを書き込んでファイルを閉じる"""
+        if self._data_file.closed:
+            return
+        self.flush()
+        self._data_file.close()
+        self._index_file.close()
+        logger.debug(f"Frame archive closed: {self.out_dir} ({self.count} frames)")
+
+    def _write_meta(self) -> None:
+        """フレームの形状と型を保存する"""
+        assert self._shape is not None
+        meta = {"shape": list(self._shape), "dtype": "uint8"}
+        with open(self.out_dir / META_FILENAME, "w") as f:
+            json.dump(meta, f)
+
+
+class FrameArchive:
+    """フレームアーカイブを読み込むクラス
+
+    書き込み途中で終了したアーカイブも、書き込み済みのチャンクまでは読み込める
+
+    Attributes:
+        frames: 全フレーム (N, H, W, C) の読み取り専用 memmap
+        frame_indices: フレーム番号
+        sample_ids: サンプルの番号
+        timestamps: フレームの取得時刻（秒）
+    """
+
+    def __init__(self, archive_dir: Union[str, Path]) -> None:
+        """
+        Args:
+            archive_dir (Union[str, Path]): アーカイブのディレクトリ
+
+        Raises:
+            FileNotFoundError: アーカイブが存在しない場合
+        """
+        archive_dir = Path(archive_dir)
+        if not is_frame_archive(archive_dir):
+            raise FileNotFoundError(f"Frame archive not found: {archive_dir}")
+
+        with open(archive_dir / META_FILENAME) as f:
+            meta = json.load(f)
+        shape = tuple(meta["shape"])
+        dtype = np.dtype(meta["dtype"])
+
+        data_path = archive_dir / DATA_FILENAME
+        index_path = archive_dir / INDEX_FILENAME
+        frame_bytes = int(np.prod(shape)) * dtype.itemsize
+        count = min(
+            data_path.stat().st_size // frame_bytes,
+            index_path.stat().st_size // INDEX_DTYPE.itemsize,
+        )
+
+        if count == 0:
+            self.frames = np.empty((0, *shape), dtype=dtype)
+        else:
+            self.frames = np.memmap(
+                data_path, dtype=dtype, mode="r", shape=(count, *shape)
+            )
+        index = np.fromfile(index_path, dtype=INDEX_DTYPE, count=count)
+        self.frame_indices = index["frame_index"]
+        self.sample_ids = index["sample_id"]
+        self.timestamps = index["timestamp"]
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def __getitem__(self, key):
+        return self.frames[key]
+
+    def iter_samples(self) -> Generator[Tuple[List[np.ndarray], float], None, None]:
+        """連続する同じサンプルのフレームをまとめて返すジェネレータ
+
+        Yields:
+            Tuple[List[np.ndarray], float]:
+                - サンプルのフレームのリスト
+                - サンプルの先頭フレームの取得時刻（秒）
+        """
+        if len(self) == 0:
+            return
+        boundaries = np.flatnonzero(np.diff(self.sample_ids)) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(self)]))
+        for start, end in zip(starts, ends):
+            yield list(self.frames[start:end]), float(self.timestamps[start])
@@ -1,13 +1,75 @@
 """取得したフレーム群に対する処理機能"""
 
-from typing import Union, List, Optional, Tuple
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Generator, Union, List, Optional, Tuple
 import cv2
+import time
 import logging
+import threading
 import numpy as np
 from datetime import timedelta
 from cores.common import clear_directory
+from cores.frame_source import (
+    FfmpegFrameReader,
+    get_roi,
+    get_supported_frame_sources,
+    is_ffmpeg_available,
+)
+from cores.frame_writer import FrameWriter
 from pathlib import Path
 
+# OpenCV のログレベル（cv::utils::logging::LOG_LEVEL_ERROR）
+OPENCV_LOG_LEVEL_ERROR = 2
+
+# 輝度成分がフルレンジ（0-255）で出力される JPEG 系のコーデック。それ以外はリミテッドレンジ（16-235）として扱う
+FULL_RANGE_FOURCCS = ["MJPG", "mjpg", "JPEG", "jpeg"]
+
+# リミテッドレンジの輝度をフルレンジに伸長する参照テーブル。BGR に変換してからグレースケールにした値と揃える
+LIMITED_TO_FULL_RANGE_LUT = np.clip(
+    np.round((np.arange(256) - 16) * 255 / 219), 0, 255
+).astype(np.uint8)
+
+
+# OpenCV のログレベルはプロセス全体で共有されるため、警告を抑制している呼び出しの数を数える
+_log_lock = threading.Lock()
+_num_quiet_calls = 0
+_saved_log_level = 0
+
+
+@contextmanager
+def quiet_opencv_log() -> Generator[None, None, None]:
+    """OpenCV の警告を一時的に抑制する
+
+    複数のスレッドで同時に使用しても、最後の呼び出しが終わったときに元のログレベルに戻す
+    """
+    global _num_quiet_calls, _saved_log_level
+    with _log_lock:
+        if _num_quiet_calls == 0:
+            _saved_log_level = cv2.getLogLevel()
+            cv2.setLogLevel(OPENCV_LOG_LEVEL_ERROR)
+        _num_quiet_calls += 1
+    try:
+        yield
+    finally:
+        with _log_lock:
+            _num_quiet_calls -= 1
+            if _num_quiet_calls == 0:
+                cv2.setLogLevel(_saved_log_level)
+
+
+def get_supported_skip_modes() -> List[str]:
+    """サポートされているフレームのスキップ方法を取得する
+
+    - read: 全フレームをデコードして読み捨てる
+    - grab: スキップするフレームを grab() のみで読み飛ばす
+    - seek: CAP_PROP_POS_FRAMES で次のサンプリング位置までシークする
+    - auto: grab と seek の所要時間を計測し、速い方を選択する
+
+    Returns:
+        List[str]: サポートされているスキップ方法
+    """
+    return ["read", "grab", "seek", "auto"]
+
 
 class FrameEditor:
     """取得したフレームに関する処理を行うクラス"""
@@ -25,6 +87,18 @@ class FrameEditor:
         self.crop_height = crop_height
         self.click_points: List = []
 
+        # クリックポイントごとの射影変換の参照テーブル
+        self._remap_key: Optional[Tuple] = None
+        self._remap_tables: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+        # スキップ方法ごとの所要時間の計測値（auto モードで使用）
+        self._grab_sec_per_frame: Optional[float] = None
+        self._seek_sec: Optional[float] = None
+
+        # 輝度成分のデコードに使うフレームの大きさと、輝度の範囲を伸長する参照テーブル
+        self._luma_size: Tuple[int, int] = (0, 0)
+        self._luma_lut: Optional[np.ndarray] = None
+
         self.logger = logging.getLogger("__main__").getChild(__name__)
         self.logger.debug("Frame Editor loaded.")
 
@@ -49,6 +123,12 @@ class FrameEditor:
         is_crop: bool = True,
         click_points: List = [],
         extract_single_frame: bool = False,
+        skip_mode: str = "read",
+        frame_format: str = "jpg",
+        gray_decode: bool = False,
+        frame_source: str = "opencv",
+        first_sample: int = 0,
+        end_sample: Optional[int] = None,
     ):
         """
         動画をフレームに分割し、フレームやバッチをジェネレータとして返す関数である。
@@ -63,29 +143,75 @@ class FrameEditor:
             is_crop (bool, optional): 画像を切り出すかどうか
             click_points (List, optional): クリックポイントの初期値
             extract_single_frame (bool, optional): 最初の位置フレームだけ取得するかどうか
+            skip_mode (str, optional): サンプリング対象外のフレームの読み飛ばし方法。get_supported_skip_modes() を参照
+            frame_format (str, optional): フレームの保存形式。get_supported_frame_formats() を参照
+            gray_decode (bool, optional): BGR に変換せず、デコードした輝度成分をグレースケールのフレームとして使うかどうか
+            frame_source (str, optional): フレームの取得方法。get_supported_frame_sources() を参照。
+                "ffmpeg" は切り出す場合のみ使用し、ffmpeg がない場合は "opencv" で取得する
+            first_sample (int, optional): 最初に取得するサンプルの番号。video_skip_sec の位置を0とし、
+                サンプリング間隔のフレーム数の倍数だけ進めた位置から取得する
+            end_sample (Optional[int], optional): 取得を終了するサンプルの番号（このサンプルは含まない）。Noneの場合は動画の終端まで取得する
+
+        Raises:
+            ValueError: skip_mode または frame_source がサポートされていない場合
 
         Yields:
             Tuple[Union[np.ndarray, List[np.ndarray]], str]:
                 - フレームまたはフレームのリスト
                 - タイムスタンプ（文字列）
         """
+        if skip_mode not in get_supported_skip_modes():
+            raise ValueError(f"Invalid skip mode: {skip_mode}")
+        if frame_source not in get_supported_frame_sources():
+            raise ValueError(f"Invalid frame source: {frame_source}")
+
         self.click_points = click_points
 
-        # フレームの保存用ディレクトリを準備
-        if save_frame:
-            Path(out_dir).mkdir(parents=True, exist_ok=True)
-            clear_directory(out_dir)
+        if frame_source == "ffmpeg" and is_crop and not extract_single_frame:
+            if is_ffmpeg_available():
+                yield from self._ffmpeg_frame_generator(
+                    video_path=video_path,
+                    video_skip_sec=video_skip_sec,
+                    sampling_sec=sampling_sec,
+                    batch_frames=batch_frames,
+                    save_frame=save_frame,
+                    out_dir=out_dir,
+                    frame_format=frame_format,
+                    gray_decode=gray_decode,
+                    first_sample=first_sample,
+                    end_sample=end_sample,
+                )
+                return
+            self.logger.warning("ffmpeg not found. Reading frames with OpenCV.")
 
         cap = cv2.VideoCapture(video_path)
         if not cap.isOpened():
             self.logger.error("Error: Could not open video file.")
             return
 
+        # フレームの保存用ディレクトリを準備し、保存はバックグラウンドで行う
+        frame_writer = None
+        if save_frame:
+            Path(out_dir).mkdir(parents=True, exist_ok=True)
+            clear_directory(out_dir)
+            frame_writer = FrameWriter(out_dir, frame_format=frame_format)
+
+        # 高解像度の動画では、フレーム全体の BGR 変換と 3 チャンネル分のメモリ転送を省く
+        if gray_decode:
+            gray_decode = self._enable_gray_decode(cap)
+
         fps = cap.get(cv2.CAP_PROP_FPS)
         interval_frames = 1 if sampling_sec == 0 else int(fps * sampling_sec)
-        skip_frames = int(fps * video_skip_sec)
+        # 開始位置と終了位置は、video_skip_sec から数えたサンプリング間隔の倍数に揃える
+        start_frames = first_sample * interval_frames
+        skip_frames = int(fps * video_skip_sec) + start_frames
+        end_frames = (
+            None
+            if end_sample is None
+            else int(fps * video_skip_sec) + end_sample * interval_frames
+        )
         frame_count = 0
-        frame_batch = []
+        frame_batch: List[np.ndarray] = []
         timestamps: List[str] = []
 
         # 指定の開始位置までフレームをスキップ
@@ -93,10 +219,42 @@ class FrameEditor:
 
         try:
             while True:
-                ret, frame = cap.read()
+                # サンプリング区間外のフレームをデコードせずに読み飛ばす
+                if (
+                    skip_mode != "read"
+                    and frame_count % interval_frames >= batch_frames
+                ):
+                    if len(frame_batch) != 0:
+                        i = first_sample + len(timestamps)
+                        timestamp = timedelta(seconds=sampling_sec * i + video_skip_sec)
+                        timestamps.append(str(timestamp))
+                        yield frame_batch, str(timestamp)
+                        frame_batch = []
+
+                    num_skip = interval_frames - frame_count % interval_frames
+                    frame_count += num_skip
+                    if not self._skip_frames(
+                        cap, num_skip, skip_frames + frame_count, skip_mode
+                    ):
+                        self.logger.info("Finsish: Could not skip frame.")
+                        break
+
+                if end_frames is not None and skip_frames + frame_count >= end_frames:
+                    self.logger.info("Finsish: Reached the end position.")
+                    break
+
+                # 変換しない出力はフレームごとに非対応形式の警告が出るため抑制する
+                with quiet_opencv_log() if gray_decode else nullcontext():
+                    ret, frame = cap.read()
                 if not ret:
                     self.logger.info("Finsish: Could not read frame.")
                     break
+                if gray_decode:
+                    luma, gray_decode = self._get_luma(cap, frame)
+                    if luma is None:
+                        self.logger.info("Finsish: Could not read frame.")
+                        break
+                    frame = luma
 
                 # サンプリング間隔に基づいてフレームを処理
                 if frame_count % interval_frames < batch_frames:
@@ -118,16 +276,20 @@ class FrameEditor:
                         break
 
                     # フレームの保存
-                    if save_frame:
-                        frame_filename = Path(out_dir) / f"frame_{frame_count:06d}.jpg"
-                        cv2.imwrite(str(frame_filename), frame)
+                    if frame_writer is not None:
+                        frame_writer.write(
+                            start_frames + frame_count,
+                            frame,
+                            sample_id=first_sample + frame_count // interval_frames,
+                            timestamp=(skip_frames + frame_count) / fps,
+                        )
 
                     frame_batch.append(frame)
 
                 else:
                     # バッチサイズに達していたらフレームバッチをyieldする
                     if len(frame_batch) != 0:
-                        i = len(timestamps)
+                        i = first_sample + len(timestamps)
                         timestamp = timedelta(seconds=sampling_sec * i + video_skip_sec)
                         timestamps.append(str(timestamp))
                         # フレームバッチをyield
@@ -138,14 +300,294 @@ class FrameEditor:
 
             # ループを抜けた後、溜まっているフレームバッチがあれば最後にyield
             if frame_batch:
-                i = len(timestamps)
+                i = first_sample + len(timestamps)
                 timestamp = timedelta(seconds=sampling_sec * i + video_skip_sec)
                 yield frame_batch, str(timestamp)
 
         finally:
             cap.release()
+            if frame_writer is not None:
+                frame_writer.close()
+            self.logger.info("Capture resources released.")
+
+    def _ffmpeg_frame_generator(
+        self,
+        video_path: str,
+        video_skip_sec: int,
+        sampling_sec: int,
+        batch_frames: int,
+        save_frame: bool,
+        out_dir: str,
+        frame_format: str,
+        gray_decode: bool,
+        first_sample: int,
+        end_sample: Optional[int],
+    ) -> Generator[Tuple[List[np.ndarray], str], None, None]:
+        """ffmpeg でサンプリング対象のフレームだけを取得し、切り出したフレームのバッチを返す
+
+        ffmpeg にはクリックポイントの外接矩形だけを切り出させ、射影変換は外接矩形内の座標で行う。
+        引数は frame_devide_generator と同じ
+
+        Yields:
+            Tuple[List[np.ndarray], str]:
+                - フレームのリスト
+                - タイムスタンプ（文字列）
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            self.logger.error("Error: Could not open video file.")
+            return
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+
+        if len(self.click_points) != 4:
+            first_frames = self.frame_devide_generator(
+                video_path=video_path,
+                video_skip_sec=video_skip_sec,
+                save_frame=False,
+                is_crop=False,
+                click_points=self.click_points,
+                extract_single_frame=True,
+            )
+            first_frame, _ = next(first_frames)
+            first_frames.close()
+            self.region_select(first_frame)
+
+        interval_frames = 1 if sampling_sec == 0 else int(fps * sampling_sec)
+        batch_frames = min(batch_frames, interval_frames)
+        # OpenCV で取得する場合と同じく、開始位置をサンプリング間隔の倍数に揃える
+        start_frames = first_sample * interval_frames
+        skip_frames = int(fps * video_skip_sec) + start_frames
+        roi = get_roi(self.click_points, width, height)
+        roi_points = (
+            np.asarray(self.click_points, dtype=np.float64) - roi[:2]
+        ).tolist()
+
+        frame_writer = None
+        if save_frame:
+            Path(out_dir).mkdir(parents=True, exist_ok=True)
+            clear_directory(out_dir)
+            frame_writer = FrameWriter(out_dir, frame_format=frame_format)
+
+        reader = FfmpegFrameReader(
+            video_path,
+            interval_frames=interval_frames,
+            batch_frames=batch_frames,
+            roi=roi,
+            # 開始フレームの表示時刻の少し前を指定する。ffmpeg は指定した時刻をストリームの時間単位に
+            # 丸めるため、半フレーム前を指定すると1つ前のフレームから出力されることがある
+            video_skip_sec=max(0.0, (skip_frames - 0.25) / fps),
+            max_frames=(
+                None
+                if end_sample is None
+                else (end_sample - first_sample)
+                * (1 if sampling_sec == 0 else batch_frames)
+            ),
+            gray=gray_decode,
+        )
+        frame_batch: List[np.ndarray] = []
+        timestamps: List[str] = []
+        num_frames = 0
+
+        try:
+            while True:
+                frame = reader.read()
+                if frame is None:
+                    self.logger.info("Finsish: Could not read frame.")
+                    break
+
+                # 出力されたフレームの通し番号から、動画内の位置を求める
+                if sampling_sec == 0:
+                    sample_id, frame_count = num_frames, num_frames
+                    is_last = False
+                else:
+                    sample_id, offset = divmod(num_frames, batch_frames)
+                    frame_count = sample_id * interval_frames + offset
+                    is_last = offset == batch_frames - 1
+                sample_id += first_sample
+                num_frames += 1
+                self.logger.debug(f"Frame collected: {frame_count}")
+
+                cropped_frame = self.crop(frame, roi_points)
+                if cropped_frame is None:
+                    self.logger.error("Error: Could not crop image.")
+                    continue
+
+                if frame_writer is not None:
+                    frame_writer.write(
+                        start_frames + frame_count,
+                        cropped_frame,
+                        sample_id=sample_id,
+                        timestamp=(skip_frames + frame_count) / fps,
+                    )
+                frame_batch.append(cropped_frame)
+
+                if is_last:
+                    timestamp = timedelta(
+                        seconds=sampling_sec * (first_sample + len(timestamps))
+                        + video_skip_sec
+                    )
+                    timestamps.append(str(timestamp))
+                    yield frame_batch, str(timestamp)
+                    frame_batch = []
+
+            if frame_batch:
+                timestamp = timedelta(
+                    seconds=sampling_sec * (first_sample + len(timestamps))
+                    + video_skip_sec
+                )
+                yield frame_batch, str(timestamp)
+
+        finally:
+            reader.close()
+            if frame_writer is not None:
+                frame_writer.close()
             self.logger.info("Capture resources released.")
 
+    def benchmark_frame_sources(
+        self,
+        video_path: str,
+        click_points: List,
+        max_batches: int,
+        **kwargs,
+    ) -> Dict[str, float]:
+        """使用できるフレームの取得方法ごとに、先頭から max_batches バッチを取得する時間を計測する
+
+        Args:
+            video_path (str): 動画ファイルのパス
+            click_points (List): クリックポイント
+            max_batches (int): 計測するバッチ数
+            **kwargs: frame_devide_generator に渡すその他の引数
+
+        Returns:
+            Dict[str, float]: フレームの取得方法ごとの所要時間（秒）
+        """
+        sources = [
+            s
+            for s in get_supported_frame_sources()
+            if s != "ffmpeg" or is_ffmpeg_available()
+        ]
+        elapsed: Dict[str, float] = {}
+        for source in sources:
+            start = time.perf_counter()
+            batches = self.frame_devide_generator(
+                video_path=video_path,
+                save_frame=False,
+                click_points=click_points,
+                frame_source=source,
+                **kwargs,
+            )
+            for _ in zip(range(max_batches), batches):
+                pass
+            batches.close()
+            elapsed[source] = time.perf_counter() - start
+            self.logger.info(f"Benchmark of {source}: {elapsed[source]:.3f} sec")
+        return elapsed
+
+    def _enable_gray_decode(self, cap: cv2.VideoCapture) -> bool:
+        """BGR への変換を止め、デコーダの出力をそのまま取得するよう設定する
+
+        OpenCV は変換しない出力を 8UC1 として返し、平面形式の動画では先頭の輝度平面になる。
+        フレームごとに出力される非対応形式の警告は、読み込み時に quiet_opencv_log で抑制する。
+        フレームの大きさと輝度の範囲は、フレームごとに取得せずここで一度だけ取得する
+
+        Args:
+            cap (cv2.VideoCapture): 動画のキャプチャ
+
+        Returns:
+            bool: 設定できた場合はTrue
+        """
+        if not cap.set(cv2.CAP_PROP_CONVERT_RGB, 0):
+            self.logger.warning("Gray decode is not supported by the video backend.")
+            return False
+
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self._luma_size = (width, height)
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC)).to_bytes(4, "little")
+        is_full_range = fourcc.decode(errors="replace") in FULL_RANGE_FOURCCS
+        self._luma_lut = None if is_full_range else LIMITED_TO_FULL_RANGE_LUT
+        return True
+
+    def _get_luma(
+        self, cap: cv2.VideoCapture, frame: np.ndarray
+    ) -> Tuple[Optional[np.ndarray], bool]:
+        """変換せずに取得したフレームから輝度成分を取り出す
+
+        リミテッドレンジ（16-235）の輝度はフルレンジに伸長し、二値化の閾値を BGR から変換した場合と同じ値で使えるようにする。
+        輝度平面として扱えない形式の場合は BGR への変換に戻し、同じフレームを BGR で読み直す
+
+        Args:
+            cap (cv2.VideoCapture): _enable_gray_decode で設定した動画のキャプチャ
+            frame (np.ndarray): デコーダの出力
+
+        Returns:
+            Tuple[Optional[np.ndarray], bool]:
+                - グレースケールのフレーム。BGR に戻した場合は読み直したフレームで、読み直せない場合はNone
+                - 輝度成分のデコードを続けるかどうか
+        """
+        width, height = self._luma_size
+        if frame.ndim == 3:
+            # バックエンドが設定を無視して BGR で返した場合
+            return frame, True
+        if frame.ndim == 2 and frame.shape[1] == width and frame.shape[0] >= height:
+            luma = frame[:height]
+            if self._luma_lut is not None:
+                luma = cv2.LUT(luma, self._luma_lut)
+            return luma, True
+
+        self.logger.warning(
+            f"Unsupported pixel layout for gray decode: {frame.shape}. Falling back to BGR."
+        )
+        cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+        position = int(cap.get(cv2.CAP_PROP_POS_FRAMES)) - 1
+        cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+        ret, frame = cap.read()
+        return (frame if ret else None), False
+
+    def _skip_frames(
+        self,
+        cap: cv2.VideoCapture,
+        num_frames: int,
+        position: int,
+        skip_mode: str,
+    ) -> bool:
+        """指定の位置までフレームを読み飛ばす
+
+        Args:
+            cap (cv2.VideoCapture): 動画のキャプチャ
+            num_frames (int): 読み飛ばすフレーム数
+            position (int): 読み飛ばした後のフレーム位置
+            skip_mode (str): "grab"、"seek" または "auto"
+
+        Returns:
+            bool: 読み飛ばしに成功したかどうか。動画の終端に達した場合はFalse
+        """
+        if skip_mode == "auto":
+            # 未計測の方法を優先して試し、以降は推定時間が短い方を選択する
+            if self._seek_sec is None:
+                skip_mode = "seek"
+            elif self._grab_sec_per_frame is None:
+                skip_mode = "grab"
+            elif self._grab_sec_per_frame * num_frames < self._seek_sec:
+                skip_mode = "grab"
+            else:
+                skip_mode = "seek"
+
+        start_time = time.perf_counter()
+        if skip_mode == "seek":
+            ret = cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+            self._seek_sec = time.perf_counter() - start_time
+            return bool(ret)
+
+        for _ in range(num_frames):
+            if not cap.grab():
+                return False
+        self._grab_sec_per_frame = (time.perf_counter() - start_time) / num_frames
+        return True
+
     def crop(
         self,
         image: np.ndarray,
@@ -163,27 +605,63 @@ class FrameEditor:
         if len(click_points) != 4:
             return None
 
-        # 射影変換
+        map1, map2 = self._get_remap_tables(click_points)
+        extract_image = cv2.remap(image, map1, map2, cv2.INTER_LINEAR)
+
+        return extract_image
+
+    def _get_remap_tables(self, click_points: List) -> Tuple[np.ndarray, np.ndarray]:
+        """射影変換の参照テーブルを取得する
+
+        クリックポイントは実行中に変わらないため、射影変換の行列から出力画素ごとの参照先座標を一度だけ計算してキャッシュする。
+        cv2.remap は参照先の画素だけを読むため、入力画像全体を走査しない
+
+        Args:
+            click_points (List): クリックポイント
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: cv2.remap 用の参照テーブル
+        """
+        width = self.crop_width * self.num_digits
+        height = self.crop_height
+
         pts1 = np.array(
             [click_points[0], click_points[1], click_points[2], click_points[3]],
             dtype=np.float32,
         )
+        key = (pts1.tobytes(), width, height)
+        if self._remap_key == key and self._remap_tables is not None:
+            return self._remap_tables
 
+        # 射影変換
         pts2 = np.array(
             [
                 [0, 0],
-                [self.crop_width * self.num_digits, 0],
-                [self.crop_width * self.num_digits, self.crop_height],
-                [0, self.crop_height],
+                [width, 0],
+                [width, height],
+                [0, height],
             ],
             dtype=np.float32,
         )
         M = cv2.getPerspectiveTransform(pts1, pts2)
-        extract_image = cv2.warpPerspective(
-            image, M, (self.crop_width * self.num_digits, self.crop_height)
-        )
 
-        return extract_image
+        # 出力画像の各画素に対応する入力画像の座標を逆変換で求める
+        grid_x, grid_y = np.meshgrid(
+            np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32)
+        )
+        grid = np.stack([grid_x, grid_y], axis=-1).reshape(-1, 1, 2)
+        src = cv2.perspectiveTransform(grid, np.linalg.inv(M)).reshape(height, width, 2)
+
+        # 固定小数点形式に変換して remap を高速化する
+        map1, map2 = cv2.convertMaps(
+            np.ascontiguousarray(src[..., 0]),
+            np.ascontiguousarray(src[..., 1]),
+            cv2.CV_16SC2,
+        )
+        self._remap_key = key
+        self._remap_tables = (map1, map2)
+        self.logger.debug("Remap tables updated.")
+        return self._remap_tables
 
     def region_select(self, image: Union[str, np.ndarray]) -> List[np.ndarray]:
         """画像から7セグメント領域を選択する
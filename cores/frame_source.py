@@ -0,0 +1,204 @@
+"""動画ファイルからフレームを取得する方法
+
+- opencv: cv2.VideoCapture でデコードし、FrameEditor.frame_devide_generator 内でサンプリングする
+- ffmpeg: ffmpeg のサブプロセスで開始位置へのシーク、サンプリング、領域の切り出し、画素形式の変換まで行い、
+  標準出力から生のフレームを読み込む。サンプリング対象外のフレームや領域外の画素は Python 側に転送されない
+"""
+
+from typing import IO, List, Optional, Tuple
+import logging
+import shutil
+import subprocess
+import tempfile
+import numpy as np
+
+logger = logging.getLogger("__main__").getChild(__name__)
+
+FFMPEG_COMMAND = "ffmpeg"
+
+# クリックポイントの外接矩形の外側に残す余白（画素）。射影変換の補間で参照する周囲の画素を含める
+ROI_MARGIN = 4
+
+
+def get_supported_frame_sources() -> List[str]:
+    """サポートされているフレームの取得方法を取得する
+
+    Returns:
+        List[str]: サポートされているフレームの取得方法
+    """
+    return ["opencv", "ffmpeg"]
+
+
+def is_ffmpeg_available() -> bool:
+    """ffmpeg コマンドが使用できるかを判定する
+
+    Returns:
+        bool: 使用できる場合はTrue
+    """
+    return shutil.which(FFMPEG_COMMAND) is not None
+
+
+def get_roi(
+    click_points: List, width: int, height: int, margin: int = ROI_MARGIN
+) -> Tuple[int, int, int, int]:
+    """クリックポイントの外接矩形に余白を加えた領域を取得する
+
+    ffmpeg の crop フィルタは色差の間引きに合わせて位置を丸めるため、位置と大きさは偶数に揃える
+
+    Args:
+        click_points (List): クリックポイント
+        width (int): フレームの幅
+        height (int): フレームの高さ
+        margin (int, optional): 外接矩形の外側に残す余白（画素）
+
+    Returns:
+        Tuple[int, int, int, int]: 領域の左上の x, y 座標と幅、高さ
+    """
+    points = np.asarray(click_points, dtype=np.float64)
+    x0, y0 = np.floor(points.min(axis=0)).astype(int) - margin
+    x1, y1 = np.ceil(points.max(axis=0)).astype(int) + margin + 1
+    x0 = max(0, int(x0) // 2 * 2)
+    y0 = max(0, int(y0) // 2 * 2)
+    x1 = min(width, (int(x1) + 1) // 2 * 2)
+    y1 = min(height, (int(y1) + 1) // 2 * 2)
+    return x0, y0, max(0, x1 - x0), max(0, y1 - y0)
+
+
+class FfmpegFrameReader:
+    """ffmpeg のサブプロセスからサンプリング対象のフレームだけを読み込むクラス
+
+    読み込んだフレームは使い回すバッファに書き込むため、次の read で上書きされる
+    """
+
+    def __init__(
+        self,
+        video_path: str,
+        interval_frames: int,
+        batch_frames: int,
+        roi: Tuple[int, int, int, int],
+        video_skip_sec: float = 0,
+        max_frames: Optional[int] = None,
+        gray: bool = False,
+    ) -> None:
+        """
+        Args:
+            video_path (str): 動画ファイルのパス
+            interval_frames (int): サンプリング間隔のフレーム数
+            batch_frames (int): 1回のサンプリングで取得するフレーム数
+            roi (Tuple[int, int, int, int]): 切り出す領域の左上の x, y 座標と幅、高さ。get_roi を参照
+            video_skip_sec (float, optional): 解析を開始する位置（秒）
+            max_frames (Optional[int], optional): 出力するフレーム数の上限。Noneの場合は動画の終端まで
+            gray (bool, optional): グレースケールで出力するかどうか。Falseの場合は BGR
+        """
+        self.video_path = video_path
+        self.interval_frames = interval_frames
+        self.batch_frames = batch_frames
+        self.roi = roi
+        self.video_skip_sec = video_skip_sec
+        self.max_frames = max_frames
+        self.gray = gray
+
+        _, _, width, height = roi
+        shape = (height, width) if gray else (height, width, 3)
+        self._buffer = np.empty(shape, dtype=np.uint8)
+        self._process: Optional[subprocess.Popen] = None
+        # エラー出力はパイプが一杯になって ffmpeg が止まらないよう一時ファイルに書き出させる
+        self._stderr: Optional[IO[bytes]] = None
+
+    def build_command(self) -> List[str]:
+        """ffmpeg のコマンドを作成する
+
+        -ss を入力の前に指定し、開始位置の直前のキーフレームからデコードする。
+        select フィルタで各サンプリング区間の先頭 batch_frames フレームだけを出力する
+
+        Returns:
+            List[str]: コマンドと引数
+        """
+        x, y, width, height = self.roi
+        filters = [
+            f"select='lt(mod(n\\,{self.interval_frames})\\,{self.batch_frames})'",
+            f"crop={width}:{height}:{x}:{y}:exact=1",
+        ]
+        command = [FFMPEG_COMMAND, "-hide_banner", "-loglevel", "error", "-nostdin"]
+        if self.video_skip_sec > 0:
+            command += ["-ss", str(self.video_skip_sec)]
+        command += ["-i", self.video_path, "-vf", ",".join(filters)]
+        if self.max_frames is not None:
+            command += ["-frames:v", str(self.max_frames)]
+        command += [
+            "-vsync",
+            "0",
+            "-an",
+            "-f",
+            "rawvideo",
+            "-pix_fmt",
+            "gray" if self.gray else "bgr24",
+            "pipe:1",
+        ]
+        return command
+
+    def open(self) -> None:
+        """ffmpeg のサブプロセスを開始する
+
+        Raises:
+            FileNotFoundError: ffmpeg が見つからない場合
+        """
+        command = self.build_command()
+        logger.debug(f"ffmpeg command: {command}")
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=self._stderr,
+        )
+
+    def read(self) -> Optional[np.ndarray]:
+        """次のフレームを読み込む
+
+        Returns:
+            Optional[np.ndarray]: フレーム。動画の終端に達した場合はNone
+        """
+        if self._process is None:
+            self.open()
+        stdout: IO[bytes] = self._process.stdout  # type: ignore
+        flat = self._buffer.reshape(-1)
+        num_read = 0
+        while num_read < flat.size:
+            n = stdout.readinto(flat[num_read:])  # type: ignore
+            if not n:
+                if num_read > 0:
+                    logger.warning("Incomplete frame from ffmpeg.")
+                self._log_errors()
+                return None
+            num_read += n
+        return self._buffer
+
+    def _log_errors(self) -> None:
+        """ffmpeg が異常終了した場合はエラー出力をログに残す"""
+        if self._process is None or self._stderr is None:
+            return
+        returncode = self._process.wait()
+        if returncode != 0:
+            self._stderr.seek(0)
+            message = self._stderr.read().decode(errors="replace").strip()
+            logger.error(f"ffmpeg exited with code {returncode}: {message}")
+
+    def close(self) -> None:
+        """ffmpeg のサブプロセスを終了する"""
+        if self._process is None:
+            return
+        if self._process.poll() is None:
+            self._process.kill()
+        for stream in (self._process.stdout, self._stderr):
+            if stream is not None:
+                stream.close()
+        self._process.wait()
+        self._process = None
+        self._stderr = None
+
+    def __enter__(self) -> "FfmpegFrameReader":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
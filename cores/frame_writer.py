@@ -0,0 +1,206 @@
+"""フレームをバックグラウンドで保存する機能"""
+
+from pathlib import Path
+from queue import Queue, Full
+from typing import List, Optional, Tuple, Union
+import logging
+import threading
+import cv2
+import numpy as np
+from cores.frame_archive import FrameArchiveWriter
+
+logger = logging.getLogger("__main__").getChild(__name__)
+
+
+def get_supported_frame_formats() -> List[str]:
+    """サポートされているフレームの保存形式を取得する
+
+    Returns:
+        List[str]: サポートされているフレームの保存形式
+    """
+    return ["jpg", "png", "npy", "archive"]
+
+
+class FrameWriter:
+    """フレームを上限付きのキューに積み、ワーカースレッドで保存するクラス
+
+    画像のエンコードとファイルへの書き込みを呼び出し元のスレッドから切り離す。
+    block が False の場合、キューが一杯になるとフレームを破棄して dropped_count に数える。
+    frame_format が "archive" の場合は全フレームを1つのアーカイブに追記する (cores.frame_archive を参照)
+    """
+
+    def __init__(
+        self,
+        out_dir: Union[str, Path],
+        frame_format: str = "jpg",
+        jpeg_quality: int = 95,
+        png_compression: int = 3,
+        num_workers: int = 1,
+        queue_size: int = 256,
+        block: bool = True,
+    ) -> None:
+        """
+        Args:
+            out_dir (Union[str, Path]): 保存先ディレクトリ
+            frame_format (str, optional): 保存形式。get_supported_frame_formats() を参照
+            jpeg_quality (int, optional): JPEG の画質 (0-100)
+            png_compression (int, optional): PNG の圧縮レベル (0-9)
+            num_workers (int, optional): 保存を行うスレッド数。"archive" の場合は常に1
+            queue_size (int, optional): キューで保持するフレーム数の上限
+            block (bool, optional): キューが一杯のときに空くまで待つかどうか。Falseの場合は破棄する
+
+        Raises:
+            ValueError: frame_format がサポートされていない場合
+        """
+        if frame_format not in get_supported_frame_formats():
+            raise ValueError(f"Invalid frame format: {frame_format}")
+
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.frame_format = frame_format
+        self.block = block
+        self.written_count = 0
+        self.dropped_count = 0
+        self.failed_count = 0
+
+        if frame_format == "jpg":
+            self._params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        elif frame_format == "png":
+            self._params = [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+        else:
+            self._params = []
+
+        self._archive: Optional[FrameArchiveWriter] = None
+        if frame_format == "archive":
+            # アーカイブへの追記順を保つため1スレッドで書き込む
+            self._archive = FrameArchiveWriter(self.out_dir)
+            num_workers = 1
+
+        self._queue: Queue = Queue(maxsize=queue_size)
+        self._count_lock = threading.Lock()
+        self._is_closed = False
+        self._threads = [
+            threading.Thread(target=self._worker, daemon=True)
+            for _ in range(max(1, num_workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self) -> "FrameWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write(
+        self,
+        frame_index: int,
+        frame: np.ndarray,
+        sample_id: int = -1,
+        timestamp: float = 0.0,
+    ) -> bool:
+        """フレームの保存を予約する
+
+        画像ファイルとして保存する場合は frame_<サンプル番号>_<フレーム番号> の名前で保存し、timestamp は使用しない。
+        sample_id が負の場合は frame_<フレーム番号> の名前で保存する
+
+        Args:
+            frame_index (int): フレーム番号
+            frame (np.ndarray): フレーム
+            sample_id (int, optional): フレームが属するサンプルの番号。負の場合はサンプルに属さない
+            timestamp (float, optional): フレームの取得時刻（秒）
+
+        Returns:
+            bool: キューに追加できたかどうか。破棄した場合はFalse
+        """
+        try:
+            self._queue.put(
+                (frame_index, frame, sample_id, timestamp), block=self.block
+            )
+        except Full:
+            with self._count_lock:
+                self.dropped_count += 1
+            logger.warning(f"Frame writer queue is full. Dropped: {frame_index}")
+            return False
+        return True
+
+    def close(self) -> None:
+        """キューに残っているフレームを全て保存してからスレッドを終了する"""
+        if self._is_closed:
+            return
+        self._is_closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        if self._archive is not None:
+            self._archive.close()
+        logger.info(
+            f"Frame writer closed. written: {self.written_count}, "
+            f"dropped: {self.dropped_count}, failed: {self.failed_count}"
+        )
+
+    def get_counts(self) -> Tuple[int, int, int]:
+        """保存、破棄、失敗したフレーム数を取得する
+
+        Returns:
+            Tuple[int, int, int]: 保存したフレーム数、破棄したフレーム数、保存に失敗したフレーム数
+        """
+        with self._count_lock:
+            return self.written_count, self.dropped_count, self.failed_count
+
+    def _worker(self) -> None:
+        """キューからフレームを取り出して保存する"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            is_written = self._save(*item)
+            with self._count_lock:
+                if is_written:
+                    self.written_count += 1
+                else:
+                    self.failed_count += 1
+
+    def _save(
+        self, frame_index: int, frame: np.ndarray, sample_id: int, timestamp: float
+    ) -> bool:
+        """フレームを1枚保存する
+
+        Args:
+            frame_index (int): フレーム番号
+            frame (np.ndarray): フレーム
+            sample_id (int): フレームが属するサンプルの番号
+            timestamp (float): フレームの取得時刻（秒）
+
+        Returns:
+            bool: 保存に成功したかどうか
+        """
+        if self._archive is not None:
+            try:
+                self._archive.append(frame, frame_index, sample_id, timestamp)
+            except Exception as e:
+                logger.error(f"Failed to append frame {frame_index} to archive: {e}")
+                return False
+            return True
+
+        # 再解析時にフレーム番号の連続性に頼らずサンプルごとにまとめられるよう、サンプル番号を名前に含める
+        name = (
+            f"frame_{frame_index:06d}"
+            if sample_id < 0
+            else f"frame_{sample_id:06d}_{frame_index:06d}"
+        )
+        path = self.out_dir / f"{name}.{self.frame_format}"
+        try:
+            if self.frame_format == "npy":
+                np.save(path, frame)
+            elif not cv2.imwrite(str(path), frame, self._params):
+                logger.error(f"Failed to save {path}")
+                return False
+        except Exception as e:
+            logger.error(f"Failed to save {path}: {e}")
+            return False
+
+        logger.debug(f"Frame has been saved as: {path}")
+        return True
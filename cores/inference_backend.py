@@ -0,0 +1,364 @@
+"""推論ランタイムの選択機能
+
+推論ランタイムは import せずに importlib.util.find_spec でインストールされているかを調べる。
+"auto" の場合は、起動時間と推論時間を計測したベンチマークの結果をキャッシュしておき、最も速いランタイムを選ぶ
+"""
+
+from cores.cnn import MODEL_DIR, CNNCore, get_default_model_filename
+from cores.inference_options import get_supported_backends
+from importlib import import_module, metadata
+from importlib.util import find_spec
+from pathlib import Path
+from platformdirs import user_cache_dir
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import json
+import logging
+import os
+import time
+import numpy as np
+
+logger = logging.getLogger("__main__").getChild(__name__)
+
+# 推論ランタイムを指定する環境変数
+BACKEND_ENV_VAR = "SICHIRIBE_BACKEND"
+
+# 各推論ランタイムのパッケージ名、配布パッケージ名、実装クラス、モデルファイルの拡張子
+BACKENDS: Dict[str, Dict[str, str]] = {
+    "tflite": {
+        "package": "tflite_runtime",
+        "distribution": "tflite-runtime",
+        "module": "cores.cnn_tflite",
+        "class": "CNNLite",
+        "extension": "tflite",
+    },
+    "tf": {
+        "package": "tensorflow",
+        "distribution": "tensorflow",
+        "module": "cores.cnn_tf",
+        "class": "CNNTf",
+        "extension": "keras",
+    },
+    "onnx": {
+        "package": "onnxruntime",
+        "distribution": "onnxruntime",
+        "module": "cores.cnn_onnx",
+        "class": "CNNOnnx",
+        "extension": "onnx",
+    },
+}
+
+# ベンチマークで1回に推論する桁画像の枚数と計測回数
+BENCHMARK_BATCH_SIZE = 40
+BENCHMARK_RUNS = 5
+
+# ベンチマークのスコアで想定する1プロセスあたりの推論回数。短い動画の解析では起動時間が支配的になる
+BENCHMARK_EXPECTED_BATCHES = 100
+
+
+def is_backend_available(backend: str) -> bool:
+    """推論ランタイムがインストールされているかを import せずに調べる
+
+    Args:
+        backend (str): 推論ランタイム
+
+    Returns:
+        bool: インストールされている場合はTrue
+    """
+    try:
+        return find_spec(BACKENDS[backend]["package"]) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def get_available_backends() -> List[str]:
+    """インストールされている推論ランタイムを優先順に取得する
+
+    Returns:
+        List[str]: インストールされている推論ランタイム
+    """
+    return [
+        b for b in get_supported_backends() if b != "auto" and is_backend_available(b)
+    ]
+
+
+def get_backend_class(backend: str) -> Callable[..., CNNCore]:
+    """推論ランタイムに対応する CNNCore の実装クラスを取得する
+
+    実装モジュールはランタイムを import しないため、この時点ではランタイムを読み込まない
+
+    Args:
+        backend (str): 推論ランタイム
+
+    Returns:
+        Callable[..., CNNCore]: 実装クラス
+    """
+    module = import_module(BACKENDS[backend]["module"])
+    return getattr(module, BACKENDS[backend]["class"])
+
+
+def get_model_filename(backend: str, options: Dict[str, Any]) -> str:
+    """推論ランタイムに対応するデフォルトのモデルファイル名を取得する
+
+    Args:
+        backend (str): 推論ランタイム
+        options (Dict[str, Any]): 全てのキーを含む推論ランタイムの設定
+
+    Returns:
+        str: モデルファイル名
+    """
+    return get_default_model_filename(
+        BACKENDS[backend]["extension"], options["precision"], options["model_size"]
+    )
+
+
+def get_requested_backend(options: Dict[str, Any]) -> str:
+    """設定と環境変数から指定された推論ランタイムを取得する
+
+    設定の値が "auto" の場合は環境変数 SICHIRIBE_BACKEND の値を使う
+
+    Args:
+        options (Dict[str, Any]): 全てのキーを含む推論ランタイムの設定
+
+    Raises:
+        ValueError: 環境変数の値が正しくない場合
+
+    Returns:
+        str: 推論ランタイム。指定がない場合は "auto"
+    """
+    backend = options["backend"]
+    if backend == "auto":
+        backend = os.environ.get(BACKEND_ENV_VAR, "auto").strip().lower() or "auto"
+        if backend not in get_supported_backends():
+            raise ValueError(f"Invalid {BACKEND_ENV_VAR}: {backend}")
+    return backend
+
+
+def get_benchmark_cache_path() -> Path:
+    """ベンチマーク結果のキャッシュファイルのパスを取得する
+
+    Returns:
+        Path: キャッシュファイルのパス
+    """
+    return Path(user_cache_dir("sichiribe", "EbinaKai")) / "backend_benchmark.json"
+
+
+def _load_benchmark_cache() -> Dict[str, Dict[str, float]]:
+    """ベンチマーク結果のキャッシュを読み込む
+
+    Returns:
+        Dict[str, Dict[str, float]]: キャッシュのキーと計測結果。読み込めない場合は空
+    """
+    try:
+        with open(get_benchmark_cache_path()) as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_benchmark_cache(cache: Dict[str, Dict[str, float]]) -> None:
+    """ベンチマーク結果のキャッシュを保存する
+
+    Args:
+        cache (Dict[str, Dict[str, float]]): キャッシュのキーと計測結果
+    """
+    path = get_benchmark_cache_path()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(cache, f, indent=4)
+    except OSError as e:
+        logger.warning(f"Failed to save the backend benchmark cache: {e}")
+
+
+def _get_benchmark_key(backend: str, model_path: Path, options: Dict[str, Any]) -> str:
+    """ベンチマーク結果のキャッシュのキーを作る
+
+    モデルファイルやランタイムのバージョン、スレッド数が変わった場合は計測し直す
+
+    Args:
+        backend (str): 推論ランタイム
+        model_path (Path): モデルファイルのパス
+        options (Dict[str, Any]): 全てのキーを含む推論ランタイムの設定
+
+    Returns:
+        str: キャッシュのキー
+    """
+    try:
+        version = metadata.version(BACKENDS[backend]["distribution"])
+    except metadata.PackageNotFoundError:
+        version = "unknown"
+    stat = model_path.stat()
+    return ":".join(
+        [
+            backend,
+            version,
+            str(model_path.resolve()),
+            str(stat.st_mtime_ns),
+            str(stat.st_size),
+            str(options["num_threads"]),
+        ]
+    )
+
+
+def get_benchmark_score(result: Dict[str, float]) -> float:
+    """ベンチマークの計測結果から、起動から一定回数の推論を終えるまでの推定時間を求める
+
+    Args:
+        result (Dict[str, float]): 読み込み時間 load_sec と1回の推論時間 infer_sec
+
+    Returns:
+        float: 推定時間（秒）。小さいほど速い
+    """
+    return result["load_sec"] + BENCHMARK_EXPECTED_BATCHES * result["infer_sec"]
+
+
+def benchmark_backend(
+    backend: str, num_digits: int, model_filename: str, options: Dict[str, Any]
+) -> Tuple[Dict[str, float], CNNCore]:
+    """推論ランタイムの読み込み時間と推論時間を計測する
+
+    Args:
+        backend (str): 推論ランタイム
+        num_digits (int): 推論する桁数
+        model_filename (str): モデルファイル名
+        options (Dict[str, Any]): 全てのキーを含む推論ランタイムの設定
+
+    Returns:
+        Tuple[Dict[str, float], CNNCore]: 計測結果と、モデルを読み込み済みの推論モデル
+    """
+    start = time.perf_counter()
+    detector = get_backend_class(backend)(
+        num_digits=num_digits, model_filename=model_filename, inference_options=options
+    )
+    detector.ensure_model_loaded()
+    load_sec = time.perf_counter() - start
+
+    images = np.zeros(
+        (
+            BENCHMARK_BATCH_SIZE,
+            detector.image_height,
+            detector.image_width,
+            detector.color_setting,
+        ),
+        dtype=np.float32,
+    )
+    detector.inference_batch(images)  # 初回の推論は計測しない
+    start = time.perf_counter()
+    for _ in range(BENCHMARK_RUNS):
+        detector.inference_batch(images)
+    infer_sec = (time.perf_counter() - start) / BENCHMARK_RUNS
+
+    result = {"load_sec": load_sec, "infer_sec": infer_sec}
+    logger.info(f"Benchmark of {backend}: {result}")
+    return result, detector
+
+
+def select_backend(
+    num_digits: int, options: Dict[str, Any]
+) -> Tuple[str, Optional[CNNCore]]:
+    """インストールされている推論ランタイムとモデルファイルから、最も速い推論ランタイムを選ぶ
+
+    キャッシュにない組み合わせはこの場で計測してキャッシュに保存する。
+    計測で作成した推論モデルが選ばれた場合は、読み込み済みのモデルをそのまま返す
+
+    Args:
+        num_digits (int): 推論する桁数
+        options (Dict[str, Any]): 全てのキーを含む推論ランタイムの設定
+
+    Raises:
+        ImportError: 使用できる推論ランタイムがない場合
+
+    Returns:
+        Tuple[str, Optional[CNNCore]]: 推論ランタイムと、計測で作成した推論モデル（ない場合はNone）
+    """
+    candidates = [
+        b
+        for b in get_available_backends()
+        if (MODEL_DIR / get_model_filename(b, options)).exists()
+    ]
+    if len(candidates) == 0:
+        raise ImportError(
+            "No compatible model library found. Please install TensorFlow, TensorFlow Lite, or ONNX Runtime."
+        )
+    if len(candidates) == 1:
+        return candidates[0], None
+
+    cache = _load_benchmark_cache()
+    scores: Dict[str, float] = {}
+    detectors: Dict[str, CNNCore] = {}
+    for backend in candidates:
+        model_filename = get_model_filename(backend, options)
+        key = _get_benchmark_key(backend, MODEL_DIR / model_filename, options)
+        if key not in cache:
+            try:
+                cache[key], detectors[backend] = benchmark_backend(
+                    backend, num_digits, model_filename, options
+                )
+            except Exception as e:
+                logger.warning(f"Failed to benchmark {backend}: {e}")
+                continue
+            _save_benchmark_cache(cache)
+        scores[backend] = get_benchmark_score(cache[key])
+
+    if len(scores) == 0:
+        return candidates[0], None
+    backend = min(scores, key=lambda b: scores[b])
+    logger.debug(f"Backend scores: {scores}")
+    return backend, detectors.get(backend)
+
+
+def create_detector(
+    num_digits: int,
+    model_filename: Optional[str],
+    options: Dict[str, Any],
+) -> CNNCore:
+    """設定に従って推論ランタイムを選び、推論モデルを作成する
+
+    推論ランタイムは最初の推論まで読み込まない
+
+    Args:
+        num_digits (int): 推論する桁数
+        model_filename (Optional[str]): モデルファイル名。Noneの場合は推論ランタイムに対応するデフォルトのモデル
+        options (Dict[str, Any]): 全てのキーを含む推論ランタイムの設定
+
+    Raises:
+        ImportError: 指定の推論ランタイム、モデルファイルに対応する推論ランタイム、または使用できる推論ランタイムがない場合
+        ValueError: モデルファイルの拡張子に対応する推論ランタイムがない場合
+
+    Returns:
+        CNNCore: 推論モデル
+    """
+    backend = get_requested_backend(options)
+    detector: Optional[CNNCore] = None
+    if backend == "auto" and model_filename is not None:
+        # モデルファイルが指定されている場合は拡張子から推論ランタイムを決める。
+        # 他のランタイムやデフォルトのモデルでは指定のモデルを読み込めないため、自動選択には戻さない
+        extension = Path(model_filename).suffix.lstrip(".")
+        candidates = [b for b, v in BACKENDS.items() if v["extension"] == extension]
+        if len(candidates) == 0:
+            raise ValueError(f"Unsupported model file: {model_filename}")
+        available = [b for b in candidates if is_backend_available(b)]
+        if len(available) == 0:
+            raise ImportError(
+                f"Inference backend for {model_filename} not installed: "
+                f"{', '.join(BACKENDS[b]['package'] for b in candidates)}"
+            )
+        backend = available[0]
+    if backend == "auto":
+        backend, detector = select_backend(num_digits, options)
+    elif not is_backend_available(backend):
+        raise ImportError(f"Inference backend not installed: {backend}")
+
+    logger.info(f"Using inference backend: {backend}")
+    if detector is not None:
+        return detector
+    return get_backend_class(backend)(
+        num_digits=num_digits,
+        model_filename=(
+            get_model_filename(backend, options)
+            if model_filename is None
+            else model_filename
+        ),
+        inference_options=options,
+    )
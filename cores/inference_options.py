@@ -0,0 +1,281 @@
+"""推論ランタイムのスレッド数や最適化の設定
+
+設定は辞書で扱い、設定ファイルの "inference" キーに保存する。0 や None の項目はランタイムの既定値を使う。
+
+Keys:
+    - backend: 推論ランタイム。"auto" の場合は環境変数 SICHIRIBE_BACKEND、未設定ならベンチマークの結果で選ぶ
+    - num_threads: 演算内の並列スレッド数 (ONNX Runtime の intra_op_num_threads, TFLite の num_threads)
+    - inter_op_threads: 演算間の並列スレッド数 (ONNX Runtime, TensorFlow)
+    - graph_optimization: グラフ最適化のレベル (ONNX Runtime)
+    - memory_arena: CPU メモリアリーナを使うかどうか (ONNX Runtime)
+    - providers: 実行プロバイダの優先順のリスト。空の場合は既定 (ONNX Runtime)
+    - xnnpack: XNNPACK デリゲートを使うかどうか (TFLite)
+    - precision: 使用するモデルの精度。"int8" の場合は train/quantize.py で量子化したモデルを使う
+    - model_size: 使用するモデルの入力サイズ。model_{size}x{size}.* を使う
+    - early_exit: 数フレームずつ推論し、多数決の結果が確定した時点で残りのフレームを推論しない
+    - early_exit_confidence: 全フレームの結果が一致した桁を確定とみなす平均確率の閾値。0 の場合は票数のみで判定する
+    - micro_batch_frames: early_exit で1回に推論するフレーム数
+    - aggregation: 複数フレームの推論結果の集約方法。"vote" は多数決、"mean" は平均確率、"log" は対数確率の和
+    - cache_size: 桁画像のフィンガープリントをキーとする推論結果のキャッシュの件数。0 の場合はキャッシュしない
+"""
+
+import argparse
+import os
+from typing import Any, Dict, List, Optional
+
+
+def get_supported_backends() -> List[str]:
+    """サポートされている推論ランタイムを取得する
+
+    Returns:
+        List[str]: サポートされている推論ランタイム。"auto" 以外は優先順
+    """
+    return ["auto", "tflite", "tf", "onnx"]
+
+
+def get_supported_graph_optimizations() -> List[str]:
+    """サポートされているグラフ最適化のレベルを取得する
+
+    Returns:
+        List[str]: サポートされているグラフ最適化のレベル
+    """
+    return ["disable", "basic", "extended", "all"]
+
+
+def get_supported_precisions() -> List[str]:
+    """サポートされているモデルの精度を取得する
+
+    Returns:
+        List[str]: サポートされているモデルの精度
+    """
+    return ["float", "int8"]
+
+
+def get_supported_aggregations() -> List[str]:
+    """サポートされている推論結果の集約方法を取得する
+
+    Returns:
+        List[str]: サポートされている推論結果の集約方法
+    """
+    return ["vote", "mean", "log"]
+
+
+def get_default_inference_options() -> Dict[str, Any]:
+    """推論ランタイムの既定の設定を取得する
+
+    Returns:
+        Dict[str, Any]: 推論ランタイムの設定
+    """
+    return {
+        "backend": "auto",
+        "num_threads": 0,
+        "inter_op_threads": 0,
+        "graph_optimization": "all",
+        "memory_arena": True,
+        "providers": [],
+        "xnnpack": True,
+        "precision": "float",
+        "model_size": 100,
+        "early_exit": False,
+        "early_exit_confidence": 0.95,
+        "micro_batch_frames": 2,
+        "aggregation": "vote",
+        "cache_size": 0,
+    }
+
+
+def is_valid_inference_options(options: Any) -> bool:
+    """推論ランタイムの設定が正しいかどうかを判定する
+
+    含まれていないキーは既定値を使うため、一部のキーだけを含む設定も正しいとみなす
+
+    Args:
+        options (Any): 推論ランタイムの設定
+
+    Returns:
+        bool: 正しい場合はTrue
+    """
+    if not isinstance(options, dict):
+        return False
+
+    rules = {
+        "backend": lambda x: x in get_supported_backends(),
+        "num_threads": lambda x: isinstance(x, int) and x >= 0,
+        "inter_op_threads": lambda x: isinstance(x, int) and x >= 0,
+        "graph_optimization": lambda x: x in get_supported_graph_optimizations(),
+        "memory_arena": lambda x: isinstance(x, bool),
+        "providers": lambda x: isinstance(x, list)
+        and all(isinstance(p, str) for p in x),
+        "xnnpack": lambda x: isinstance(x, bool),
+        "precision": lambda x: x in get_supported_precisions(),
+        "model_size": lambda x: isinstance(x, int) and x > 0,
+        "early_exit": lambda x: isinstance(x, bool),
+        "early_exit_confidence": lambda x: isinstance(x, (int, float)) and 0 <= x <= 1,
+        "micro_batch_frames": lambda x: isinstance(x, int) and x >= 1,
+        "aggregation": lambda x: x in get_supported_aggregations(),
+        "cache_size": lambda x: isinstance(x, int) and x >= 0,
+    }
+    return all(k in rules and rules[k](v) for k, v in options.items())
+
+
+def resolve_inference_options(
+    options: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """既定値で補完した推論ランタイムの設定を取得する
+
+    Args:
+        options (Optional[Dict[str, Any]], optional): 推論ランタイムの設定。Noneの場合は既定の設定
+
+    Raises:
+        ValueError: 設定が正しくない場合
+
+    Returns:
+        Dict[str, Any]: 全てのキーを含む推論ランタイムの設定
+    """
+    if options is None:
+        return get_default_inference_options()
+    if not is_valid_inference_options(options):
+        raise ValueError(f"Invalid inference options: {options}")
+    return {**get_default_inference_options(), **options}
+
+
+def split_threads(
+    options: Optional[Dict[str, Any]], num_workers: int
+) -> Dict[str, Any]:
+    """複数のプロセスで推論する場合に、CPU コアをプロセス間で分け合うようスレッド数を決める
+
+    スレッド数が明示されている場合はそのまま使う
+
+    Args:
+        options (Optional[Dict[str, Any]]): 推論ランタイムの設定
+        num_workers (int): 推論を行うプロセス数
+
+    Returns:
+        Dict[str, Any]: 推論ランタイムの設定
+    """
+    options = resolve_inference_options(options)
+    if options["num_threads"] == 0 and num_workers > 1:
+        options["num_threads"] = max(1, (os.cpu_count() or 1) // num_workers)
+    if options["inter_op_threads"] == 0 and num_workers > 1:
+        options["inter_op_threads"] = 1
+    return options
+
+
+def add_inference_arguments(parser: argparse.ArgumentParser) -> None:
+    """推論ランタイムの設定をコマンドライン引数に追加する
+
+    Args:
+        parser (argparse.ArgumentParser): 引数を追加するパーサ
+    """
+    parser.add_argument(
+        "--backend",
+        help="推論ランタイム（auto の場合は環境変数 SICHIRIBE_BACKEND またはベンチマークの結果で選ぶ）",
+        choices=get_supported_backends(),
+        default=None,
+    )
+    parser.add_argument(
+        "--inference-threads",
+        help="推論の演算内の並列スレッド数（0の場合はランタイムの既定値）",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--inter-op-threads",
+        help="推論の演算間の並列スレッド数（0の場合はランタイムの既定値）",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--graph-optimization",
+        help="ONNX Runtime のグラフ最適化のレベル",
+        choices=get_supported_graph_optimizations(),
+        default=None,
+    )
+    parser.add_argument(
+        "--providers",
+        help="ONNX Runtime の実行プロバイダ（優先順）",
+        nargs="+",
+        default=None,
+    )
+    parser.add_argument(
+        "--precision",
+        help="使用するモデルの精度（int8 は量子化済みのモデル）",
+        choices=get_supported_precisions(),
+        default=None,
+    )
+    parser.add_argument(
+        "--model-size",
+        help="使用するモデルの入力サイズ（例: 28, 48, 100）",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--early-exit",
+        help="多数決の結果が確定した時点で残りのフレームの推論を省く（--no-early-exit で設定ファイルの指定を無効にする）",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+    )
+    parser.add_argument(
+        "--early-exit-confidence",
+        help="全フレームの結果が一致した桁を確定とみなす平均確率の閾値（0の場合は票数のみで判定）",
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--micro-batch-frames",
+        help="早期終了する場合に1回に推論するフレーム数",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--aggregation",
+        help="複数フレームの推論結果の集約方法（vote: 多数決, mean: 平均確率, log: 対数確率の和）",
+        choices=get_supported_aggregations(),
+        default=None,
+    )
+    parser.add_argument(
+        "--cache-size",
+        help="桁画像ごとの推論結果をキャッシュする件数（0の場合はキャッシュしない）",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--disable-memory-arena",
+        help="ONNX Runtime の CPU メモリアリーナを無効にする",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--disable-xnnpack",
+        help="TFLite の XNNPACK デリゲートを無効にする",
+        action="store_true",
+    )
+
+
+def pop_inference_arguments(args: Dict[str, Any]) -> Dict[str, Any]:
+    """コマンドライン引数から推論ランタイムの設定を取り出す
+
+    指定された引数だけを含む設定を返し、取り出した引数は args から削除する
+
+    Args:
+        args (Dict[str, Any]): コマンドライン引数の辞書
+
+    Returns:
+        Dict[str, Any]: 推論ランタイムの設定
+    """
+    options = {
+        "backend": args.pop("backend"),
+        "num_threads": args.pop("inference_threads"),
+        "inter_op_threads": args.pop("inter_op_threads"),
+        "graph_optimization": args.pop("graph_optimization"),
+        "providers": args.pop("providers"),
+        "precision": args.pop("precision"),
+        "model_size": args.pop("model_size"),
+        "early_exit": args.pop("early_exit"),
+        "early_exit_confidence": args.pop("early_exit_confidence"),
+        "micro_batch_frames": args.pop("micro_batch_frames"),
+        "aggregation": args.pop("aggregation"),
+        "cache_size": args.pop("cache_size"),
+        "memory_arena": False if args.pop("disable_memory_arena") else None,
+        "xnnpack": False if args.pop("disable_xnnpack") else None,
+    }
+    return {k: v for k, v in options.items() if v is not None}
@@ -0,0 +1,287 @@
+"""リアルタイム解析のパイプライン処理機能
+
+キャプチャ、切り出し・二値化、推論の各段階を別スレッドで実行し、
+段階の間を上限付きのキューでつなぐ。OpenCV や推論ランタイムは処理中に GIL を解放するため、
+前のサンプルの推論中に次のサンプルのキャプチャや切り出しを並行して進められる。
+フレームの保存は FrameWriter に任せ、書き込みが追いつかない場合はフレームを破棄する
+"""
+
+from cores.capture import FrameCapture
+from cores.change_detector import DigitChangeDetector
+from cores.cnn import CNNCore
+from cores.frame_editor import FrameEditor
+from cores.frame_writer import FrameWriter
+from datetime import timedelta
+from pathlib import Path
+from queue import Queue
+from typing import Any, Callable, Generator, List, Optional, Tuple
+import logging
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger("__main__").getChild(__name__)
+
+# 段階間のキューで保持するサンプル数の上限
+STAGE_QUEUE_SIZE = 2
+
+
+class LivePipeline:
+    """リアルタイム解析をパイプライン処理するクラス
+
+    サンプリングのタイミングは開始時刻からの絶対時刻で決めるため、処理時間によってタイムスタンプがずれない
+
+    Attributes:
+        binarize_th: 二値化の閾値。実行中に変更すると次のサンプルから反映される
+        error: 実行中に発生したエラーの内容。エラーがない場合はNone
+    """
+
+    def __init__(
+        self,
+        frame_capture: FrameCapture,
+        frame_editor: FrameEditor,
+        detector: CNNCore,
+        click_points: List,
+        batch_frames: int,
+        sampling_sec: float,
+        total_sampling_sec: float,
+        binarize_th: Optional[int] = None,
+        frames_dir: Optional[Path] = None,
+        frame_format: str = "jpg",
+        change_threshold: float = 0.0,
+    ) -> None:
+        """
+        Args:
+            frame_capture (FrameCapture): バックグラウンドで読み込み中のキャプチャ
+            frame_editor (FrameEditor): 切り出しに使用する FrameEditor
+            detector (CNNCore): 推論に使用するモデル
+            click_points (List): クリックポイント
+            batch_frames (int): 1回のサンプリングで取得するフレーム数
+            sampling_sec (float): サンプリング間隔（秒）
+            total_sampling_sec (float): サンプリングする合計時間（秒）
+            binarize_th (Optional[int], optional): 二値化の閾値。Noneの場合は自動設定
+            frames_dir (Optional[Path], optional): 切り出したフレームの保存先。Noneの場合は保存しない
+            frame_format (str, optional): フレームの保存形式。get_supported_frame_formats() を参照
+            change_threshold (float, optional): 桁画像が変化したとみなす画素の割合。0より大きい場合は変化した桁だけを推論する
+        """
+        self.frame_capture = frame_capture
+        self.frame_editor = frame_editor
+        self.detector = detector
+        self.click_points = click_points
+        self.batch_frames = batch_frames
+        self.sampling_sec = sampling_sec
+        self.total_sampling_sec = total_sampling_sec
+        self.binarize_th = binarize_th
+        self.frame_writer = (
+            None
+            if frames_dir is None
+            else FrameWriter(frames_dir, frame_format=frame_format, block=False)
+        )
+        self.change_detector = (
+            DigitChangeDetector(detector.num_digits, change_threshold)
+            if change_threshold > 0
+            else None
+        )
+        self.error: Optional[str] = None
+
+        self._stop_event = threading.Event()
+        self._crop_queue: Queue = Queue(maxsize=STAGE_QUEUE_SIZE)
+        self._infer_queue: Queue = Queue(maxsize=STAGE_QUEUE_SIZE)
+        self._result_queue: Queue = Queue()
+        self._threads: List[threading.Thread] = []
+        self._saved_frame_count = 0
+        self._sample_count = 0
+        self.start_time = 0.0
+        self.end_time = 0.0
+
+    def start(self) -> None:
+        """各段階のスレッドを開始する"""
+        self.start_time = time.time()
+        self.end_time = self.start_time + self.total_sampling_sec
+
+        stages = [self._capture_stage, self._crop_stage, self._infer_stage]
+        self._threads = [
+            threading.Thread(target=stage, daemon=True) for stage in stages
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.debug("Live pipeline started.")
+
+    def stop(self) -> None:
+        """サンプリングを終了する
+
+        キャプチャ済みのサンプルは推論まで処理され、get_result で取得できる
+        """
+        self._stop_event.set()
+
+    def join(self) -> None:
+        """全ての段階のスレッドとフレームの保存が終了するまで待機する"""
+        for thread in self._threads:
+            thread.join()
+        if self.frame_writer is not None:
+            self.frame_writer.close()
+        logger.debug("Live pipeline finished.")
+
+    def get_result(
+        self, timeout: Optional[float] = None
+    ) -> Optional[Tuple[int, float, str, np.ndarray, List[float], List[float]]]:
+        """推論結果を1件取得する
+
+        Args:
+            timeout (Optional[float], optional): 最大の待機時間（秒）。Noneの場合は結果が出るまで待機する
+
+        Raises:
+            queue.Empty: タイムアウトした場合
+
+        Returns:
+            Optional[Tuple[int, float, str, np.ndarray, List[float], List[float]]]:
+                推論結果、エラー率、タイムスタンプ、先頭の切り出し画像、桁ごとの確信度とエントロピー。全ての処理が終了した場合はNone
+        """
+        return self._result_queue.get(timeout=timeout)
+
+    def results(
+        self,
+    ) -> Generator[
+        Tuple[int, float, str, np.ndarray, List[float], List[float]], None, None
+    ]:
+        """全ての推論結果を順に返すジェネレータ
+
+        Yields:
+            Tuple[int, float, str, np.ndarray, List[float], List[float]]:
+                推論結果、エラー率、タイムスタンプ、先頭の切り出し画像、桁ごとの確信度とエントロピー
+        """
+        while True:
+            result = self.get_result()
+            if result is None:
+                break
+            yield result
+
+    def _run_stage(
+        self,
+        input_queue: Queue,
+        process: Callable[[Any], None],
+        output_queues: List[Queue],
+    ) -> None:
+        """入力キューの要素を終端(None)まで処理する
+
+        処理中にエラーが発生した場合はパイプライン全体を停止し、上流が詰まらないよう残りの入力を読み捨てる
+
+        Args:
+            input_queue (Queue): 入力キュー
+            process (Callable[[Any], None]): 要素ごとの処理
+            output_queues (List[Queue]): 終了時に終端を送るキュー
+        """
+        is_failed = False
+        while True:
+            item = input_queue.get()
+            if item is None:
+                break
+            if is_failed:
+                continue
+
+            try:
+                process(item)
+            except Exception as e:
+                logger.error(f"Live pipeline stage failed: {e}")
+                self.error = str(e)
+                self._stop_event.set()
+                is_failed = True
+
+        for output_queue in output_queues:
+            output_queue.put(None)
+
+    def _capture_stage(self) -> None:
+        """サンプリング間隔ごとにフレームを取得する"""
+        next_sampling_time = self.start_time
+        try:
+            while not self._stop_event.is_set() and time.time() < self.end_time:
+                frames = self.frame_capture.get_fresh_frames(self.batch_frames)
+                if len(frames) == 0:
+                    self.error = "フレームの取得に失敗しました"
+                    break
+
+                self._crop_queue.put(frames)
+
+                # 開始時刻を基準に次のサンプリング時刻を決める
+                next_sampling_time += self.sampling_sec
+                time_to_wait = next_sampling_time - time.time()
+                if time_to_wait > 0:
+                    logger.debug(f"Waiting for {time_to_wait:.2f}s")
+                    self._stop_event.wait(time_to_wait)
+                else:
+                    logger.warning(f"Sampling is behind by {-time_to_wait:.2f}s")
+                    next_sampling_time = time.time()
+        except Exception as e:
+            logger.error(f"Live pipeline stage failed: {e}")
+            self.error = str(e)
+        finally:
+            self._crop_queue.put(None)
+
+    def _crop_stage(self) -> None:
+        """フレームを切り出し、推論用に前処理する"""
+        self._run_stage(self._crop_queue, self._crop, [self._infer_queue])
+
+    def _crop(self, frames: List[Tuple[np.ndarray, float]]) -> None:
+        """1サンプル分のフレームを切り出して前処理する
+
+        Args:
+            frames (List[Tuple[np.ndarray, float]]): フレームと取得時刻のリスト
+        """
+        cropped_frames = []
+        for frame, captured_at in frames:
+            cropped_frame = self.frame_editor.crop(frame, self.click_points)
+            if cropped_frame is None:
+                logger.error("Failed to crop the frame.")
+                continue
+            cropped_frames.append(cropped_frame)
+
+            if self.frame_writer is not None:
+                self.frame_writer.write(
+                    self._saved_frame_count,
+                    cropped_frame,
+                    sample_id=self._sample_count,
+                    timestamp=captured_at - self.start_time,
+                )
+                self._saved_frame_count += 1
+
+        self._sample_count += 1
+        if len(cropped_frames) == 0:
+            return
+
+        # 最初のフレームの取得時刻から "HH:MM:SS" 形式のタイムスタンプを生成
+        elapsed_time = frames[0][1] - self.start_time
+        timestamp = str(timedelta(seconds=int(elapsed_time)))
+
+        digit_images = self.detector.prepare_batch(cropped_frames, self.binarize_th)
+        self._infer_queue.put((digit_images, timestamp, cropped_frames[0]))
+
+    def _infer_stage(self) -> None:
+        """前処理済みの桁画像をまとめて推論する"""
+        self._run_stage(self._infer_queue, self._infer, [self._result_queue])
+
+    def _infer(self, item: Tuple[np.ndarray, str, np.ndarray]) -> None:
+        """1サンプル分の桁画像を推論する
+
+        Args:
+            item (Tuple[np.ndarray, str, np.ndarray]): 桁画像、タイムスタンプ、先頭の切り出し画像
+        """
+        digit_images, timestamp, first_frame = item
+        if self.change_detector is None:
+            value, failed_rate = self.detector.predict_prepared(digit_images)
+        else:
+            # 前回から変化した桁だけを推論する
+            changed_digits = self.change_detector.detect(digit_images)
+            value, failed_rate = self.detector.predict_changed(
+                digit_images, changed_digits
+            )
+        logger.info(f"Detected: {value}, Failed rate: {failed_rate}")
+        self._result_queue.put(
+            (
+                value,
+                failed_rate,
+                timestamp,
+                first_frame,
+                self.detector.last_confidences,
+                self.detector.last_entropies,
+            )
+        )
@@ -0,0 +1,69 @@
+"""プロセス内で推論モデルを共有する機能
+
+GUI では解析を開始するたびにワーカーを作り直すため、読み込み済みの推論モデルをここで保持して使い回す
+"""
+
+from cores.cnn import CNNCore, cnn_init
+from cores.inference_options import resolve_inference_options
+from typing import Any, Dict, Optional, Tuple
+import json
+import logging
+import threading
+
+logger = logging.getLogger("__main__").getChild(__name__)
+
+_detectors: Dict[Tuple[int, Optional[str], str], CNNCore] = {}
+_lock = threading.Lock()
+
+
+def get_detector(
+    num_digits: int,
+    model_filename: Optional[str] = None,
+    inference_options: Optional[Dict[str, Any]] = None,
+) -> CNNCore:
+    """桁数、モデルファイル、推論ランタイムの設定が同じ推論モデルを1つだけ作成して共有する
+
+    Args:
+        num_digits (int): 推論する桁数
+        model_filename (Optional[str], optional): モデルファイル名。Noneの場合はデフォルトのモデル
+        inference_options (Optional[Dict[str, Any]], optional): 推論ランタイムの設定。Noneの場合は既定の設定
+
+    Returns:
+        CNNCore: 推論モデル
+    """
+    options = resolve_inference_options(inference_options)
+    key = (num_digits, model_filename, json.dumps(options, sort_keys=True))
+    with _lock:
+        detector = _detectors.get(key)
+        if detector is None:
+            detector = cnn_init(num_digits, model_filename, options)
+            _detectors[key] = detector
+        else:
+            logger.debug("Reusing the loaded model.")
+    return detector
+
+
+def warm_up(
+    num_digits: int,
+    model_filename: Optional[str] = None,
+    inference_options: Optional[Dict[str, Any]] = None,
+) -> CNNCore:
+    """推論モデルを作成し、モデルの読み込みとダミーの入力での推論まで済ませておく
+
+    Args:
+        num_digits (int): 推論する桁数
+        model_filename (Optional[str], optional): モデルファイル名。Noneの場合はデフォルトのモデル
+        inference_options (Optional[Dict[str, Any]], optional): 推論ランタイムの設定。Noneの場合は既定の設定
+
+    Returns:
+        CNNCore: 推論モデル
+    """
+    detector = get_detector(num_digits, model_filename, inference_options)
+    detector.ensure_model_loaded()
+    return detector
+
+
+def clear_detectors() -> None:
+    """共有している推論モデルを全て破棄する"""
+    with _lock:
+        _detectors.clear()
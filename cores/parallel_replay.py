@@ -0,0 +1,231 @@
+"""動画ファイルを区間に分割し、複数プロセスで並列に解析する機能"""
+
+from cores.cnn import cnn_init
+from cores.common import clear_directory
+from cores.frame_editor import FrameEditor
+from cores.inference_backend import get_requested_backend, select_backend
+from cores.inference_options import split_threads
+from cores.prefetch import PREFETCH_BATCHES, prefetch_generator
+from collections import deque
+from pathlib import Path
+from queue import Empty
+from typing import Any, Deque, Dict, Generator, List, Optional, Tuple
+import logging
+import math
+import multiprocessing as mp
+import cv2
+import numpy as np
+
+logger = logging.getLogger("__main__").getChild(__name__)
+
+QUEUE_TIMEOUT_SEC = 1.0
+
+
+def split_segments(
+    video_path: str,
+    video_skip_sec: int,
+    sampling_sec: int,
+    num_segments: int,
+) -> List[Tuple[int, Optional[int]]]:
+    """動画をサンプリング位置の境界に沿って連続した区間に分割する
+
+    区間はサンプルの番号で表す。各区間は frame_devide_generator の first_sample と end_sample に渡し、
+    一括で解析した場合と同じフレーム位置（video_skip_sec の位置からサンプリング間隔のフレーム数の倍数）から取得する
+
+    Args:
+        video_path (str): 動画ファイルのパス
+        video_skip_sec (int): 動画の開始位置をスキップする秒数
+        sampling_sec (int): サンプリング間隔
+        num_segments (int): 分割数
+
+    Returns:
+        List[Tuple[int, Optional[int]]]: 各区間の最初のサンプルの番号と終了位置のサンプルの番号。最後の区間の終了位置はNone
+    """
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    cap.release()
+
+    if fps <= 0 or total_frames <= 0:
+        logger.warning("Could not get the video length. Using a single segment.")
+        return [(0, None)]
+
+    interval_frames = 1 if sampling_sec == 0 else int(fps * sampling_sec)
+    skip_frames = int(fps * video_skip_sec)
+    num_samples = max(1, math.ceil((total_frames - skip_frames) / interval_frames))
+    num_segments = max(1, min(num_segments, num_samples))
+
+    bounds = [num_samples * i // num_segments for i in range(num_segments + 1)]
+    segments: List[Tuple[int, Optional[int]]] = [
+        (bounds[i], bounds[i + 1]) for i in range(num_segments)
+    ]
+    segments[-1] = (segments[-1][0], None)
+    return segments
+
+
+def _replay_segment(
+    segment_index: int,
+    settings: Dict[str, Any],
+    first_sample: int,
+    end_sample: Optional[int],
+    binarize_th: Optional[int],
+    queue: Any,
+) -> None:
+    """1つの区間を解析し、結果をキューに送る（子プロセスで実行される）
+
+    Args:
+        segment_index (int): 区間の番号
+        settings (Dict[str, Any]): 設定情報
+        first_sample (int): 区間の最初のサンプルの番号
+        end_sample (Optional[int]): 区間の終了位置のサンプルの番号
+        binarize_th (Optional[int]): 二値化の閾値
+        queue (Any): 結果を送るキュー
+    """
+    try:
+        detector = cnn_init(
+            num_digits=settings["num_digits"],
+            inference_options=settings.get("inference"),
+        )
+        # モデルの入力サイズで切り出し、推論前のリサイズを省く
+        frame_editor = FrameEditor(
+            settings["num_digits"],
+            crop_width=detector.crop_size,
+            crop_height=detector.crop_size,
+        )
+        for frames, timestamp in prefetch_generator(
+            frame_editor.frame_devide_generator(
+                video_path=settings["video_path"],
+                video_skip_sec=settings["video_skip_sec"],
+                sampling_sec=settings["sampling_sec"],
+                batch_frames=settings["batch_frames"],
+                save_frame=settings["save_frame"],
+                out_dir=str(Path(settings["out_dir"]) / f"segment_{segment_index:02d}"),
+                click_points=settings["click_points"],
+                skip_mode=settings.get("skip_mode", "auto"),
+                frame_format=settings.get("frame_format", "jpg"),
+                gray_decode=settings.get("gray_decode", False),
+                frame_source=settings.get("frame_source", "opencv"),
+                first_sample=first_sample,
+                end_sample=end_sample,
+            ),
+            settings.get("prefetch_batches", PREFETCH_BATCHES),
+        ):
+            detection = detector.predict_with_confidence(frames, binarize_th)
+            result, failed_rate, confidences, entropies = detection
+            queue.put(
+                (
+                    "result",
+                    segment_index,
+                    (frames[0], result, failed_rate, timestamp, confidences, entropies),
+                )
+            )
+        queue.put(("done", segment_index, None))
+    except Exception as e:
+        queue.put(("error", segment_index, str(e)))
+
+
+def parallel_replay_generator(
+    settings: Dict[str, Any],
+    num_workers: int,
+    binarize_th: Optional[int] = None,
+) -> Generator[
+    Tuple[Optional[np.ndarray], int, float, str, List[float], List[float]], None, None
+]:
+    """動画を区間ごとに別プロセスで解析し、結果をタイムスタンプ順に返す
+
+    各プロセスは独自の VideoCapture と推論モデルを持つ。先頭の区間の結果は逐次返し、後続の区間の結果は前の区間が終わるまでバッファする
+
+    Args:
+        settings (Dict[str, Any]): 設定情報。click_points は4点が設定済みである必要がある
+        num_workers (int): プロセス数
+        binarize_th (Optional[int], optional): 二値化の閾値。Noneの場合は自動設定。デフォルトはNone
+
+    Raises:
+        ValueError: click_points が設定されていない場合
+        RuntimeError: 子プロセスでエラーが発生した場合
+
+    Yields:
+        Tuple[Optional[np.ndarray], int, float, str, List[float], List[float]]:
+            - サンプルの先頭フレーム。バッファされていた区間の結果ではNone
+            - 推論結果
+            - エラー率
+            - タイムスタンプ（文字列）
+            - 桁ごとの確信度
+            - 桁ごとのエントロピー
+    """
+    if len(settings["click_points"]) != 4:
+        raise ValueError("click_points must be selected before parallel replay.")
+
+    segments = split_segments(
+        settings["video_path"],
+        settings["video_skip_sec"],
+        settings["sampling_sec"],
+        num_workers,
+    )
+    logger.info(f"Replay with {len(segments)} segments: {segments}")
+
+    if settings["save_frame"]:
+        Path(settings["out_dir"]).mkdir(parents=True, exist_ok=True)
+        clear_directory(settings["out_dir"])
+
+    # 各プロセスの推論スレッドが CPU コアを奪い合わないようスレッド数を分ける
+    inference = split_threads(settings.get("inference"), len(segments))
+    if get_requested_backend(inference) == "auto":
+        # 各プロセスでベンチマークを繰り返さないよう、推論ランタイムを先に決めておく
+        inference["backend"], _ = select_backend(settings["num_digits"], inference)
+    settings = {**settings, "inference": inference}
+
+    # Qt やスレッドを持つ親プロセスを fork しないよう spawn を使用する
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    processes = [
+        ctx.Process(
+            target=_replay_segment,
+            args=(i, settings, first_sample, end_sample, binarize_th, queue),
+            daemon=True,
+        )
+        for i, (first_sample, end_sample) in enumerate(segments)
+    ]
+    for process in processes:
+        process.start()
+
+    buffers: List[
+        Deque[Tuple[Optional[np.ndarray], int, float, str, List[float], List[float]]]
+    ] = [deque() for _ in segments]
+    is_done = [False] * len(segments)
+    current = 0
+
+    try:
+        while current < len(segments):
+            # 順番が回ってきた区間の結果を返す
+            if buffers[current]:
+                yield buffers[current].popleft()
+                continue
+            if is_done[current]:
+                current += 1
+                continue
+
+            try:
+                kind, index, payload = queue.get(timeout=QUEUE_TIMEOUT_SEC)
+            except Empty:
+                for i, process in enumerate(processes):
+                    if not is_done[i] and not process.is_alive():
+                        raise RuntimeError(f"Segment {i} exited unexpectedly.")
+                continue
+
+            if kind == "result":
+                if index != current:
+                    # バッファする区間のフレームはメモリ節約のため破棄する
+                    payload = (None, *payload[1:])
+                buffers[index].append(payload)
+            elif kind == "done":
+                is_done[index] = True
+            else:
+                raise RuntimeError(f"Segment {index} failed: {payload}")
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        queue.close()
+        logger.info("All replay processes finished.")
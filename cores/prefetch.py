@@ -0,0 +1,90 @@
+"""ジェネレータの先読み機能
+
+動画のデコードや切り出しをバックグラウンドスレッドで先に進めておき、推論と並行して実行する。
+OpenCV や推論ランタイムは処理中に GIL を解放するため、2コア以上あればデコードと推論の時間が重なる
+"""
+
+from queue import Empty, Full, Queue
+from typing import Any, Generator, Iterable, TypeVar
+import logging
+import threading
+
+logger = logging.getLogger("__main__").getChild(__name__)
+
+T = TypeVar("T")
+
+# 先読みして保持するバッチ数の既定値
+PREFETCH_BATCHES = 2
+
+# キューが一杯の場合に停止の指示を確認する間隔
+PUT_TIMEOUT_SEC = 0.1
+
+
+def prefetch_generator(
+    iterable: Iterable[T], max_prefetch: int = PREFETCH_BATCHES
+) -> Generator[T, None, None]:
+    """要素をバックグラウンドスレッドで先読みして返すジェネレータ
+
+    先読みする要素数は max_prefetch までとし、消費が追いつかない場合は先読みを待機する。
+    途中で close された場合は先読みを止め、元のジェネレータを先読みスレッドで close してから返る。
+    元のジェネレータで発生した例外は、消費する側のスレッドで送出する
+
+    Args:
+        iterable (Iterable[T]): 先読みする対象。ジェネレータの場合は先読みスレッドで実行される
+        max_prefetch (int, optional): 先読みして保持する要素数の上限。0以下の場合は先読みしない
+
+    Yields:
+        T: 元のジェネレータの要素
+    """
+    if max_prefetch <= 0:
+        yield from iterable
+        return
+
+    items: Queue = Queue(maxsize=max_prefetch)
+    stop_event = threading.Event()
+
+    def put(kind: str, payload: Any) -> bool:
+        while not stop_event.is_set():
+            try:
+                items.put((kind, payload), timeout=PUT_TIMEOUT_SEC)
+                return True
+            except Full:
+                continue
+        return False
+
+    def produce() -> None:
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not put("item", item):
+                    break
+            else:
+                put("done", None)
+        except Exception as e:
+            put("error", e)
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=produce, name="prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            kind, payload = items.get()
+            if kind == "item":
+                yield payload
+            elif kind == "error":
+                raise payload
+            else:
+                return
+    finally:
+        stop_event.set()
+        # 待機中の先読みスレッドが止まれるようキューを空にする
+        while True:
+            try:
+                items.get_nowait()
+            except Empty:
+                break
+        thread.join()
+        logger.debug("Prefetch thread stopped.")
@@ -0,0 +1,293 @@
+"""同じ動画を複数の設定で解析する機能
+
+設定ごとに動画をデコードし直すと解析回数に比例して時間がかかるため、動画を1回だけ先頭から読み、
+各フレームをそのフレームをサンプリングする全ての設定に振り分ける
+"""
+
+from cores.frame_editor import (
+    FrameEditor,
+    get_supported_skip_modes,
+    quiet_opencv_log,
+)
+from cores.model_registry import get_detector
+from cores.stream_export import ResultStreamWriter
+from contextlib import nullcontext
+from datetime import timedelta
+from itertools import product
+from typing import Any, Dict, Generator, List, Optional, Tuple
+import logging
+import cv2
+import numpy as np
+
+logger = logging.getLogger("__main__").getChild(__name__)
+
+
+def get_sweep_keys() -> List[str]:
+    """設定を変えて比較できるキーを取得する
+
+    Returns:
+        List[str]: 設定を変えて比較できるキー。binarize_th は二値化の閾値で、Noneの場合は自動設定
+    """
+    return [
+        "num_digits",
+        "sampling_sec",
+        "batch_frames",
+        "video_skip_sec",
+        "binarize_th",
+    ]
+
+
+def expand_sweep_grid(
+    settings: Dict[str, Any], grid: Dict[str, List[Any]]
+) -> List[Dict[str, Any]]:
+    """比較する値の組み合わせから、全ての組み合わせの設定を作る
+
+    Args:
+        settings (Dict[str, Any]): 基準の設定情報
+        grid (Dict[str, List[Any]]): キーごとの比較する値のリスト
+
+    Raises:
+        ValueError: 比較できないキーや空のリストが含まれている場合
+
+    Returns:
+        List[Dict[str, Any]]: 組み合わせごとの設定情報
+    """
+    for key, values in grid.items():
+        if key not in get_sweep_keys():
+            raise ValueError(f"Invalid sweep key: {key}")
+        if not isinstance(values, list) or len(values) == 0:
+            raise ValueError(f"Sweep values must be a non-empty list: {key}")
+
+    keys = list(grid.keys())
+    return [
+        {**settings, **dict(zip(keys, values))}
+        for values in product(*(grid[k] for k in keys))
+    ]
+
+
+def _get_next_sampled_position(
+    position: int, skip_frames: int, interval_frames: int, batch_frames: int
+) -> int:
+    """指定の位置以降で最初にサンプリングされるフレームの位置を求める
+
+    Args:
+        position (int): フレームの位置
+        skip_frames (int): 解析を開始するフレームの位置
+        interval_frames (int): サンプリング間隔のフレーム数
+        batch_frames (int): 1回のサンプリングで取得するフレーム数
+
+    Returns:
+        int: 次にサンプリングされるフレームの位置
+    """
+    if position < skip_frames:
+        return skip_frames
+    remainder = (position - skip_frames) % interval_frames
+    if remainder < batch_frames:
+        return position
+    return position + interval_frames - remainder
+
+
+def sweep_frame_generator(
+    video_path: str,
+    configs: List[Dict[str, Any]],
+    crop_sizes: List[int],
+    click_points: List,
+    skip_mode: str = "auto",
+    gray_decode: bool = False,
+) -> Generator[Tuple[int, List[np.ndarray], str], None, None]:
+    """動画を1回だけデコードし、設定ごとのフレームバッチを返す
+
+    どの設定もサンプリングしない区間は skip_mode に従って読み飛ばす。
+    桁数と切り出しサイズが同じ設定は、切り出した画像を共有する
+
+    Args:
+        video_path (str): 動画ファイルのパス
+        configs (List[Dict[str, Any]]): 設定情報のリスト。num_digits, sampling_sec, batch_frames, video_skip_sec を使う
+        crop_sizes (List[int]): 設定ごとの1桁あたりの切り出しサイズ
+        click_points (List): クリックポイント
+        skip_mode (str, optional): サンプリング対象外のフレームの読み飛ばし方法。get_supported_skip_modes() を参照
+        gray_decode (bool, optional): BGR に変換せず、デコードした輝度成分をグレースケールのフレームとして使うかどうか
+
+    Raises:
+        ValueError: skip_mode がサポートされていない場合
+
+    Yields:
+        Tuple[int, List[np.ndarray], str]:
+            - 設定の番号
+            - フレームのリスト
+            - タイムスタンプ（文字列）
+    """
+    if skip_mode not in get_supported_skip_modes():
+        raise ValueError(f"Invalid skip mode: {skip_mode}")
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        logger.error("Error: Could not open video file.")
+        return
+
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    schedules = [
+        (
+            int(fps * c["video_skip_sec"]),
+            1 if c["sampling_sec"] == 0 else int(fps * c["sampling_sec"]),
+            c["batch_frames"],
+        )
+        for c in configs
+    ]
+
+    # 桁数と切り出しサイズが同じ設定は同じ FrameEditor で切り出す
+    crop_keys = [(c["num_digits"], s) for c, s in zip(configs, crop_sizes)]
+    frame_editors = {
+        key: FrameEditor(key[0], crop_width=key[1], crop_height=key[1])
+        for key in dict.fromkeys(crop_keys)
+    }
+    # 読み飛ばし方法の所要時間の計測値の保持と、輝度成分のデコードに使う
+    reader = FrameEditor()
+    if gray_decode:
+        gray_decode = reader._enable_gray_decode(cap)
+
+    pending: List[Optional[Tuple[int, List[np.ndarray]]]] = [None] * len(configs)
+
+    def flush(index: int) -> Tuple[int, List[np.ndarray], str]:
+        sample_id, frames = pending[index]  # type: ignore
+        pending[index] = None
+        seconds = (
+            configs[index]["sampling_sec"] * sample_id
+            + configs[index]["video_skip_sec"]
+        )
+        return index, frames, str(timedelta(seconds=seconds))
+
+    position = min(s[0] for s in schedules)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+
+    try:
+        while True:
+            # どの設定もサンプリングしない区間を読み飛ばす
+            next_position = min(
+                _get_next_sampled_position(position, *s) for s in schedules
+            )
+            num_skip = next_position - position
+            if num_skip > 0:
+                if skip_mode == "read":
+                    is_skipped = all(cap.read()[0] for _ in range(num_skip))
+                else:
+                    is_skipped = reader._skip_frames(
+                        cap, num_skip, next_position, skip_mode
+                    )
+                if not is_skipped:
+                    logger.info("Finsish: Could not skip frame.")
+                    break
+                position = next_position
+
+            with quiet_opencv_log() if gray_decode else nullcontext():
+                ret, frame = cap.read()
+            if not ret:
+                logger.info("Finsish: Could not read frame.")
+                break
+            if gray_decode:
+                luma, gray_decode = reader._get_luma(cap, frame)
+                if luma is None:
+                    logger.info("Finsish: Could not read frame.")
+                    break
+                frame = luma
+
+            cropped_frames: Dict[Tuple[int, int], Optional[np.ndarray]] = {}
+            for i, (skip_frames, interval_frames, batch_frames) in enumerate(schedules):
+                offset = position - skip_frames
+                if offset < 0 or offset % interval_frames >= batch_frames:
+                    continue
+
+                sample_id = (
+                    0 if configs[i]["sampling_sec"] == 0 else offset // interval_frames
+                )
+                batch = pending[i]
+                if batch is not None and batch[0] != sample_id:
+                    yield flush(i)
+
+                key = crop_keys[i]
+                if key not in cropped_frames:
+                    cropped_frames[key] = frame_editors[key].crop(frame, click_points)
+                cropped_frame = cropped_frames[key]
+                if cropped_frame is None:
+                    logger.error("Error: Could not crop image.")
+                    continue
+
+                if pending[i] is None:
+                    pending[i] = (sample_id, [])
+                pending[i][1].append(cropped_frame)  # type: ignore
+
+                # サンプリング区間の最後のフレームであればバッチを返す
+                if (
+                    configs[i]["sampling_sec"] != 0
+                    and offset % interval_frames == batch_frames - 1
+                ):
+                    yield flush(i)
+
+            position += 1
+
+        # 溜まっているフレームバッチがあれば最後に返す
+        for i in range(len(configs)):
+            if pending[i] is not None:
+                yield flush(i)
+
+    finally:
+        cap.release()
+        logger.info("Capture resources released.")
+
+
+def sweep_replay(
+    configs: List[Dict[str, Any]],
+    click_points: List,
+    writers: List[ResultStreamWriter],
+    binarize_th: Optional[int] = None,
+) -> None:
+    """動画を1回だけデコードし、設定ごとに推論する
+
+    推論モデルは cores.model_registry で桁数と推論ランタイムの設定ごとに共有する。
+    結果はメモリに溜めず、設定ごとのストリームファイルに1件ずつ追記する
+
+    Args:
+        configs (List[Dict[str, Any]]): expand_sweep_grid で作成した設定情報のリスト。video_path は全て同じである必要がある
+        click_points (List): クリックポイント
+        writers (List[ResultStreamWriter]): 設定ごとの結果の書き込み先
+        binarize_th (Optional[int], optional): 設定に binarize_th がない場合の二値化の閾値。Noneの場合は自動設定
+
+    Raises:
+        ValueError: configs が空の場合や、動画ファイルまたは書き込み先の数が設定と合わない場合
+    """
+    if len(configs) == 0:
+        raise ValueError("configs must not be empty.")
+    if len({c["video_path"] for c in configs}) != 1:
+        raise ValueError("All configs must use the same video.")
+    if len(writers) != len(configs):
+        raise ValueError("A writer is required for each config.")
+
+    detectors = [
+        get_detector(c["num_digits"], inference_options=c.get("inference"))
+        for c in configs
+    ]
+
+    logger.info(f"Sweep {len(configs)} configs in a single decode pass.")
+    for index, frames, timestamp in sweep_frame_generator(
+        configs[0]["video_path"],
+        configs,
+        [d.crop_size for d in detectors],
+        click_points,
+        skip_mode=configs[0].get("skip_mode", "auto"),
+        gray_decode=configs[0].get("gray_decode", False),
+    ):
+        result, failed_rate, confidences, entropies = detectors[
+            index
+        ].predict_with_confidence(
+            frames, configs[index].get("binarize_th", binarize_th)
+        )
+        writers[index].write(
+            {
+                "results": result,
+                "failed_rates": failed_rate,
+                "timestamps": timestamp,
+                "confidences": confidences,
+                "entropies": entropies,
+            }
+        )
+        logger.debug(f"Config {index}: {timestamp} {result}")
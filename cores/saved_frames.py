@@ -0,0 +1,150 @@
+"""保存済みの切り出しフレームをサンプルごとに読み込む機能
+
+replay や live で save_frame を有効にして保存したフレームを、動画をデコードし直さずに再解析するために使う
+"""
+
+from cores.frame_archive import FrameArchive, is_frame_archive
+from datetime import timedelta
+from pathlib import Path
+from typing import Generator, List, Optional, Tuple, Union
+import logging
+import re
+import cv2
+import numpy as np
+
+logger = logging.getLogger("__main__").getChild(__name__)
+
+# frame_<サンプル番号>_<フレーム番号> または、サンプル番号を含まない以前の形式の frame_<フレーム番号>
+FRAME_FILE_PATTERN = re.compile(r"^frame_(?:(\d+)_)?(\d+)\.(jpg|png|npy)$")
+
+
+def get_frame_dirs(frames_dir: Union[str, Path]) -> List[Path]:
+    """フレームが保存されているディレクトリの一覧を取得する
+
+    並列処理で区間ごとに保存した場合は segment_XX ディレクトリを順に返す
+
+    Args:
+        frames_dir (Union[str, Path]): フレームの保存先ディレクトリ
+
+    Returns:
+        List[Path]: フレームが保存されているディレクトリのリスト
+    """
+    frames_dir = Path(frames_dir)
+    segment_dirs = sorted(p for p in frames_dir.glob("segment_*") if p.is_dir())
+    if len(segment_dirs) != 0:
+        return segment_dirs
+    return [frames_dir]
+
+
+def _list_frame_files(frame_dir: Path) -> List[Tuple[Optional[int], int, Path]]:
+    """ディレクトリ内のフレームファイルをサンプル番号、フレーム番号の順に取得する
+
+    Args:
+        frame_dir (Path): フレームが保存されているディレクトリ
+
+    Returns:
+        List[Tuple[Optional[int], int, Path]]: サンプル番号（名前に含まれない場合はNone）、フレーム番号とファイルパスのリスト
+    """
+    frame_files = []
+    for path in frame_dir.iterdir():
+        match = FRAME_FILE_PATTERN.match(path.name)
+        if match is not None:
+            sample_id = None if match.group(1) is None else int(match.group(1))
+            frame_files.append((sample_id, int(match.group(2)), path))
+    return sorted(frame_files, key=lambda f: (-1 if f[0] is None else f[0], f[1]))
+
+
+def _read_frame(path: Path) -> np.ndarray:
+    """フレームファイルを1枚読み込む
+
+    Args:
+        path (Path): フレームファイルのパス
+
+    Raises:
+        ValueError: 読み込みに失敗した場合
+
+    Returns:
+        np.ndarray: フレーム
+    """
+    if path.suffix == ".npy":
+        return np.load(path)
+    frame = cv2.imread(str(path))
+    if frame is None:
+        raise ValueError(f"Failed to read frame: {path}")
+    return frame
+
+
+def _file_samples(frame_dir: Path) -> Generator[List[np.ndarray], None, None]:
+    """フレームファイルをサンプルごとにまとめて返すジェネレータ
+
+    名前に含まれるサンプル番号ごとにまとめる。サンプル番号を含まない以前の形式のファイルは、
+    フレーム番号が途切れた位置をサンプルの境界とみなす
+
+    Args:
+        frame_dir (Path): フレームが保存されているディレクトリ
+
+    Yields:
+        List[np.ndarray]: サンプルのフレームのリスト
+    """
+    frames: List[np.ndarray] = []
+    prev: Optional[Tuple[Optional[int], int]] = None
+    for sample_id, frame_index, path in _list_frame_files(frame_dir):
+        if prev is not None and frames:
+            prev_sample_id, prev_index = prev
+            if sample_id is None and prev_sample_id is None:
+                is_new_sample = frame_index != prev_index + 1
+            else:
+                is_new_sample = sample_id != prev_sample_id
+            if is_new_sample:
+                yield frames
+                frames = []
+        frames.append(_read_frame(path))
+        prev = (sample_id, frame_index)
+    if frames:
+        yield frames
+
+
+def saved_frames_generator(
+    frames_dir: Union[str, Path], sampling_sec: int = 0, video_skip_sec: int = 0
+) -> Generator[Tuple[List[np.ndarray], str], None, None]:
+    """保存済みのフレームをサンプルごとに返すジェネレータ
+
+    フレームアーカイブの場合は保存時の取得時刻からタイムスタンプを作る。
+    画像ファイルの場合は frame_devide_generator と同様にサンプリング間隔からタイムスタンプを作る
+
+    Args:
+        frames_dir (Union[str, Path]): フレームの保存先ディレクトリ
+        sampling_sec (int, optional): 保存時のサンプリング間隔（秒）
+        video_skip_sec (int, optional): 保存時に動画の先頭からスキップした秒数
+
+    Raises:
+        FileNotFoundError: フレームが見つからない場合
+
+    Yields:
+        Tuple[List[np.ndarray], str]:
+            - サンプルのフレームのリスト
+            - タイムスタンプ（文字列）
+    """
+    frame_dirs = get_frame_dirs(frames_dir)
+    if not any(
+        is_frame_archive(d) or len(_list_frame_files(d)) != 0
+        for d in frame_dirs
+        if d.is_dir()
+    ):
+        raise FileNotFoundError(f"Saved frames not found: {frames_dir}")
+
+    num_samples = 0
+    for frame_dir in frame_dirs:
+        if is_frame_archive(frame_dir):
+            logger.debug(f"Reading frame archive: {frame_dir}")
+            for frames, timestamp_sec in FrameArchive(frame_dir).iter_samples():
+                yield frames, str(timedelta(seconds=round(timestamp_sec)))
+                num_samples += 1
+        else:
+            logger.debug(f"Reading frame files: {frame_dir}")
+            for frames in _file_samples(frame_dir):
+                timestamp = timedelta(
+                    seconds=sampling_sec * num_samples + video_skip_sec
+                )
+                yield frames, str(timestamp)
+                num_samples += 1
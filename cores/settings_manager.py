@@ -3,7 +3,15 @@
 from pathlib import Path
 from cores.export_utils import get_supported_formats
 from cores.common import filter_dict, is_directory_writable
-from typing import Dict, Any, Union
+from cores.frame_editor import get_supported_skip_modes
+from cores.frame_source import get_supported_frame_sources
+from cores.frame_writer import get_supported_frame_formats
+from cores.prefetch import PREFETCH_BATCHES
+from cores.inference_options import (
+    get_default_inference_options,
+    is_valid_inference_options,
+)
+from typing import Dict, Any, Iterable, Union
 from platformdirs import user_data_dir
 import json
 import logging
@@ -16,6 +24,7 @@ class SettingsManager:
 
     def __init__(self, pattern: str) -> None:
         self.required_keys = self._get_required_keys(pattern)
+        self.optional_keys = self._get_optional_keys(pattern)
         self.default_path = self._get_default_setting_path(pattern)
 
     def _get_required_keys(self, pattern: str) -> Dict[str, Dict[str, Any]]:
@@ -94,6 +103,65 @@ class SettingsManager:
         # base_settings と additional_settings をマージして返す
         return {**base_settings, **additional_settings}
 
+    def _get_optional_keys(self, pattern: str) -> Dict[str, Dict[str, Any]]:
+        """設定ファイルに含まれていなくてもよいキーとその検証関数を取得する
+
+        処理性能に関する設定など、古い設定ファイルに含まれていないキーを定義する
+
+        Args:
+            pattern (str): "live" or "replay"
+
+        Raises:
+            ValueError: patternが"live"または"replay"でない場合
+
+        Returns:
+            Dict[str, Callable[[Any], bool]]: 任意のキーとその検証関数
+        """
+        frame_format = {
+            "rule": lambda x: x in get_supported_frame_formats(),
+            "default": "jpg",
+        }
+        inference = {
+            "rule": is_valid_inference_options,
+            "default": get_default_inference_options(),
+        }
+        if pattern == "live":
+            return {
+                "frame_format": frame_format,
+                "inference": inference,
+                "change_threshold": {
+                    "rule": lambda x: isinstance(x, (int, float)) and 0 <= x <= 1,
+                    "default": 0.0,
+                },
+            }
+        elif pattern == "replay":
+            return {
+                "frame_format": frame_format,
+                "inference": inference,
+                "workers": {
+                    "rule": lambda x: isinstance(x, int) and x >= 1,
+                    "default": 1,
+                },
+                "skip_mode": {
+                    "rule": lambda x: x in get_supported_skip_modes(),
+                    "default": "auto",
+                },
+                "prefetch_batches": {
+                    "rule": lambda x: isinstance(x, int) and x >= 0,
+                    "default": PREFETCH_BATCHES,
+                },
+                "gray_decode": {
+                    "rule": lambda x: isinstance(x, bool),
+                    "default": False,
+                },
+                "frame_source": {
+                    "rule": lambda x: x in get_supported_frame_sources(),
+                    "default": "opencv",
+                },
+            }
+        else:
+            raise ValueError(f"Invalid pattern: {pattern}")
+
     def _get_default_setting_path(self, pattern: str) -> Path:
         """設定ファイルのデフォルトパスを取得する"""
         appname = "sichiribe"
@@ -124,14 +192,20 @@ class SettingsManager:
 
     def create_default(self) -> None:
         """デフォルトの設定ファイルを作成する"""
-        initial_settings = {k: v["default"] for k, v in self.required_keys.items()}
+        initial_settings = {
+            k: v["default"]
+            for k, v in {**self.required_keys, **self.optional_keys}.items()
+        }
         self.save(initial_settings, is_validate=False)
 
-    def load(self, filepath: Union[str, Path]) -> Dict[str, Any]:
+    def load(
+        self, filepath: Union[str, Path], fill_defaults: Iterable[str] = ()
+    ) -> Dict[str, Any]:
         """設定ファイルを読み込む
 
         Args:
             filepath (Union[str, Path]): 設定ファイルのパス
+            fill_defaults (Iterable[str], optional): 必要なキーのうち、存在しない場合は既定値を使うキー
 
         Raises:
             FileNotFoundError: ファイルが存在しない場合
@@ -150,8 +224,11 @@ class SettingsManager:
                 raise TypeError(f"Data in {filepath} is not a dictionary")
 
             for key in self.required_keys.keys():
-                if key not in settings:
+                if key in settings:
+                    continue
+                if key not in fill_defaults:
                     raise KeyError(f"Key '{key}' not found in {filepath}")
+                settings[key] = self.required_keys[key]["default"]
 
         return self.remove_non_require_keys(settings)
 
@@ -172,8 +249,35 @@ class SettingsManager:
             if not v["rule"](value):
                 logger.error(f"Invalid value: {k}={value}")
                 return False
+        for k, v in self.optional_keys.items():
+            value = settings.get(k)
+            if value is not None and not v["rule"](value):
+                logger.error(f"Invalid value: {k}={value}")
+                return False
         return True
 
+    def merge_runtime_options(
+        self, settings: Dict[str, Any], options: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """コマンドライン引数で指定した実行時のオプションを設定情報にマージする
+
+        引数で指定した値、設定ファイルの値、既定値の順に優先する
+
+        Args:
+            settings (Dict[str, Any]): 設定ファイルの内容などの設定情報
+            options (Dict[str, Any]): 任意のキーと引数の値。指定されていない場合の値はNone
+
+        Returns:
+            Dict[str, Any]: マージした設定情報
+        """
+        merged = dict(settings)
+        for k, v in options.items():
+            if v is not None:
+                merged[k] = v
+            elif k not in merged:
+                merged[k] = self.optional_keys[k]["default"]
+        return merged
+
     def remove_non_require_keys(self, settings: Dict[str, Any]) -> Dict[str, Any]:
         """設定ファイルの不要なキーを削除する
 
@@ -183,7 +287,10 @@ class SettingsManager:
         Returns:
             Dict[str, Any]: 不要なキーを削除した設定ファイルの内容
         """
-        return filter_dict(settings, lambda k, _: k in self.required_keys)
+        return filter_dict(
+            settings,
+            lambda k, _: k in self.required_keys or k in self.optional_keys,
+        )
 
     def save(self, settings: Dict[str, Any], is_validate=True) -> None:
         """設定ファイルを保存する
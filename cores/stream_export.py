@@ -0,0 +1,290 @@
+"""推論結果の逐次エクスポート機能
+
+推論結果を解析の終了までメモリに溜めず、1件ずつ出力ディレクトリのストリームファイルに追記する。
+ストリームファイルは一定間隔でフラッシュし、さらに一定間隔で fsync するため、
+長時間の解析の途中で異常終了しても、それまでの結果は finalize_stream で通常の形式に変換できる
+
+- csv: CSV の行を追記する。CSV 形式にのみ変換できる
+- ndjson: 1行に1件の JSON を追記する
+- binary: 4バイト（リトルエンディアン）の長さと JSON のバイト列を追記する
+"""
+
+from pathlib import Path
+from typing import IO, Any, Dict, Generator, List, Optional, Union
+import csv
+import json
+import logging
+import os
+import struct
+import time
+
+logger = logging.getLogger("__main__").getChild(__name__)
+
+# ストリームファイルの拡張子
+STREAM_EXTENSIONS = {"csv": "partial.csv", "ndjson": "ndjson", "binary": "bin"}
+
+# バッファをフラッシュする間隔と、ディスクに書き込む（fsync）間隔（秒）
+FLUSH_SEC = 1.0
+FSYNC_SEC = 30.0
+
+# binary 形式の各レコードの先頭に付ける長さ
+BINARY_HEADER = struct.Struct("<I")
+
+
+def get_supported_stream_formats() -> List[str]:
+    """サポートされているストリームファイルの形式を取得する
+
+    Returns:
+        List[str]: サポートされているストリームファイルの形式
+    """
+    return ["csv", "ndjson", "binary"]
+
+
+def resolve_stream_format(format: str, stream_format: Optional[str] = None) -> str:
+    """エクスポートフォーマットに対応するストリームファイルの形式を取得する
+
+    Args:
+        format (str): エクスポートフォーマット
+        stream_format (Optional[str], optional): 指定されたストリームファイルの形式。
+            Noneの場合は、CSV では終了時に名前を変えるだけで済む csv、それ以外では ndjson
+
+    Raises:
+        ValueError: stream_format がサポートされていない場合や、CSV 以外に csv 形式を指定した場合
+
+    Returns:
+        str: ストリームファイルの形式
+    """
+    if stream_format is None:
+        return "csv" if format == "csv" else "ndjson"
+    if stream_format not in get_supported_stream_formats():
+        raise ValueError(f"Invalid stream format: {stream_format}")
+    if stream_format == "csv" and format != "csv":
+        raise ValueError("A csv stream can only be exported to csv.")
+    return stream_format
+
+
+def get_stream_path(out_dir: Union[str, Path], prefix: str, stream_format: str) -> Path:
+    """ストリームファイルのパスを取得する
+
+    Args:
+        out_dir (Union[str, Path]): 出力ディレクトリ
+        prefix (str): 出力ファイル名のプレフィックス
+        stream_format (str): ストリームファイルの形式
+
+    Returns:
+        Path: ストリームファイルのパス
+    """
+    return Path(out_dir) / f"{prefix}.{STREAM_EXTENSIONS[stream_format]}"
+
+
+class ResultStreamWriter:
+    """推論結果を1件ずつストリームファイルに追記するクラス"""
+
+    def __init__(
+        self,
+        out_dir: Union[str, Path],
+        prefix: str = "result",
+        stream_format: str = "ndjson",
+        flush_sec: float = FLUSH_SEC,
+        fsync_sec: float = FSYNC_SEC,
+    ) -> None:
+        """
+        Args:
+            out_dir (Union[str, Path]): 出力ディレクトリ
+            prefix (str, optional): 出力ファイル名のプレフィックス
+            stream_format (str, optional): ストリームファイルの形式。get_supported_stream_formats() を参照
+            flush_sec (float, optional): バッファをフラッシュする間隔（秒）。0の場合は1件ごとにフラッシュする
+            fsync_sec (float, optional): ディスクに書き込む間隔（秒）。0の場合は1件ごとに書き込む
+
+        Raises:
+            ValueError: stream_format がサポートされていない場合
+        """
+        if stream_format not in get_supported_stream_formats():
+            raise ValueError(f"Invalid stream format: {stream_format}")
+
+        self.stream_format = stream_format
+        self.flush_sec = flush_sec
+        self.fsync_sec = fsync_sec
+        self.path = get_stream_path(out_dir, prefix, stream_format)
+        self.num_records = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file: Optional[IO] = (
+            open(self.path, "wb")
+            if stream_format == "binary"
+            else open(self.path, "w", newline="" if stream_format == "csv" else None)
+        )
+        self._csv_writer: Optional[csv.DictWriter] = None
+        self._last_flush = self._last_fsync = time.monotonic()
+        logger.debug(f"Streaming results to {self.path}")
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """推論結果を1件追記する
+
+        Args:
+            record (Dict[str, Any]): 推論結果。csv 形式では最初の1件のキーをヘッダーとする
+        """
+        if self._file is None:
+            raise ValueError("The stream is already closed.")
+
+        if self.stream_format == "csv":
+            if self._csv_writer is None:
+                self._csv_writer = csv.DictWriter(self._file, fieldnames=record.keys())
+                self._csv_writer.writeheader()
+            self._csv_writer.writerow(record)
+        elif self.stream_format == "ndjson":
+            self._file.write(json.dumps(record) + "\n")
+        else:
+            payload = json.dumps(record).encode()
+            self._file.write(BINARY_HEADER.pack(len(payload)) + payload)
+        self.num_records += 1
+
+        now = time.monotonic()
+        if now - self._last_fsync >= self.fsync_sec:
+            self.flush(fsync=True)
+        elif now - self._last_flush >= self.flush_sec:
+            self.flush()
+
+    def flush(self, fsync: bool = False) -> None:
+        """バッファをフラッシュする
+
+        Args:
+            fsync (bool, optional): ディスクへの書き込みまで待つかどうか
+        """
+        if self._file is None:
+            return
+        self._file.flush()
+        self._last_flush = time.monotonic()
+        if fsync:
+            os.fsync(self._file.fileno())
+            self._last_fsync = self._last_flush
+
+    def close(self) -> None:
+        """ディスクに書き込んでからストリームファイルを閉じる"""
+        if self._file is None:
+            return
+        self.flush(fsync=True)
+        self._file.close()
+        self._file = None
+        logger.debug(f"Streamed {self.num_records} records to {self.path}")
+
+    def __enter__(self) -> "ResultStreamWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def _get_stream_format(path: Path) -> str:
+    """ストリームファイルのパスから形式を判定する
+
+    Args:
+        path (Path): ストリームファイルのパス
+
+    Raises:
+        ValueError: ストリームファイルの拡張子でない場合
+
+    Returns:
+        str: ストリームファイルの形式
+    """
+    for stream_format, extension in STREAM_EXTENSIONS.items():
+        if path.name.endswith(f".{extension}"):
+            return stream_format
+    raise ValueError(f"Unknown stream file: {path}")
+
+
+def read_stream(path: Union[str, Path]) -> Generator[Dict[str, Any], None, None]:
+    """ストリームファイルの推論結果を1件ずつ読み込む
+
+    異常終了で最後の1件が書きかけの場合は、その1件を読み飛ばす
+
+    Args:
+        path (Union[str, Path]): ストリームファイルのパス
+
+    Yields:
+        Dict[str, Any]: 推論結果。csv 形式では値は文字列
+    """
+    path = Path(path)
+    stream_format = _get_stream_format(path)
+    if stream_format == "csv":
+        with open(path, newline="") as f:
+            yield from csv.DictReader(f)
+    elif stream_format == "ndjson":
+        with open(path) as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    logger.warning(f"Skipped an incomplete record in {path}")
+                    break
+                yield json.loads(line)
+    else:
+        with open(path, "rb") as f:
+            while header := f.read(BINARY_HEADER.size):
+                payload: Optional[bytes] = None
+                if len(header) == BINARY_HEADER.size:
+                    (size,) = BINARY_HEADER.unpack(header)
+                    payload = f.read(size)
+                if payload is None or len(payload) < size:
+                    logger.warning(f"Skipped an incomplete record in {path}")
+                    break
+                yield json.loads(payload)
+
+
+def finalize_stream(
+    path: Union[str, Path],
+    format: str,
+    out_dir: Union[str, Path],
+    prefix: str,
+    remove: bool = True,
+) -> None:
+    """ストリームファイルを export と同じ形式のファイルに変換する
+
+    推論結果は1件ずつ読み書きするため、件数によらずメモリ使用量は一定である
+
+    Args:
+        path (Union[str, Path]): ストリームファイルのパス
+        format (str): エクスポートフォーマット
+        out_dir (Union[str, Path]): 出力ディレクトリ
+        prefix (str): 出力ファイル名のプレフィックス
+        remove (bool, optional): 変換後にストリームファイルを削除するかどうか
+
+    Raises:
+        ValueError: エクスポートフォーマットが不正な場合や、csv 形式のストリームを CSV 以外に変換する場合
+    """
+    path = Path(path)
+    stream_format = _get_stream_format(path)
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+
+    if format == "csv":
+        out_path = Path(out_dir) / f"{prefix}.csv"
+        if stream_format == "csv":
+            if remove:
+                os.replace(path, out_path)
+            else:
+                out_path.write_bytes(path.read_bytes())
+            logger.debug("Exported data to csv.")
+            return
+        with open(out_path, "w", newline="") as f:
+            dict_writer: Optional[csv.DictWriter] = None
+            for record in read_stream(path):
+                if dict_writer is None:
+                    dict_writer = csv.DictWriter(f, fieldnames=record.keys())
+                    dict_writer.writeheader()
+                dict_writer.writerow(record)
+        logger.debug("Exported data to csv.")
+    elif format == "json":
+        if stream_format == "csv":
+            raise ValueError("A csv stream can only be exported to csv.")
+        # json.dump と同じ区切り文字で1件ずつ書き出す
+        with open(Path(out_dir) / f"{prefix}.json", "w") as f:
+            f.write("[")
+            for i, record in enumerate(read_stream(path)):
+                if i > 0:
+                    f.write(", ")
+                f.write(json.dumps(record))
+            f.write("]")
+        logger.debug("Exported data to json.")
+    elif format != "dummy":
+        raise ValueError("Invalid export method.")
+
+    if remove:
+        path.unlink()
@@ -1,7 +1,9 @@
 """GUIアプリケーション用の出力機能"""
 
 from cores.export_utils import export, build_data_records
+from cores.stream_export import finalize_stream
 from cores.common import filter_dict
+from pathlib import Path
 from typing import Dict
 
 
@@ -9,16 +11,27 @@ def export_result(data: Dict) -> None:
     """
     推論結果のエクスポート処理
 
+    ワーカーが推論結果をストリームファイルに追記している場合は、ストリームファイルを出力形式に変換する
+
     Args:
-        data (Dict): results, failed_rates, timestamps, format, out_dirを含む辞書
+        data (Dict): results, failed_rates, timestamps, format, out_dirを含む辞書。confidences, entropies があれば併せて出力する。
+            result_stream があり、そのファイルが存在する場合は results などの代わりに使う
     """
-    results = build_data_records(
-        {
-            "results": data["results"],
-            "failed_rates": data["failed_rates"],
-            "timestamps": data["timestamps"],
-        }
-    )
+    if "result_stream" in data and Path(data["result_stream"]).exists():
+        finalize_stream(
+            data["result_stream"], data["format"], data["out_dir"], "result"
+        )
+        return
+
+    records = {
+        "results": data["results"],
+        "failed_rates": data["failed_rates"],
+        "timestamps": data["timestamps"],
+    }
+    for key in ["confidences", "entropies"]:
+        if key in data:
+            records[key] = data[key]
+    results = build_data_records(records)
     export(results, data["format"], data["out_dir"], "result")
 
 
@@ -29,6 +42,15 @@ def export_settings(settings: Dict) -> None:
     Args:
         settings (Dict): 設定情報を含む辞書
     """
-    excluded_keys = {"results", "failed_rates", "timestamps", "first_frame", "frames"}
+    excluded_keys = {
+        "results",
+        "failed_rates",
+        "timestamps",
+        "confidences",
+        "entropies",
+        "result_stream",
+        "first_frame",
+        "frames",
+    }
     filtered_settings = filter_dict(settings, lambda k, _: k not in excluded_keys)
     export(filtered_settings, "json", settings["out_dir"], "settings")
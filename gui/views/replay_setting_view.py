@@ -31,6 +31,7 @@ class ReplaySettingWindow(SettingWidget):
     - 動画をサンプリングする頻度
     - 一回のサンプリングで何フレーム取得するか
     - 動画の解析を始めるタイミング
+    - 並列処理数
     - 出力形式
     - キャプチャしたフレームを保存するか
     """
@@ -84,6 +85,12 @@ class ReplaySettingWindow(SettingWidget):
         self.video_skip_sec.setFixedWidth(50)
         form_layout.addRow("動画の解析を始めるタイミング (秒)：", self.video_skip_sec)
 
+        self.workers = QSpinBox()
+        self.workers.setValue(1)
+        self.workers.setFixedWidth(50)
+        self.workers.setMinimum(1)
+        form_layout.addRow("並列処理数：", self.workers)
+
         self.format = QComboBox()
         for fmt in get_supported_formats():
             self.format.addItem(fmt)
@@ -210,6 +217,8 @@ class ReplaySettingWindow(SettingWidget):
         self.sampling_sec.setValue(self.data_store.get("sampling_sec"))
         self.batch_frames.setValue(self.data_store.get("batch_frames"))
         self.video_skip_sec.setValue(self.data_store.get("video_skip_sec"))
+        if self.data_store.has("workers"):
+            self.workers.setValue(self.data_store.get("workers"))
         self.format.setCurrentText(self.data_store.get("format"))
         self.save_frame.setChecked(self.data_store.get("save_frame"))
 
@@ -220,6 +229,7 @@ class ReplaySettingWindow(SettingWidget):
         self.data_store.set("sampling_sec", self.sampling_sec.value())
         self.data_store.set("batch_frames", self.batch_frames.value())
         self.data_store.set("video_skip_sec", self.video_skip_sec.value())
+        self.data_store.set("workers", self.workers.value())
         self.data_store.set("format", self.format.currentText())
         self.data_store.set("save_frame", self.save_frame.isChecked())
         self.data_store.set("out_dir", self.video_path.text())
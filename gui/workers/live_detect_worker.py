@@ -3,13 +3,14 @@
 from PySide6.QtCore import Signal, QThread
 from gui.utils.data_store import DataStore
 from cores.capture import FrameCapture
-from cores.cnn import cnn_init
+from cores.model_registry import get_detector
 from cores.frame_editor import FrameEditor
+from cores.live_pipeline import LivePipeline
+from cores.stream_export import ResultStreamWriter, resolve_stream_format
 import logging
+from queue import Empty
 from typing import Optional
 import time
-from datetime import timedelta
-import cv2
 import numpy as np
 from pathlib import Path
 
@@ -38,7 +39,7 @@ class DetectWorker(QThread):
         self.data_store = DataStore.get_instance()
         self.is_cancelled = False
         self.binarize_th: Optional[int] = None
-        self._is_capturing = True
+        self.pipeline: Optional[LivePipeline] = None
 
         if self.data_store.get("save_frame"):
             (Path(self.data_store.get("out_dir")) / "frames").mkdir(
@@ -50,85 +51,106 @@ class DetectWorker(QThread):
 
         1. モデルのロード
         2. カメラのオープン
-        3. フレームのキャプチャ
-        4. フレームの編集
-        5. 推論処理
-        6. フレームの保存
-        7. UI への通知
-        8. スレッドの待機時間
-        9. 3-8 を指定時間繰り返す
+        3. パイプラインの開始（フレームのキャプチャ、フレームの編集、推論処理、フレームの保存を並行して実行）
+        4. UI への通知
+        5. 4 を指定時間繰り返す
         """
         self.logger.info("DetectWorker started.")
 
         try:
-            self.dt = cnn_init(num_digits=self.data_store.get("num_digits"))
+            self.dt = get_detector(
+                num_digits=self.data_store.get("num_digits"),
+                inference_options=(
+                    self.data_store.get("inference")
+                    if self.data_store.has("inference")
+                    else None
+                ),
+            )
         except Exception as e:
             self.logger.error(f"Failed to load the model: {e}")
             self.error.emit("CNNモデルの読み込みに失敗しました")
             return None
 
         try:
-            self.fc = FrameCapture(device_num=self.data_store.get("device_num"))
+            self.fc = FrameCapture(
+                device_num=self.data_store.get("device_num"), use_grabber=True
+            )
         except Exception as e:
             self.logger.error(f"Failed to open camera: {e}")
             self.error.emit("カメラへのアクセスに失敗しました")
             return None
 
         self.fc.set_cap_size(*self.data_store.get("cap_size"))
-        self.fe = FrameEditor(num_digits=self.data_store.get("num_digits"))
+        self.fe = FrameEditor(
+            num_digits=self.data_store.get("num_digits"),
+            crop_width=self.dt.crop_size,
+            crop_height=self.dt.crop_size,
+        )
+
+        frames_dir = (
+            Path(self.data_store.get("out_dir")) / "frames"
+            if self.data_store.get("save_frame")
+            else None
+        )
+        self.pipeline = LivePipeline(
+            frame_capture=self.fc,
+            frame_editor=self.fe,
+            detector=self.dt,
+            click_points=self.data_store.get("click_points"),
+            batch_frames=self.data_store.get("batch_frames"),
+            sampling_sec=self.data_store.get("sampling_sec"),
+            total_sampling_sec=self.data_store.get("total_sampling_sec"),
+            binarize_th=self.binarize_th,
+            frames_dir=frames_dir,
+            frame_format=(
+                self.data_store.get("frame_format")
+                if self.data_store.has("frame_format")
+                else "jpg"
+            ),
+            change_threshold=(
+                self.data_store.get("change_threshold")
+                if self.data_store.has("change_threshold")
+                else 0.0
+            ),
+        )
+        # 長時間の解析でもメモリ使用量が増えず、異常終了しても結果が残るよう1件ずつ追記する
+        writer = ResultStreamWriter(
+            self.data_store.get("out_dir"),
+            prefix="result",
+            stream_format=resolve_stream_format(self.data_store.get("format")),
+        )
+        self.data_store.set("result_stream", str(writer.path))
+        self.pipeline.start()
 
-        start_time = time.time()
-        end_time = time.time() + self.data_store.get("total_sampling_sec")
-        frame_count = 0
-        timestamps = []
         is_first_loop = True
-
-        while time.time() < end_time and not self.is_cancelled:
-            temp_time = time.time()
-
-            # タイムスタンプを "HH:MM:SS" 形式で生成
-            elapsed_time = time.time() - start_time
-            timestamp = timedelta(seconds=int(elapsed_time))
-            timestamp_str = str(timestamp)
-            timestamps.append(timestamp_str)
-
-            frame_batch = []
-            self._is_capturing = True
-            for i in range(self.data_store.get("num_digits")):
-                frame = self.fc.capture()
-
-                if frame is None:
-                    self.error.emit("フレームの取得に失敗しました")
-                    self.is_cancelled = True
-                    break
-
-                cropped_frame = self.fe.crop(frame, self.data_store.get("click_points"))
-                if cropped_frame is None:
-                    self.logger.error("Failed to crop the frame.")
-                    continue
-                frame_batch.append(cropped_frame)
-
-                if self.data_store.get("save_frame"):
-                    frame_filename = (
-                        Path(self.data_store.get("out_dir"))
-                        / "frames"
-                        / f"frame_{frame_count:06d}.jpg"
-                    )
-                    cv2.imwrite(str(frame_filename), cropped_frame)
-                    self.logger.debug(
-                        f"Frame {frame_count} has been saved as: {frame_filename}"
-                    )
-                    frame_count += 1
-            self._is_capturing = False
-
-            # GUI への送信用の画像二値化であり、predict 内で再度処理する
-            image_bin = self.dt.preprocess_binarization(
-                frame_batch[0], self.binarize_th
+        while True:
+            if self.is_cancelled:
+                self.pipeline.stop()
+
+            try:
+                sample = self.pipeline.get_result(timeout=self.SLEEP_INTERVAL)
+            except Empty:
+                remaining_time = self.pipeline.end_time - time.time()
+                self.remaining_time.emit(max(remaining_time, 0))
+                continue
+
+            if sample is None:
+                break
+
+            value, failed_rate, timestamp_str, first_frame, confidence, entropy = sample
+            writer.write(
+                {
+                    "results": value,
+                    "failed_rates": failed_rate,
+                    "timestamps": timestamp_str,
+                    "confidences": confidence,
+                    "entropies": entropy,
+                }
             )
-            self.send_image.emit(image_bin)
 
-            value, failed_rate = self.dt.predict(frame_batch, self.binarize_th)
-            self.logger.info(f"Detected: {value}, Failed rate: {failed_rate}")
+            # GUI への送信用の画像二値化であり、推論はパイプライン内で行う
+            image_bin = self.dt.preprocess_binarization(first_frame, self.binarize_th)
+            self.send_image.emit(image_bin)
 
             if is_first_loop:
                 self.ready.emit()
@@ -136,16 +158,10 @@ class DetectWorker(QThread):
 
             self.progress.emit(value, failed_rate, timestamp_str)
 
-            elapsed_time = time.time() - temp_time
-            time_to_wait = max(0, self.data_store.get("sampling_sec") - elapsed_time)
-            time_end_wait = time.time() + time_to_wait
-            if time_to_wait > 0:
-                self.logger.debug(f"Waiting for {time_to_wait:.2f}s")
-
-                while time.time() < time_end_wait and not self.is_cancelled:
-                    remaining_time = end_time - time.time()
-                    self.remaining_time.emit(max(remaining_time, 0))
-                    time.sleep(self.SLEEP_INTERVAL)
+        self.pipeline.join()
+        writer.close()
+        if self.pipeline.error is not None and not self.is_cancelled:
+            self.error.emit(self.pipeline.error)
 
         self.fc.release()
 
@@ -168,11 +184,14 @@ class DetectWorker(QThread):
         self.binarize_th = value
         self.logger.info(f"Update binarize_th: {self.binarize_th}")
 
-        if not self._is_capturing:
-            frame = self.fc.capture()
-            if frame is None:
+        if self.pipeline is not None:
+            self.pipeline.binarize_th = value
+
+            latest = self.fc.get_latest_frame()
+            if latest is None:
                 self.logger.debug("Frame missing.")
                 return None
+            frame, _ = latest
 
             cropped_frame = self.fe.crop(frame, self.data_store.get("click_points"))
             if cropped_frame is None:
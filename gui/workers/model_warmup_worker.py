@@ -0,0 +1,57 @@
+"""起動時に推論モデルを読み込んでおくワーカークラス"""
+
+from PySide6.QtCore import QThread
+from cores.model_registry import warm_up
+from cores.settings_manager import SettingsManager
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import logging
+
+
+class ModelWarmupWorker(QThread):
+    """スプラッシュ画面の表示中に、保存されている設定の推論モデルを読み込んでおくワーカークラス
+
+    読み込んだモデルは cores.model_registry で共有され、解析の開始時に再利用される
+    """
+
+    def __init__(self, patterns: Optional[List[str]] = None) -> None:
+        """
+        Args:
+            patterns (Optional[List[str]], optional): 読み込む設定の種類。Noneの場合は "replay" と "live"
+        """
+        super().__init__()
+        self.logger = logging.getLogger("__main__").getChild(__name__)
+        self.patterns = ["replay", "live"] if patterns is None else patterns
+
+    def get_targets(self) -> List[Tuple[int, Optional[Dict[str, Any]]]]:
+        """保存されている設定から、読み込む推論モデルの桁数と推論ランタイムの設定を取得する
+
+        Returns:
+            List[Tuple[int, Optional[Dict[str, Any]]]]: 重複を除いた桁数と推論ランタイムの設定
+        """
+        targets: List[Tuple[int, Optional[Dict[str, Any]]]] = []
+        keys = set()
+        for pattern in self.patterns:
+            try:
+                settings = SettingsManager(pattern).load_default()
+            except Exception as e:
+                self.logger.warning(f"Failed to load {pattern} settings: {e}")
+                continue
+            target = (settings["num_digits"], settings.get("inference"))
+            key = json.dumps(target, sort_keys=True)
+            if key not in keys:
+                keys.add(key)
+                targets.append(target)
+        return targets
+
+    def run(self) -> None:
+        """スレッド処理を実行する
+
+        読み込みに失敗した場合も、解析の開始時に改めて読み込むためログに残すだけにする
+        """
+        for num_digits, inference in self.get_targets():
+            try:
+                warm_up(num_digits, inference_options=inference)
+                self.logger.debug(f"Model warmed up: num_digits={num_digits}")
+            except Exception as e:
+                self.logger.warning(f"Failed to warm up the model: {e}")
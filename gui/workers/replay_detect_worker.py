@@ -12,9 +12,13 @@
 
 from PySide6.QtCore import Signal, QThread
 from gui.utils.data_store import DataStore
-from cores.cnn import cnn_init
+from cores.model_registry import get_detector
 from cores.frame_editor import FrameEditor
+from cores.parallel_replay import parallel_replay_generator
+from cores.prefetch import PREFETCH_BATCHES, prefetch_generator
+from cores.stream_export import ResultStreamWriter, resolve_stream_format
 from pathlib import Path
+from typing import Generator, List, Optional, Tuple
 import logging
 import numpy as np
 
@@ -38,7 +42,6 @@ class DetectWorker(QThread):
         super().__init__()
         self.data_store = DataStore.get_instance()
         self.out_dir = str(Path(self.data_store.get("out_dir")) / "frames")
-        self.fe = FrameEditor(self.data_store.get("num_digits"))
         self.logger = logging.getLogger("__main__").getChild(__name__)
         self._is_cancelled = False
 
@@ -53,43 +56,174 @@ class DetectWorker(QThread):
         self.logger.info("DetectWorker started.")
 
         try:
-            self.dt = cnn_init(num_digits=self.data_store.get("num_digits"))
+            self.dt = get_detector(
+                num_digits=self.data_store.get("num_digits"),
+                inference_options=(
+                    self.data_store.get("inference")
+                    if self.data_store.has("inference")
+                    else None
+                ),
+            )
         except Exception as e:
             self.logger.error(f"Failed to load the model: {e}")
             self.model_not_found.emit()
             return None
 
-        timestamps = []
-        for frames, timestamp in self.fe.frame_devide_generator(
-            video_path=self.data_store.get("video_path"),
-            video_skip_sec=self.data_store.get("video_skip_sec"),
-            sampling_sec=self.data_store.get("sampling_sec"),
-            batch_frames=self.data_store.get("batch_frames"),
-            save_frame=self.data_store.get("save_frame"),
-            out_dir=self.out_dir,
-            click_points=self.data_store.get("click_points"),
-        ):
-            timestamps.append(timestamp)
-            if self._is_cancelled:
-                self.cancelled.emit()
-                break
-
-            # GUI への送信用の画像二値化であり、predict 内で再度処理する
-            image_bin = self.dt.preprocess_binarization(
-                frames[0], binarize_th=self.data_store.get("threshold")
-            )
-            self.send_image.emit(image_bin)
+        # モデルの入力サイズで切り出し、推論前のリサイズを省く
+        self.fe = FrameEditor(
+            self.data_store.get("num_digits"),
+            crop_width=self.dt.crop_size,
+            crop_height=self.dt.crop_size,
+        )
+
+        # 結果はエクスポートまでストリームファイルに追記し、異常終了しても残るようにする
+        writer = ResultStreamWriter(
+            self.data_store.get("out_dir"),
+            prefix="result",
+            stream_format=resolve_stream_format(self.data_store.get("format")),
+        )
+        self.data_store.set("result_stream", str(writer.path))
 
-            result, failed_rate = self.dt.predict(
-                frames, binarize_th=self.data_store.get("threshold")
-            )
-            self.logger.info(f"Detected Result: {result}")
-            self.logger.info(f"Failed Rate: {failed_rate}")
-            self.progress.emit(result, failed_rate, timestamp)
+        timestamps = []
+        detections = self.detect_generator()
+        # 解析中に例外が発生しても、ストリームファイルを書き込み、並列処理のプロセスを終了させる
+        try:
+            for (
+                frame,
+                result,
+                failed_rate,
+                timestamp,
+                confidence,
+                entropy,
+            ) in detections:
+                timestamps.append(timestamp)
+                if self._is_cancelled:
+                    self.cancelled.emit()
+                    break
+                writer.write(
+                    {
+                        "results": result,
+                        "failed_rates": failed_rate,
+                        "timestamps": timestamp,
+                        "confidences": confidence,
+                        "entropies": entropy,
+                    }
+                )
+
+                # GUI への送信用の画像二値化であり、predict 内で再度処理する
+                if frame is not None:
+                    image_bin = self.dt.preprocess_binarization(
+                        frame, binarize_th=self.data_store.get("threshold")
+                    )
+                    self.send_image.emit(image_bin)
+
+                self.logger.info(f"Detected Result: {result}")
+                self.logger.info(f"Failed Rate: {failed_rate}")
+                self.progress.emit(result, failed_rate, timestamp)
+        finally:
+            detections.close()
+            writer.close()
 
         self.data_store.set("timestamps", timestamps)
         return None
 
+    def detect_generator(
+        self,
+    ) -> Generator[
+        Tuple[Optional[np.ndarray], int, float, str, List[float], List[float]],
+        None,
+        None,
+    ]:
+        """サンプルごとの推論結果を返すジェネレータ
+
+        並列処理数が2以上の場合は、動画を区間に分割して別プロセスで解析する
+
+        Yields:
+            Tuple[Optional[np.ndarray], int, float, str, List[float], List[float]]:
+                - サンプルの先頭フレーム
+                - 推論結果
+                - エラー率
+                - タイムスタンプ（文字列）
+                - 桁ごとの確信度
+                - 桁ごとのエントロピー
+        """
+        workers = (
+            self.data_store.get("workers") if self.data_store.has("workers") else 1
+        )
+        frame_format = (
+            self.data_store.get("frame_format")
+            if self.data_store.has("frame_format")
+            else "jpg"
+        )
+        prefetch_batches = (
+            self.data_store.get("prefetch_batches")
+            if self.data_store.has("prefetch_batches")
+            else PREFETCH_BATCHES
+        )
+        gray_decode = (
+            self.data_store.get("gray_decode")
+            if self.data_store.has("gray_decode")
+            else False
+        )
+        frame_source = (
+            self.data_store.get("frame_source")
+            if self.data_store.has("frame_source")
+            else "opencv"
+        )
+        if workers > 1:
+            keys = [
+                "num_digits",
+                "video_path",
+                "video_skip_sec",
+                "sampling_sec",
+                "batch_frames",
+                "save_frame",
+                "click_points",
+            ]
+            settings = {k: self.data_store.get(k) for k in keys}
+            settings["out_dir"] = self.out_dir
+            settings["frame_format"] = frame_format
+            settings["prefetch_batches"] = prefetch_batches
+            settings["gray_decode"] = gray_decode
+            settings["frame_source"] = frame_source
+            if self.data_store.has("inference"):
+                settings["inference"] = self.data_store.get("inference")
+            yield from parallel_replay_generator(
+                settings,
+                num_workers=workers,
+                binarize_th=self.data_store.get("threshold"),
+            )
+            return
+
+        # デコードと切り出しは別スレッドで先読みし、推論と並行して進める。
+        # キャンセル時は close で先読みスレッドを止め、動画ファイルを解放する
+        batches = prefetch_generator(
+            self.fe.frame_devide_generator(
+                video_path=self.data_store.get("video_path"),
+                video_skip_sec=self.data_store.get("video_skip_sec"),
+                sampling_sec=self.data_store.get("sampling_sec"),
+                batch_frames=self.data_store.get("batch_frames"),
+                save_frame=self.data_store.get("save_frame"),
+                out_dir=self.out_dir,
+                click_points=self.data_store.get("click_points"),
+                skip_mode="auto",
+                frame_format=frame_format,
+                gray_decode=gray_decode,
+                frame_source=frame_source,
+            ),
+            prefetch_batches,
+        )
+        try:
+            for frames, timestamp in batches:
+                result, failed_rate, confidences, entropies = (
+                    self.dt.predict_with_confidence(
+                        frames, binarize_th=self.data_store.get("threshold")
+                    )
+                )
+                yield frames[0], result, failed_rate, timestamp, confidences, entropies
+        finally:
+            batches.close()
+
     def cancel(self) -> None:
         """スレッド処理をキャンセルする
 
@@ -3,18 +3,24 @@
 """
 
 from cores.cnn import cnn_init
-import cv2
-from datetime import timedelta
-import time
 from pathlib import Path
 from cores.common import get_now_str
 from cores.settings_manager import SettingsManager
-from cores.export_utils import get_supported_formats, export, build_data_records
+from cores.export_utils import get_supported_formats, export
+from cores.stream_export import (
+    ResultStreamWriter,
+    finalize_stream,
+    get_supported_stream_formats,
+    resolve_stream_format,
+)
 from cores.frame_editor import FrameEditor
+from cores.frame_writer import get_supported_frame_formats
+from cores.inference_options import add_inference_arguments, pop_inference_arguments
 from cores.capture import FrameCapture
+from cores.live_pipeline import LivePipeline
 import argparse
 import logging
-from typing import Dict, Any
+from typing import Any, Dict, Optional
 import warnings
 
 # 警告がだるいので非表示
@@ -66,9 +72,28 @@ def get_args() -> argparse.Namespace:
         choices=export_formats,
         default="json",
     )
+    parser.add_argument(
+        "--stream-format",
+        help="解析中に結果を逐次書き込むファイルの形式（指定しない場合は --format に合わせる）",
+        choices=get_supported_stream_formats(),
+        default=None,
+    )
     parser.add_argument(
         "--save-frame", help="キャプチャしたフレームを保存するか", action="store_true"
     )
+    parser.add_argument(
+        "--frame-format",
+        help="保存するフレームの形式",
+        choices=get_supported_frame_formats(),
+        default=None,
+    )
+    parser.add_argument(
+        "--change-threshold",
+        help="桁画像が変化したとみなす画素の割合（0-1）。0より大きい場合は変化した桁だけを推論する",
+        type=float,
+        default=None,
+    )
+    add_inference_arguments(parser)
     parser.add_argument(
         "--debug", help="デバッグモードを有効にする", action="store_true"
     )
@@ -76,11 +101,12 @@ def get_args() -> argparse.Namespace:
     return args
 
 
-def main(settings: Dict[str, Any]) -> None:
+def main(settings: Dict[str, Any], stream_format: Optional[str] = None) -> None:
     """リアルタイムで7セグメントディスプレイの数字を読み取る
 
     Args:
         settings (Dict[str, Any]): 設定情報
+        stream_format (Optional[str], optional): 解析中に結果を逐次書き込むファイルの形式。Noneの場合は出力形式に合わせる
 
     Notes:
         処理の流れ:
@@ -88,19 +114,30 @@ def main(settings: Dict[str, Any]) -> None:
         1. カメラフィードを表示
         2. 画角を調整するためにクリックポイントを選択
         3. サンプリングを開始
-        4. サンプリング時間が終了するまで以下の処理を繰り返す
+        4. サンプリング時間が終了するまで以下の処理をパイプラインで並行して行う
             - サンプリング間隔ごとにフレームを取得
+            - フレームを切り出して二値化
             - 7セグメントディスプレイの数字を読み取る
-            - 結果を保存
-        5. 結果をエクスポート
+            - フレームを保存
+            - 結果をストリームファイルに追記
+        5. ストリームファイルを出力形式に変換
     """
+    stream_format = resolve_stream_format(settings["format"], stream_format)
     out_dir = ROOT / "results" / get_now_str()
     if settings["save_frame"]:
         (out_dir / "frames").mkdir(parents=True, exist_ok=True)
 
-    frame_capture = FrameCapture(device_num=settings["device_num"])
-    frame_editor = FrameEditor(num_digits=settings["num_digits"])
-    detector = cnn_init(num_digits=settings["num_digits"])
+    frame_capture = FrameCapture(device_num=settings["device_num"], use_grabber=True)
+    detector = cnn_init(
+        num_digits=settings["num_digits"],
+        inference_options=settings.get("inference"),
+    )
+    # モデルの入力サイズで切り出し、推論前のリサイズを省く
+    frame_editor = FrameEditor(
+        num_digits=settings["num_digits"],
+        crop_width=detector.crop_size,
+        crop_height=detector.crop_size,
+    )
 
     if "click_points" in settings and len(settings["click_points"]) == 4:
         click_points = settings["click_points"]
@@ -116,64 +153,56 @@ def main(settings: Dict[str, Any]) -> None:
         click_points = frame_editor.region_select(frame)
     settings["click_points"] = click_points
 
-    start_time = time.time()
-    end_time = start_time + settings["total_sampling_sec"]
-    saved_frame_count = 0
-    timestamps = []
-    results = []
-    failed_rates = []
-    while time.time() < end_time:
-        temp_time = time.time()
-        frame_batch = []
-
-        for _ in range(settings["batch_frames"]):
-            frame = frame_capture.capture()
-
-            if frame is None:
-                continue
-
-            cropped_frame = frame_editor.crop(frame, click_points)
-            if cropped_frame is None:
-                continue
-            frame_batch.append(cropped_frame)
-
-            if settings["save_frame"]:
-                frame_filename = out_dir / f"frame_{saved_frame_count}.jpg"
-                cv2.imwrite(str(frame_filename), cropped_frame)
-                logger.debug(
-                    f"Frame {saved_frame_count} has been saved as: {frame_filename}"
-                )
-                saved_frame_count += 1
-
-        if len(frame_batch) > 0:
-            value, failed_rate = detector.predict(frame_batch)
-            logger.info(f"Detected: {value}, Failed rate: {failed_rate}")
-            results.append(value)
-            failed_rates.append(failed_rate)
-
-            # タイムスタンプを "HH:MM:SS" 形式で生成
-            elapsed_time = time.time() - start_time
-            timestamp = timedelta(seconds=int(elapsed_time))
-            timestamps.append(str(timestamp))
-
-        elapsed_time = time.time() - temp_time
-        time_to_wait = max(0, settings["sampling_sec"] - elapsed_time)
-
-        if time_to_wait > 0:
-            logger.debug(f"Waiting for {time_to_wait:.2f}s")
-            time.sleep(time_to_wait)
+    # キャプチャ、切り出し、推論、フレーム保存を別スレッドで並行して実行する
+    pipeline = LivePipeline(
+        frame_capture=frame_capture,
+        frame_editor=frame_editor,
+        detector=detector,
+        click_points=click_points,
+        batch_frames=settings["batch_frames"],
+        sampling_sec=settings["sampling_sec"],
+        total_sampling_sec=settings["total_sampling_sec"],
+        frames_dir=out_dir / "frames" if settings["save_frame"] else None,
+        frame_format=settings.get("frame_format", "jpg"),
+        change_threshold=settings.get("change_threshold", 0.0),
+    )
+    # 長時間の解析でもメモリ使用量が増えず、異常終了しても結果が残るよう1件ずつ追記する
+    writer = ResultStreamWriter(out_dir, prefix="result", stream_format=stream_format)
+
+    def write_results() -> None:
+        for value, failed_rate, timestamp, _, confidence, entropy in pipeline.results():
+            writer.write(
+                {
+                    "results": value,
+                    "failed_rates": failed_rate,
+                    "timestamps": timestamp,
+                    "confidences": confidence,
+                    "entropies": entropy,
+                }
+            )
+
+    pipeline.start()
+    try:
+        write_results()
+    except KeyboardInterrupt:
+        logger.info("Interrupted. Finishing the remaining samples.")
+        pipeline.stop()
+        write_results()
+    finally:
+        writer.close()
+    pipeline.join()
+    if detector.inference_options["cache_size"] > 0:
+        logger.info(f"Inference cache: {detector.get_cache_info()}")
+
+    if pipeline.error is not None:
+        logger.error(f"Live detection stopped: {pipeline.error}")
 
     frame_capture.release()
 
-    data = build_data_records(
-        {
-            "results": results,
-            "failed_rates": failed_rates,
-            "timestamps": timestamps,
-        }
-    )
     settings = settings_manager.remove_non_require_keys(settings)
-    export(data, format=settings["format"], out_dir=out_dir, prefix="result")
+    finalize_stream(
+        writer.path, format=settings["format"], out_dir=out_dir, prefix="result"
+    )
     export(settings, format="json", out_dir=out_dir, prefix="settings")
 
 
@@ -189,16 +218,24 @@ if __name__ == "__main__":
     logger.debug("args: %s", args)
 
     settings["total_sampling_sec"] = settings.pop("total_sampling_min") * 60
+    inference_options = pop_inference_arguments(settings)
+    stream_format = settings.pop("stream_format")
 
     settings_manager = SettingsManager("live")
     setting_path = settings.pop("setting")
+    # 実行時のオプションは、引数で指定した値、設定ファイルの値、既定値の順に優先する
+    runtime_options = {k: settings.pop(k) for k in ("frame_format", "change_threshold")}
     if setting_path is not None:
         settings = settings_manager.load(setting_path)
     else:
         settings["click_points"] = []
+    settings = settings_manager.merge_runtime_options(settings, runtime_options)
+
+    # 引数で指定した推論ランタイムの設定は設定ファイルの値より優先する
+    settings["inference"] = {**settings.get("inference", {}), **inference_options}
 
     settings_manager.validate(settings)
     logger.debug("settings: %s", settings)
-    main(settings)
+    main(settings, stream_format=stream_format)
 
     logger.info("All Done!")
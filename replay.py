@@ -2,13 +2,29 @@
 詳細については、[ドキュメント](https://github.com/EbinaKai/Sichiribe/wiki/How-to-use-CLI#execution-replay) を参照
 """
 
-from cores.cnn import cnn_init
+from cores.cnn import CNNCore, cnn_init
 from cores.common import get_now_str
 from cores.settings_manager import SettingsManager
-from cores.export_utils import export, get_supported_formats, build_data_records
-from cores.frame_editor import FrameEditor
+from cores.export_utils import export, get_supported_formats
+from cores.frame_editor import FrameEditor, get_supported_skip_modes
+from cores.frame_source import get_supported_frame_sources
+from cores.frame_writer import get_supported_frame_formats
+from cores.inference_options import add_inference_arguments, pop_inference_arguments
+from cores.parallel_replay import parallel_replay_generator
+from cores.prefetch import PREFETCH_BATCHES, prefetch_generator
+from cores.replay_sweep import expand_sweep_grid, sweep_replay
+from cores.saved_frames import saved_frames_generator
+from cores.stream_export import (
+    ResultStreamWriter,
+    finalize_stream,
+    resolve_stream_format,
+    get_supported_stream_formats,
+)
+from contextlib import ExitStack
 from pathlib import Path
+from typing import Any, Dict, List, Optional
 import argparse
+import json
 import logging
 import warnings
 
@@ -23,6 +39,9 @@ logger = logging.getLogger("__main__").getChild(__name__)
 FILE = Path(__file__).resolve()
 ROOT = FILE.parent
 
+# 保存済みのフレームを解析する場合は不要な、動画に関する設定のキー
+VIDEO_KEYS = ["video_path", "video_skip_sec"]
+
 
 def get_args() -> argparse.Namespace:
     """コマンドライン引数を取得
@@ -55,15 +74,83 @@ def get_args() -> argparse.Namespace:
         type=int,
         default=0,
     )
+    parser.add_argument(
+        "--skip-mode",
+        help="サンプリング対象外のフレームの読み飛ばし方法",
+        choices=get_supported_skip_modes(),
+        default=None,
+    )
+    parser.add_argument(
+        "--workers",
+        help="動画を区間に分割して並列に解析するプロセス数",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--prefetch-batches",
+        help="推論と並行してデコードしておくバッチ数（0の場合は先読みしない）",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--gray-decode",
+        help="BGR に変換せず輝度成分だけをデコードする（高解像度の動画向け）",
+        action="store_true",
+        default=None,
+    )
+    parser.add_argument(
+        "--frame-source",
+        help="フレームの取得方法（ffmpeg は開始位置へのシーク、サンプリング、領域の切り出しを ffmpeg で行う）",
+        choices=get_supported_frame_sources(),
+        default=None,
+    )
+    parser.add_argument(
+        "--benchmark-frame-sources",
+        help="解析せずに、フレームの取得方法ごとに指定のバッチ数を取得する時間を計測する",
+        type=int,
+        default=None,
+        metavar="BATCHES",
+    )
+    parser.add_argument(
+        "--from-frames",
+        help="動画の代わりに保存済みのフレームを解析する（以前の結果の出力先ディレクトリ）",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--binarize-th",
+        help="二値化の閾値（指定しない場合は自動で決定）",
+        type=int,
+        default=None,
+    )
     parser.add_argument(
         "--format",
         help="出力形式 (json または csv)",
         choices=export_formats,
         default="json",
     )
+    parser.add_argument(
+        "--stream-format",
+        help="解析中に結果を逐次書き込むファイルの形式（指定しない場合は --format に合わせる）",
+        choices=get_supported_stream_formats(),
+        default=None,
+    )
     parser.add_argument(
         "--save-frame", help="キャプチャしたフレームを保存するか", action="store_true"
     )
+    parser.add_argument(
+        "--frame-format",
+        help="保存するフレームの形式",
+        choices=get_supported_frame_formats(),
+        default=None,
+    )
+    parser.add_argument(
+        "--sweep",
+        help="比較する設定の組み合わせを記述した JSON ファイルのパス（動画を1回だけデコードして全ての組み合わせを解析する）",
+        type=str,
+        default=None,
+    )
+    add_inference_arguments(parser)
     parser.add_argument(
         "--debug", help="デバッグモードを有効にする", action="store_true"
     )
@@ -71,21 +158,29 @@ def get_args() -> argparse.Namespace:
     return args
 
 
-def main(settings) -> None:
+def main(
+    settings: Dict[str, Any],
+    from_frames: Optional[str] = None,
+    binarize_th: Optional[int] = None,
+    stream_format: Optional[str] = None,
+) -> None:
     """動画ファイルから7セグメントディスプレイの数字を読み取る
 
     Args:
         settings (Dict[str, Any]): 設定情報
+        from_frames (Optional[str], optional): 保存済みのフレームを解析する場合の、以前の結果の出力先ディレクトリ
+        binarize_th (Optional[int], optional): 二値化の閾値。Noneの場合は自動設定
+        stream_format (Optional[str], optional): 解析中に結果を逐次書き込むファイルの形式。Noneの場合は出力形式に合わせる
 
     Notes:
         処理の流れ:
 
-        1. 動画ファイルからフレームをサンプリング
-        2. サンプリングしたフレームをCNNで解析
-        3. 解析結果をエクスポート
+        1. 動画ファイルからフレームをサンプリング（from_frames を指定した場合は保存済みのフレームを読み込む）
+        2. サンプリングしたフレームをCNNで解析（workers が2以上の場合は区間ごとに並列処理）
+        3. 解析結果を1件ずつストリームファイルに追記し、終了後に出力形式に変換
     """
+    stream_format = resolve_stream_format(settings["format"], stream_format)
     frame_editor = FrameEditor(settings["num_digits"])
-    detector = cnn_init(num_digits=settings["num_digits"])
 
     out_dir = ROOT / "results" / get_now_str()
 
@@ -94,39 +189,233 @@ def main(settings) -> None:
     else:
         click_points = []
 
-    timestamps = []
-    results = []
-    failed_rates = []
-    for frame_batch, timestamp in frame_editor.frame_devide_generator(
-        video_path=settings["video_path"],
-        video_skip_sec=settings["video_skip_sec"],
-        sampling_sec=settings["sampling_sec"],
-        batch_frames=settings["batch_frames"],
-        save_frame=settings["save_frame"],
-        out_dir=str(out_dir / "frames"),
-        click_points=click_points,
-    ):
-        timestamps.append(timestamp)
-        result, failed_rate = detector.predict(frame_batch)
-        results.append(result)
-        failed_rates.append(failed_rate)
-        logger.info(f"Detected Result: {result}")
-        logger.info(f"Failed Rate: {failed_rate}")
+    if from_frames is None and len(click_points) != 4:
+        # 領域の選択画面はメインスレッドでしか表示できないため、
+        # 先読みのスレッドや区間ごとのプロセスを起動する前に選択する
+        first_frame, _ = next(
+            frame_editor.frame_devide_generator(
+                video_path=settings["video_path"],
+                video_skip_sec=settings["video_skip_sec"],
+                save_frame=False,
+                is_crop=False,
+                extract_single_frame=True,
+            )
+        )
+        click_points = frame_editor.region_select(first_frame)
 
-    data = build_data_records(
-        {
-            "results": results,
-            "failed_rates": failed_rates,
-            "timestamps": timestamps,
-        }
-    )
+    detector: Optional[CNNCore] = None
+    if from_frames is not None:
+        # 切り出し済みのフレームをそのまま推論する
+        frames_dir = Path(from_frames)
+        if (frames_dir / "frames").is_dir():
+            frames_dir = frames_dir / "frames"
+        frame_editor.click_points = click_points
+
+        detector = cnn_init(
+            num_digits=settings["num_digits"],
+            inference_options=settings.get("inference"),
+        )
+        detections = (
+            (timestamp, *detector.predict_with_confidence(frames, binarize_th))
+            for frames, timestamp in saved_frames_generator(
+                frames_dir,
+                sampling_sec=settings["sampling_sec"],
+                video_skip_sec=settings["video_skip_sec"],
+            )
+        )
+    elif settings.get("workers", 1) > 1:
+        frame_editor.click_points = click_points
+        detections = (
+            (timestamp, result, failed_rate, confidences, entropies)
+            for (
+                _,
+                result,
+                failed_rate,
+                timestamp,
+                confidences,
+                entropies,
+            ) in parallel_replay_generator(
+                {
+                    **settings,
+                    "click_points": click_points,
+                    "out_dir": str(out_dir / "frames"),
+                },
+                num_workers=settings["workers"],
+                binarize_th=binarize_th,
+            )
+        )
+    else:
+        detector = cnn_init(
+            num_digits=settings["num_digits"],
+            inference_options=settings.get("inference"),
+        )
+        # モデルの入力サイズで切り出し、推論前のリサイズを省く
+        frame_editor.crop_width = detector.crop_size
+        frame_editor.crop_height = detector.crop_size
+        # デコードと切り出しは別スレッドで先読みし、推論と並行して進める
+        detections = (
+            (timestamp, *detector.predict_with_confidence(frame_batch, binarize_th))
+            for frame_batch, timestamp in prefetch_generator(
+                frame_editor.frame_devide_generator(
+                    video_path=settings["video_path"],
+                    video_skip_sec=settings["video_skip_sec"],
+                    sampling_sec=settings["sampling_sec"],
+                    batch_frames=settings["batch_frames"],
+                    save_frame=settings["save_frame"],
+                    out_dir=str(out_dir / "frames"),
+                    click_points=click_points,
+                    skip_mode=settings.get("skip_mode", "auto"),
+                    frame_format=settings.get("frame_format", "jpg"),
+                    gray_decode=settings.get("gray_decode", False),
+                    frame_source=settings.get("frame_source", "opencv"),
+                ),
+                settings.get("prefetch_batches", PREFETCH_BATCHES),
+            )
+        )
+
+    # 結果はメモリに溜めず、異常終了しても残るようストリームファイルに追記する
+    with ResultStreamWriter(
+        out_dir,
+        prefix="result",
+        stream_format=stream_format,
+    ) as writer:
+        for timestamp, result, failed_rate, confidence, entropy in detections:
+            writer.write(
+                {
+                    "results": result,
+                    "failed_rates": failed_rate,
+                    "timestamps": timestamp,
+                    "confidences": confidence,
+                    "entropies": entropy,
+                }
+            )
+            logger.info(f"Detected Result: {result}")
+            logger.info(f"Failed Rate: {failed_rate}")
+
+    if detector is not None and detector.inference_options["cache_size"] > 0:
+        logger.info(f"Inference cache: {detector.get_cache_info()}")
 
     settings["click_points"] = frame_editor.get_click_points()
     settings = settings_manager.remove_non_require_keys(settings)
-    export(data, format=settings["format"], out_dir=out_dir, prefix="result")
+    finalize_stream(
+        writer.path, format=settings["format"], out_dir=out_dir, prefix="result"
+    )
     export(settings, format=settings["format"], out_dir=out_dir, prefix="settings")
 
 
+def sweep_main(
+    settings: Dict[str, Any],
+    grid: Dict[str, List[Any]],
+    binarize_th: Optional[int] = None,
+    stream_format: Optional[str] = None,
+) -> None:
+    """動画ファイルを1回だけデコードし、設定の組み合わせごとに数字を読み取る
+
+    Args:
+        settings (Dict[str, Any]): 基準の設定情報
+        grid (Dict[str, List[Any]]): キーごとの比較する値のリスト。cores.replay_sweep.get_sweep_keys() を参照
+        binarize_th (Optional[int], optional): grid に binarize_th がない場合の二値化の閾値。Noneの場合は自動設定
+        stream_format (Optional[str], optional): 解析中に結果を逐次書き込むファイルの形式。Noneの場合は出力形式に合わせる
+
+    Raises:
+        ValueError: 設定の組み合わせが正しくない場合
+
+    Notes:
+        結果は組み合わせごとに results/<日時>/config_<番号> に出力する
+    """
+    configs = expand_sweep_grid(settings, grid)
+    for config in configs:
+        if not settings_manager.validate(config):
+            raise ValueError(f"Invalid sweep config: {config}")
+    stream_formats = [
+        resolve_stream_format(c["format"], stream_format) for c in configs
+    ]
+
+    out_dir = ROOT / "results" / get_now_str()
+
+    click_points = settings.get("click_points", [])
+    if len(click_points) != 4:
+        frame_editor = FrameEditor(settings["num_digits"])
+        first_frame, _ = next(
+            frame_editor.frame_devide_generator(
+                video_path=settings["video_path"],
+                video_skip_sec=settings["video_skip_sec"],
+                save_frame=False,
+                is_crop=False,
+                extract_single_frame=True,
+            )
+        )
+        click_points = frame_editor.region_select(first_frame)
+
+    config_dirs = [out_dir / f"config_{i:02d}" for i in range(len(configs))]
+
+    # 結果はメモリに溜めず、異常終了しても残るよう組み合わせごとのストリームファイルに追記する
+    with ExitStack() as stack:
+        writers = [
+            stack.enter_context(
+                ResultStreamWriter(
+                    config_dir, prefix="result", stream_format=config_stream_format
+                )
+            )
+            for config_dir, config_stream_format in zip(config_dirs, stream_formats)
+        ]
+        sweep_replay(configs, click_points, writers, binarize_th)
+
+    for i, (config, config_dir, writer) in enumerate(
+        zip(configs, config_dirs, writers)
+    ):
+        config_settings = settings_manager.remove_non_require_keys(
+            {**config, "click_points": click_points}
+        )
+        if "binarize_th" in config:
+            config_settings["binarize_th"] = config["binarize_th"]
+        logger.info(f"Config {i}: {writer.num_records} samples")
+        finalize_stream(
+            writer.path, format=config["format"], out_dir=config_dir, prefix="result"
+        )
+        export(
+            config_settings,
+            format=config["format"],
+            out_dir=config_dir,
+            prefix="settings",
+        )
+
+
+def benchmark_main(settings: Dict[str, Any], max_batches: int) -> None:
+    """フレームの取得方法ごとに、解析の開始位置から max_batches バッチを取得する時間を計測する
+
+    Args:
+        settings (Dict[str, Any]): 設定情報
+        max_batches (int): 計測するバッチ数
+    """
+    frame_editor = FrameEditor(settings["num_digits"])
+    click_points = settings.get("click_points", [])
+    if len(click_points) != 4:
+        first_frame, _ = next(
+            frame_editor.frame_devide_generator(
+                video_path=settings["video_path"],
+                video_skip_sec=settings["video_skip_sec"],
+                save_frame=False,
+                is_crop=False,
+                extract_single_frame=True,
+            )
+        )
+        click_points = frame_editor.region_select(first_frame)
+
+    elapsed = frame_editor.benchmark_frame_sources(
+        settings["video_path"],
+        click_points,
+        max_batches,
+        video_skip_sec=settings["video_skip_sec"],
+        sampling_sec=settings["sampling_sec"],
+        batch_frames=settings["batch_frames"],
+        skip_mode=settings.get("skip_mode", "auto"),
+        gray_decode=settings.get("gray_decode", False),
+    )
+    for source, sec in sorted(elapsed.items(), key=lambda x: x[1]):
+        logger.info(f"{source}: {sec:.3f} sec ({max_batches / sec:.2f} batches/sec)")
+
+
 if __name__ == "__main__":
     args = get_args()
     settings = vars(args)
@@ -137,17 +426,68 @@ if __name__ == "__main__":
         logger.setLevel(logging.INFO)
     logger.debug("args: %s", args)
 
+    from_frames = settings.pop("from_frames")
+    sweep_path = settings.pop("sweep")
+    benchmark_batches = settings.pop("benchmark_frame_sources")
+    stream_format = settings.pop("stream_format")
+    binarize_th = settings.pop("binarize_th")
+    inference_options = pop_inference_arguments(settings)
+
     settings_manager = SettingsManager("replay")
     setting_path = settings.pop("setting")
+    if (
+        setting_path is None
+        and from_frames is not None
+        and (Path(from_frames) / "settings.json").exists()
+    ):
+        # 以前の結果の設定を引き継ぐ
+        setting_path = str(Path(from_frames) / "settings.json")
+
+    # 実行時のオプションは、引数で指定した値、設定ファイルの値、既定値の順に優先する
+    runtime_options = {
+        k: settings.pop(k)
+        for k in (
+            "workers",
+            "skip_mode",
+            "frame_format",
+            "prefetch_batches",
+            "gray_decode",
+            "frame_source",
+        )
+    }
     if setting_path is not None:
-        settings = settings_manager.load(setting_path)
-    elif settings["video_path"] is None:
-        raise ValueError("video_path or setting is required.")
+        # 保存済みのフレームの設定は、ライブ解析の出力のように動画の情報を含まない場合がある
+        settings = settings_manager.load(
+            setting_path,
+            fill_defaults=VIDEO_KEYS if from_frames is not None else (),
+        )
+    elif settings["video_path"] is None and from_frames is None:
+        raise ValueError("video_path, setting or from_frames is required.")
     else:
         settings["click_points"] = []
+    settings = settings_manager.merge_runtime_options(settings, runtime_options)
+
+    # 引数で指定した推論ランタイムの設定は設定ファイルの値より優先する
+    settings["inference"] = {**settings.get("inference", {}), **inference_options}
 
     settings_manager.validate(settings)
     logger.debug("settings: %s", settings)
-    main(settings)
+    if benchmark_batches is not None:
+        benchmark_main(settings, benchmark_batches)
+    elif sweep_path is not None:
+        with open(sweep_path) as f:
+            sweep_main(
+                settings,
+                json.load(f),
+                binarize_th=binarize_th,
+                stream_format=stream_format,
+            )
+    else:
+        main(
+            settings,
+            from_frames=from_frames,
+            binarize_th=binarize_th,
+            stream_format=stream_format,
+        )
 
     logger.info("All Done!")
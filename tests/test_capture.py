@@ -1,6 +1,7 @@
 import pytest
 from unittest.mock import Mock, patch
 from itertools import cycle
+import time
 import numpy as np
 import cv2
 from cores.capture import FrameCapture
@@ -74,3 +75,84 @@ class TestFrameCapture:
         mock_imshow.assert_called()
         mock_destroy.assert_called_once()
         assert mock_wait_key.call_count >= 2
+
+
+@pytest.fixture
+def grabber_frame_capture():
+    frame_count = {"n": 0}
+
+    def read():
+        time.sleep(0.001)
+        frame_count["n"] += 1
+        return True, np.full((480, 640, 3), frame_count["n"] % 256, dtype=np.uint8)
+
+    with patch("cv2.VideoCapture") as mock_video_capture, patch(
+        "cores.capture.time.sleep"
+    ):
+        mock_cap_instance = Mock()
+        mock_cap_instance.read.side_effect = read
+        mock_video_capture.return_value = mock_cap_instance
+        frame_capture = FrameCapture(device_num=0, use_grabber=True, buffer_size=5)
+    yield frame_capture
+    frame_capture.release()
+
+
+class TestFrameGrabber:
+    @pytest.mark.timeout(2)
+    def test_get_fresh_frames(self, grabber_frame_capture):
+        frames = grabber_frame_capture.get_fresh_frames(8)
+
+        assert len(frames) == 8
+        values = [frame[0, 0, 0] for frame, _ in frames]
+        timestamps = [timestamp for _, timestamp in frames]
+        assert values == sorted(values)
+        assert timestamps == sorted(timestamps)
+
+    @pytest.mark.timeout(2)
+    def test_fresh_frames_are_new(self, grabber_frame_capture):
+        first = grabber_frame_capture.get_fresh_frames(1)
+        second = grabber_frame_capture.get_fresh_frames(1)
+
+        assert second[0][1] > first[0][1]
+
+    @pytest.mark.timeout(2)
+    def test_capture_with_grabber(self, grabber_frame_capture):
+        frame = grabber_frame_capture.capture()
+
+        assert isinstance(frame, np.ndarray)
+        assert grabber_frame_capture.get_latest_frame() is not None
+
+    @patch("cores.capture.time.sleep")
+    def test_grab_retry_backoff(self, mock_sleep, init_frame_capture, sample_frame):
+        frame_capture, mock_cap_instance = init_frame_capture
+
+        results = iter(
+            [(False, None)] * 8 + [(True, sample_frame)] + [(False, None)] * 2
+        )
+
+        def read():
+            # 最後に読み込みに成功したら停止する
+            result = next(results, None)
+            if result is None:
+                frame_capture._is_grabbing = False
+                return True, sample_frame
+            return result
+
+        mock_cap_instance.read.side_effect = read
+        frame_capture._is_grabbing = True
+        frame_capture.logger = Mock()
+        frame_capture._grab_loop()
+
+        # 失敗が続く間は待機時間を倍にし、ログは失敗し始めたときだけ出力する
+        intervals = [call.args[0] for call in mock_sleep.call_args_list]
+        assert intervals == [0.01, 0.02, 0.04, 0.08, 0.16, 0.32, 0.5, 0.5, 0.01, 0.02]
+        assert frame_capture.logger.error.call_count == 2
+        assert len(frame_capture._buffer) == 2
+
+    @pytest.mark.timeout(2)
+    @patch("cv2.destroyAllWindows")
+    def test_release_stops_grabber(self, mock_destroy, grabber_frame_capture):
+        grabber_frame_capture.release()
+
+        assert grabber_frame_capture._grab_thread is None
+        assert grabber_frame_capture.get_fresh_frames(1, timeout=0.1) == []
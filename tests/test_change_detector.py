@@ -0,0 +1,69 @@
+import numpy as np
+from cores.change_detector import DigitChangeDetector
+
+
+def make_digit_images(values, num_frames=3, size=100):
+    """桁ごとに左側の塗りつぶし幅を変えた桁画像を作る"""
+    images = np.zeros((num_frames, len(values), size, size, 1), dtype=np.float32)
+    for i, value in enumerate(values):
+        images[:, i, :, : value * 10] = 1
+    return images.reshape(-1, size, size, 1)
+
+
+class TestDigitChangeDetector:
+    def test_first_sample_is_changed(self):
+        detector = DigitChangeDetector(3, threshold=0.05)
+
+        changed = detector.detect(make_digit_images([1, 2, 3]))
+
+        np.testing.assert_array_equal(changed, [True, True, True])
+
+    def test_detect_changed_digits(self):
+        detector = DigitChangeDetector(3, threshold=0.05)
+        detector.detect(make_digit_images([1, 2, 3]))
+
+        np.testing.assert_array_equal(
+            detector.detect(make_digit_images([1, 2, 3])), [False, False, False]
+        )
+        np.testing.assert_array_equal(
+            detector.detect(make_digit_images([1, 5, 3])), [False, True, False]
+        )
+        # 基準は変化した桁だけ更新される
+        np.testing.assert_array_equal(
+            detector.detect(make_digit_images([1, 5, 3])), [False, False, False]
+        )
+
+    def test_small_noise_is_ignored(self):
+        detector = DigitChangeDetector(2, threshold=0.05)
+        images = make_digit_images([3, 3])
+        detector.detect(images)
+
+        noisy = images.copy()
+        noisy[0, 50, 50] = 1 - noisy[0, 50, 50]
+
+        np.testing.assert_array_equal(detector.detect(noisy), [False, False])
+
+    def test_max_reuse_samples(self):
+        detector = DigitChangeDetector(2, threshold=0.05, max_reuse_samples=2)
+        images = make_digit_images([1, 2])
+        detector.detect(images)
+
+        assert not detector.detect(images).any()
+        assert not detector.detect(images).any()
+        assert detector.detect(images).all()
+
+    def test_reset(self):
+        detector = DigitChangeDetector(2, threshold=0.05)
+        images = make_digit_images([1, 2])
+        detector.detect(images)
+        detector.reset()
+
+        assert detector.detect(images).all()
+
+    def test_compute_signature_shape(self):
+        detector = DigitChangeDetector(4, threshold=0.05, signature_size=8)
+
+        signature = detector.compute_signature(make_digit_images([1, 2, 3, 4]))
+
+        assert signature.shape == (4, 8, 8)
+        assert signature.dtype == bool
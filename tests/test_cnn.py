@@ -1,5 +1,7 @@
 from unittest.mock import patch
-from cores.cnn import CNNCore
+from cores.cnn import CNNCore, get_default_model_filename
+import pytest
+import cv2
 import numpy as np
 
 
@@ -24,6 +26,23 @@ class TestCNN:
         np.testing.assert_array_equal(errors_per_digit, expected_errors_per_digit)
         np.testing.assert_array_equal(result, expected_result)
 
+    def test_find_mode_per_column_np_tie(self):
+        predictions = np.array([[3, 10, 5], [2, 10, 7]], dtype=np.int8)
+
+        result, errors_per_digit = self.cnn.find_mode_per_column_np(predictions)
+
+        # 出現回数が同じ場合は小さいクラスが選ばれる
+        np.testing.assert_array_equal(result, np.array([2, 10, 5]))
+        np.testing.assert_array_equal(errors_per_digit, np.array([0.5, 0, 0.5]))
+
+    def test_find_mode_per_column_np_empty(self):
+        predictions = np.zeros((0, 3), dtype=np.int8)
+
+        result, errors_per_digit = self.cnn.find_mode_per_column_np(predictions)
+
+        assert result.shape == (3,)
+        np.testing.assert_array_equal(errors_per_digit, np.ones(3))
+
     def test_preprocess_image(self):
         processed_images = self.cnn.preprocess_image(self.image)
 
@@ -38,10 +57,437 @@ class TestCNN:
         ), "Image values should be in range [0, 1]."
 
     def test_predict(self):
-        with patch(
-            "cores.cnn.CNNCore.inference_7seg_classifier", return_value=[1, 1, 1]
-        ):
+        probabilities = np.eye(11)[[1, 1, 1]]
+        with patch("cores.cnn.CNNCore.inference_batch", return_value=probabilities):
             result, failed_rate = self.cnn.predict(self.image)
 
             assert result == 111
             assert failed_rate == 0
+
+    def test_predict_batched(self):
+        probabilities = np.eye(11)[[1, 2, 3] * 5]
+        with patch(
+            "cores.cnn.CNNCore.inference_batch", return_value=probabilities
+        ) as mock_inference:
+            result, failed_rate = self.cnn.predict([self.image] * 5)
+
+            mock_inference.assert_called_once()
+            assert mock_inference.call_args[0][0].shape == (15, 100, 100, 1)
+            assert result == 123
+            assert failed_rate == 0
+
+    def test_inference_7seg_classifier(self):
+        probabilities = np.eye(11)[[4, 5, 6]]
+        with patch("cores.cnn.CNNCore.inference_batch", return_value=probabilities):
+            argmax_indices = self.cnn.inference_7seg_classifier(self.image)
+
+            np.testing.assert_array_equal(argmax_indices, [4, 5, 6])
+
+    @pytest.mark.parametrize("binarize_th", [None, 80, 180])
+    def test_prepare_batch_matches_reference(self, binarize_th):
+        rng = np.random.default_rng(0)
+        images = [
+            rng.integers(0, 256, (100, 300, 3), dtype=np.uint8),
+            cv2.GaussianBlur(
+                rng.integers(0, 256, (100, 300, 3), dtype=np.uint8), (15, 15), 0
+            ),
+            rng.integers(0, 256, (120, 310), dtype=np.uint8),
+        ]
+
+        digit_images = self.cnn.prepare_batch(images, binarize_th)
+
+        # 画像ごとに二値化と桁の切り出しを行う従来の処理と一致する
+        expected = []
+        for image in images:
+            image_gs = cv2.resize(self.cnn.load_image(image), (300, 100))
+            image_bin = self.cnn.preprocess_binarization(
+                image_gs, binarize_th, output_grayscale=True
+            )
+            for index in range(3):
+                digit = image_bin[:, index * 100 : (index + 1) * 100]
+                expected.append(digit.reshape(100, 100, 1).astype("float32") / 255)
+        np.testing.assert_array_equal(digit_images, np.array(expected))
+
+    def test_prepare_batch_does_not_share_output(self):
+        first = self.cnn.prepare_batch([self.image])
+        second = self.cnn.prepare_batch([np.full((100, 300), 255, dtype=np.uint8)])
+
+        assert not np.shares_memory(first, second)
+        np.testing.assert_array_equal(first, self.cnn.prepare_batch([self.image]))
+
+    def test_prepare_batch_skips_unreadable_image(self):
+        digit_images = self.cnn.prepare_batch([self.image, "not_found.jpg"])
+
+        assert digit_images.shape == (3, 100, 100, 1)
+
+
+class TestAggregation:
+    def setup_method(self):
+        self.image = np.zeros((100, 100), dtype=np.uint8)
+        # 2フレーム中1フレームは 1 を僅差で、もう1フレームは 2 を大差で予測する
+        self.probabilities = np.full((2, 11), 0.0)
+        self.probabilities[0, [1, 2]] = [0.55, 0.45]
+        self.probabilities[1, [1, 2]] = [0.05, 0.95]
+
+    @pytest.mark.parametrize(
+        "aggregation, expected", [("vote", 1), ("mean", 2), ("log", 2)]
+    )
+    def test_aggregation(self, aggregation, expected):
+        cnn = CNNCore(1, inference_options={"aggregation": aggregation})
+        with patch(
+            "cores.cnn.CNNCore.inference_batch", return_value=self.probabilities
+        ):
+            result, failed_rate = cnn.predict([self.image] * 2)
+
+        assert result == expected
+        assert failed_rate == 0.5
+
+    def test_confidence_and_entropy(self):
+        cnn = CNNCore(1, inference_options={"aggregation": "mean"})
+        with patch(
+            "cores.cnn.CNNCore.inference_batch", return_value=self.probabilities
+        ):
+            result, _, confidences, entropies = cnn.predict_with_confidence(
+                [self.image] * 2
+            )
+
+        assert result == 2
+        assert confidences == pytest.approx([0.7])
+        assert entropies == pytest.approx([-(0.3 * np.log(0.3) + 0.7 * np.log(0.7))])
+
+    def test_confident_prediction_has_low_entropy(self):
+        cnn = CNNCore(3)
+        with patch(
+            "cores.cnn.CNNCore.inference_batch", return_value=np.eye(11)[[1, 2, 3]]
+        ):
+            cnn.predict(np.zeros((100, 300), dtype=np.uint8))
+
+        assert cnn.last_confidences == pytest.approx([1.0] * 3)
+        assert cnn.last_entropies == pytest.approx([0.0] * 3, abs=1e-5)
+
+    def test_empty(self):
+        cnn = CNNCore(2)
+        result, failed_rate = cnn.predict_prepared(np.zeros((0, 100, 100, 1)))
+
+        assert result == 0
+        assert failed_rate == 1
+        assert cnn.last_confidences == pytest.approx([1 / 11] * 2)
+
+
+class TestPredictChanged:
+    def setup_method(self):
+        self.cnn = CNNCore(3)
+        self.digit_images = np.zeros((6, 100, 100, 1), dtype=np.float32)
+
+    def test_without_previous_result(self):
+        with patch(
+            "cores.cnn.CNNCore.inference_batch",
+            return_value=np.eye(11)[[1, 2, 3] * 2],
+        ) as mock_inference:
+            result, _ = self.cnn.predict_changed(
+                self.digit_images, np.array([False, True, False])
+            )
+
+            assert mock_inference.call_args[0][0].shape == (6, 100, 100, 1)
+            assert result == 123
+
+    def test_reuse_unchanged_digits(self):
+        with patch(
+            "cores.cnn.CNNCore.inference_batch",
+            return_value=np.eye(11)[[1, 2, 3] * 2],
+        ):
+            self.cnn.predict_prepared(self.digit_images)
+
+        with patch(
+            "cores.cnn.CNNCore.inference_batch", return_value=np.eye(11)[[7, 8]]
+        ) as mock_inference:
+            result, failed_rate = self.cnn.predict_changed(
+                self.digit_images, np.array([False, True, False])
+            )
+
+            # 変化した1桁 x 2フレームだけを推論する
+            assert mock_inference.call_args[0][0].shape == (2, 100, 100, 1)
+            assert result == 173
+            assert failed_rate == pytest.approx(0.5 / 3)
+            assert self.cnn.last_used_frames == 2
+
+    def test_no_changed_digits(self):
+        with patch(
+            "cores.cnn.CNNCore.inference_batch",
+            return_value=np.eye(11)[[1, 2, 3] * 2],
+        ):
+            self.cnn.predict_prepared(self.digit_images)
+
+        with patch("cores.cnn.CNNCore.inference_batch") as mock_inference:
+            result, failed_rate = self.cnn.predict_changed(
+                self.digit_images, np.zeros(3, dtype=bool)
+            )
+
+            mock_inference.assert_not_called()
+            assert result == 123
+            assert failed_rate == 0
+            assert self.cnn.last_confidences == pytest.approx([1.0] * 3)
+
+
+class TestInferenceCache:
+    def setup_method(self):
+        self.cnn = CNNCore(2, inference_options={"cache_size": 2})
+        # 左側の塗りつぶし幅が異なる3種類の桁画像
+        self.images = np.zeros((3, 100, 100, 1), dtype=np.float32)
+        for i in range(3):
+            self.images[i, :, : (i + 1) * 20] = 1
+
+    def fake_inference(self, images):
+        return np.eye(11)[images[:, 50].sum(axis=(1, 2)).astype(int) // 20]
+
+    def test_cache_hits_skip_inference(self):
+        with patch.object(
+            self.cnn, "inference_batch", side_effect=self.fake_inference
+        ) as mock_inference:
+            probs = self.cnn.inference_cached(self.images[[0, 1, 0, 1]])
+            np.testing.assert_array_equal(probs.argmax(axis=1), [1, 2, 1, 2])
+            # 同じ桁画像は1回だけ推論する
+            assert len(mock_inference.call_args[0][0]) == 2
+
+            probs = self.cnn.inference_cached(self.images[[1, 0]])
+            np.testing.assert_array_equal(probs.argmax(axis=1), [2, 1])
+            assert mock_inference.call_count == 1
+
+        assert self.cnn.get_cache_info() == {
+            "hits": 2,
+            "misses": 4,
+            "size": 2,
+            "max_size": 2,
+        }
+
+    def test_lru_eviction(self):
+        with patch.object(
+            self.cnn, "inference_batch", side_effect=self.fake_inference
+        ) as mock_inference:
+            self.cnn.inference_cached(self.images[[0]])
+            self.cnn.inference_cached(self.images[[1]])
+            self.cnn.inference_cached(self.images[[0]])
+            # 最も古い images[1] が追い出される
+            self.cnn.inference_cached(self.images[[2]])
+            self.cnn.inference_cached(self.images[[0]])
+            assert mock_inference.call_count == 3
+            self.cnn.inference_cached(self.images[[1]])
+            assert mock_inference.call_count == 4
+
+    def test_predict_uses_cache(self):
+        image = np.zeros((100, 200), dtype=np.uint8)
+        with patch.object(
+            self.cnn, "inference_batch", return_value=np.eye(11)[[3]]
+        ) as mock_inference:
+            result, _ = self.cnn.predict([image] * 5)
+            self.cnn.predict([image] * 5)
+
+            mock_inference.assert_called_once()
+            assert result == 33
+
+    def test_disabled(self):
+        cnn = CNNCore(2)
+        with patch.object(
+            cnn, "inference_batch", side_effect=self.fake_inference
+        ) as mock_inference:
+            cnn.inference_cached(self.images[[0, 0]])
+            cnn.inference_cached(self.images[[0, 0]])
+
+            assert mock_inference.call_count == 2
+            assert len(mock_inference.call_args[0][0]) == 2
+        assert cnn.get_cache_info()["size"] == 0
+
+    def test_clear_cache(self):
+        with patch.object(self.cnn, "inference_batch", side_effect=self.fake_inference):
+            self.cnn.inference_cached(self.images)
+        self.cnn.clear_cache()
+
+        assert self.cnn.get_cache_info() == {
+            "hits": 0,
+            "misses": 0,
+            "size": 0,
+            "max_size": 2,
+        }
+
+
+class TestEarlyExit:
+    def setup_method(self):
+        self.cnn = CNNCore(
+            3, inference_options={"early_exit": True, "micro_batch_frames": 2}
+        )
+        self.image = np.zeros((100, 300), dtype=np.uint8)
+
+    def test_stops_when_confident(self):
+        probabilities = np.eye(11)[[1, 2, 3] * 2]
+        with patch(
+            "cores.cnn.CNNCore.inference_batch", return_value=probabilities
+        ) as mock_inference:
+            result, failed_rate = self.cnn.predict([self.image] * 10)
+
+            # 2フレーム目で票数が2対0（残り8フレーム）のため、確率で判定される4フレーム目で終了する
+            assert mock_inference.call_count == 2
+            assert self.cnn.last_used_frames == 4
+            assert result == 123
+            assert failed_rate == 0
+
+    def test_stops_when_unbeatable(self):
+        self.cnn.inference_options["early_exit_confidence"] = 0
+        probabilities = np.eye(11)[[1, 2, 3] * 2]
+        with patch(
+            "cores.cnn.CNNCore.inference_batch", return_value=probabilities
+        ) as mock_inference:
+            result, _ = self.cnn.predict([self.image] * 5)
+
+            # 4フレームで4対0となり、残り1フレームでは逆転できない
+            assert mock_inference.call_count == 2
+            assert self.cnn.last_used_frames == 4
+            assert result == 123
+
+    def test_does_not_stop_when_disagreeing(self):
+        probabilities = np.eye(11)[[1, 2, 3, 1, 2, 4]]
+        with patch(
+            "cores.cnn.CNNCore.inference_batch", return_value=probabilities
+        ) as mock_inference:
+            result, failed_rate = self.cnn.predict([self.image] * 6)
+
+            assert mock_inference.call_count == 3
+            assert self.cnn.last_used_frames == 6
+            assert result == 123
+            assert failed_rate == pytest.approx(0.5 / 3)
+
+    def test_low_probability_does_not_stop(self):
+        probabilities = np.full((6, 11), 0.05)
+        probabilities[:, 7] = 0.5
+        with patch(
+            "cores.cnn.CNNCore.inference_batch", return_value=probabilities
+        ) as mock_inference:
+            result, _ = self.cnn.predict([self.image] * 10)
+
+            # 確率では判定されず、6フレームで6対0（残り4フレーム）となった時点で終了する
+            assert mock_inference.call_count == 3
+            assert result == 777
+
+    def test_predict_prepared(self):
+        digit_images = self.cnn.prepare_batch([self.image] * 10)
+        probabilities = np.eye(11)[[1, 2, 3] * 2]
+        with patch(
+            "cores.cnn.CNNCore.inference_batch", return_value=probabilities
+        ) as mock_inference:
+            result, _ = self.cnn.predict_prepared(digit_images)
+
+            assert mock_inference.call_count == 2
+            assert mock_inference.call_args[0][0].shape == (6, 100, 100, 1)
+            assert result == 123
+
+    def test_disabled_by_default(self):
+        cnn = CNNCore(3)
+        probabilities = np.eye(11)[[1, 2, 3] * 10]
+        with patch(
+            "cores.cnn.CNNCore.inference_batch", return_value=probabilities
+        ) as mock_inference:
+            cnn.predict([self.image] * 10)
+
+            mock_inference.assert_called_once()
+            assert cnn.last_used_frames == 10
+
+
+class TestLazyModelLoading:
+    def test_set_input_shape_from_filename(self):
+        cnn = CNNCore(4)
+
+        assert cnn.set_input_shape_from_filename("model_28x28_int8.onnx")
+        assert cnn.crop_size == 28
+        assert not cnn.set_input_shape_from_filename("custom.onnx")
+        assert cnn.crop_size == 28
+
+    def test_ensure_model_loaded_once(self):
+        cnn = CNNCore(4)
+
+        def fake_inference(images):
+            # 初期化中の推論から呼ばれても読み込み直さない
+            cnn.ensure_model_loaded()
+            return np.zeros((len(images), 11))
+
+        with patch.object(cnn, "_load_model") as mock_load, patch.object(
+            cnn, "inference_batch", side_effect=fake_inference
+        ) as mock_inference:
+            cnn.ensure_model_loaded()
+            cnn.ensure_model_loaded()
+
+            mock_load.assert_called_once()
+            # ダミーの入力で1回推論する
+            mock_inference.assert_called_once()
+            assert mock_inference.call_args[0][0].shape == (4, 100, 100, 1)
+
+    def test_load_failure_is_retried(self):
+        cnn = CNNCore(4)
+        with patch.object(
+            cnn, "_load_model", side_effect=[OSError, None]
+        ) as mock_load, patch.object(cnn, "inference_batch"):
+            with pytest.raises(OSError):
+                cnn.ensure_model_loaded()
+            cnn.ensure_model_loaded()
+
+            assert mock_load.call_count == 2
+
+
+class TestDefaultModelFilename:
+    def test_float(self):
+        assert get_default_model_filename("onnx") == "model_100x100.onnx"
+
+    def test_int8(self, tmp_path):
+        (tmp_path / "model_100x100_int8.onnx").touch()
+        with patch("cores.cnn.MODEL_DIR", tmp_path):
+            assert (
+                get_default_model_filename("onnx", "int8") == "model_100x100_int8.onnx"
+            )
+            # INT8 のモデルがない場合は float のモデルを使う
+            assert (
+                get_default_model_filename("tflite", "int8") == "model_100x100.tflite"
+            )
+
+
+class TestInputShape:
+    def setup_method(self):
+        self.cnn = CNNCore(4)
+
+    def test_set_input_shape(self):
+        self.cnn.set_input_shape((None, 28, 28, 1))
+
+        assert self.cnn.image_width == 28
+        assert self.cnn.image_height == 28
+        assert self.cnn.crop_size == 28
+        assert self.cnn.denoise_ksize == 3
+
+    def test_set_input_shape_unknown(self):
+        self.cnn.set_input_shape(["N", "H", "W", 1])
+
+        assert self.cnn.image_width == 100
+        assert self.cnn.denoise_ksize == 9
+
+    @pytest.mark.parametrize("size, ksize", [(28, 3), (48, 5)])
+    def test_prepare_batch_small_model(self, size, ksize):
+        self.cnn.set_input_shape((1, size, size, 1))
+        image = np.random.default_rng(0).integers(0, 256, (100, 400), dtype=np.uint8)
+
+        digit_images = self.cnn.prepare_batch([image])
+
+        assert digit_images.shape == (4, size, size, 1)
+        image_gs = cv2.resize(image, (size * 4, size))
+        _, image_bin = cv2.threshold(
+            image_gs, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU
+        )
+        if cv2.countNonZero(image_bin) * 2 < image_bin.size:
+            image_bin = cv2.bitwise_not(image_bin)
+        image_bin = cv2.medianBlur(image_bin, ksize)
+        expected = image_bin.reshape(size, 4, size).transpose(1, 0, 2)[..., None] / 255
+        np.testing.assert_array_equal(digit_images, expected.astype(np.float32))
+
+    def test_default_model_filename_model_size(self, tmp_path):
+        (tmp_path / "model_28x28.onnx").touch()
+        with patch("cores.cnn.MODEL_DIR", tmp_path):
+            assert get_default_model_filename("onnx", "float", 28) == "model_28x28.onnx"
+            assert get_default_model_filename("onnx", "int8", 28) == "model_28x28.onnx"
+            assert (
+                get_default_model_filename("onnx", "float", 48) == "model_100x100.onnx"
+            )
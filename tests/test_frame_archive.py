@@ -0,0 +1,57 @@
+import pytest
+import numpy as np
+from cores.frame_archive import FrameArchive, FrameArchiveWriter, is_frame_archive
+
+
+@pytest.fixture
+def frames():
+    return np.random.randint(0, 256, (10, 100, 400, 3), dtype=np.uint8)
+
+
+class TestFrameArchive:
+    def test_round_trip(self, frames, tmp_path):
+        with FrameArchiveWriter(tmp_path, chunk_frames=4) as writer:
+            for i, frame in enumerate(frames):
+                writer.append(frame, i, sample_id=i // 3, timestamp=i * 0.1)
+
+        assert writer.count == 10
+        assert is_frame_archive(tmp_path)
+        archive = FrameArchive(tmp_path)
+        assert len(archive) == 10
+        assert isinstance(archive.frames, np.memmap)
+        np.testing.assert_array_equal(archive.frames, frames)
+        assert archive.frame_indices.tolist() == list(range(10))
+        np.testing.assert_allclose(archive.timestamps, np.arange(10) * 0.1)
+
+    def test_iter_samples(self, frames, tmp_path):
+        with FrameArchiveWriter(tmp_path) as writer:
+            for i, frame in enumerate(frames):
+                writer.append(frame, i, sample_id=i // 3, timestamp=float(i))
+
+        samples = list(FrameArchive(tmp_path).iter_samples())
+
+        assert [len(sample_frames) for sample_frames, _ in samples] == [3, 3, 3, 1]
+        assert [timestamp for _, timestamp in samples] == [0.0, 3.0, 6.0, 9.0]
+        np.testing.assert_array_equal(samples[1][0][0], frames[3])
+
+    def test_unflushed_chunk_is_not_visible(self, frames, tmp_path):
+        writer = FrameArchiveWriter(tmp_path, chunk_frames=4)
+        for i, frame in enumerate(frames[:6]):
+            writer.append(frame, i)
+
+        assert len(FrameArchive(tmp_path)) == 4
+        writer.close()
+        assert len(FrameArchive(tmp_path)) == 6
+
+    def test_shape_mismatch(self, frames, tmp_path):
+        with FrameArchiveWriter(tmp_path) as writer:
+            writer.append(frames[0], 0)
+            with pytest.raises(ValueError):
+                writer.append(frames[0][:50], 1)
+
+    def test_empty_archive(self, tmp_path):
+        FrameArchiveWriter(tmp_path).close()
+
+        assert not is_frame_archive(tmp_path)
+        with pytest.raises(FileNotFoundError):
+            FrameArchive(tmp_path)
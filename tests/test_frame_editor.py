@@ -1,8 +1,10 @@
 import pytest
 import numpy as np
 from unittest.mock import Mock, patch
+import io
 import cv2
-from cores.frame_editor import FrameEditor
+from cores.frame_editor import FrameEditor, quiet_opencv_log
+from cores.frame_source import get_roi
 
 
 @pytest.fixture
@@ -75,6 +77,328 @@ class TestFrameEditor:
         assert isinstance(frame, np.ndarray)
         mock_cap.release.assert_called_once()
 
+    @pytest.mark.parametrize("skip_mode", ["grab", "seek", "auto"])
+    @patch("cv2.VideoCapture")
+    def test_frame_devide_sparse(
+        self, mock_video_capture, frame_editor, sample_frame, skip_mode
+    ):
+        mock_cap = Mock()
+        mock_cap.isOpened.return_value = True
+        mock_cap.get.return_value = 30.0
+        mock_cap.read.return_value = (True, sample_frame)
+        mock_cap.grab.side_effect = [True] * 80 + [False]
+        mock_cap.set.side_effect = [True] * 3 + [False]
+        mock_video_capture.return_value = mock_cap
+
+        batches = list(
+            frame_editor.frame_devide_generator(
+                video_path="dummy.mp4",
+                video_skip_sec=0,
+                sampling_sec=3,
+                batch_frames=10,
+                save_frame=False,
+                is_crop=False,
+                skip_mode=skip_mode,
+            )
+        )
+
+        assert len(batches) >= 2
+        assert all(len(frames) == 10 for frames, _ in batches)
+        assert batches[1][1] == "0:00:03"
+        # サンプリング区間のフレームだけをデコードする
+        assert mock_cap.read.call_count == 10 * len(batches)
+        mock_cap.release.assert_called_once()
+
+    @pytest.mark.parametrize("skip_mode", ["read", "seek"])
+    def test_frame_devide_segments(self, frame_editor, tmp_path, skip_mode):
+        # 7.5fps では 1 秒ごとのサンプリング位置（7 フレームごと）と int(fps * 秒) がずれる
+        video_path = str(tmp_path / "video.avi")
+        writer = cv2.VideoWriter(
+            video_path, cv2.VideoWriter_fourcc(*"MJPG"), 7.5, (64, 48)
+        )
+        for i in range(40):
+            writer.write(np.full((48, 64, 3), i * 5, dtype=np.uint8))
+        writer.release()
+
+        def devide(**kwargs):
+            return list(
+                frame_editor.frame_devide_generator(
+                    video_path=video_path,
+                    video_skip_sec=1,
+                    sampling_sec=1,
+                    batch_frames=2,
+                    save_frame=False,
+                    is_crop=False,
+                    skip_mode=skip_mode,
+                    **kwargs,
+                )
+            )
+
+        # 区間ごとに取得した結果を連結すると、一括で取得した結果と一致する
+        expected = devide()
+        batches = devide(end_sample=2) + devide(first_sample=2)
+
+        assert len(batches) == len(expected) == 5
+        for (frames, timestamp), (expected_frames, expected_timestamp) in zip(
+            batches, expected
+        ):
+            assert timestamp == expected_timestamp
+            for frame, expected_frame in zip(frames, expected_frames):
+                np.testing.assert_array_equal(frame, expected_frame)
+
+    def test_frame_devide_invalid_skip_mode(self, frame_editor):
+        with pytest.raises(ValueError):
+            next(
+                frame_editor.frame_devide_generator(
+                    video_path="dummy.mp4", skip_mode="invalid"
+                )
+            )
+
+    def test_frame_devide_gray_decode(self, frame_editor, tmp_path):
+        video_path = str(tmp_path / "video.avi")
+        writer = cv2.VideoWriter(
+            video_path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (320, 240)
+        )
+        for i in range(20):
+            frame = np.zeros((240, 320, 3), dtype=np.uint8)
+            cv2.putText(frame, str(i), (50, 150), 0, 4, (255, 255, 255), 8)
+            writer.write(frame)
+        writer.release()
+        click_points = [[10, 10], [300, 10], [300, 200], [10, 200]]
+        log_level = cv2.getLogLevel()
+
+        batches = {}
+        for gray_decode in [False, True]:
+            batches[gray_decode] = list(
+                frame_editor.frame_devide_generator(
+                    video_path=video_path,
+                    sampling_sec=1,
+                    batch_frames=3,
+                    save_frame=False,
+                    click_points=click_points,
+                    gray_decode=gray_decode,
+                )
+            )
+
+        assert len(batches[True]) == len(batches[False]) == 2
+        for (gray_frames, _), (bgr_frames, _) in zip(batches[True], batches[False]):
+            for gray, bgr in zip(gray_frames, bgr_frames):
+                assert gray.shape == (100, 400)
+                expected = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+                assert np.abs(gray.astype(int) - expected).max() <= 2
+        assert cv2.getLogLevel() == log_level
+
+    def test_quiet_opencv_log(self):
+        log_level = cv2.getLogLevel()
+        first = quiet_opencv_log()
+        second = quiet_opencv_log()
+
+        # 別のスレッドの抑制が先に終わっても、全ての抑制が終わるまで元に戻さない
+        first.__enter__()
+        second.__enter__()
+        first.__exit__(None, None, None)
+        assert cv2.getLogLevel() < log_level
+        second.__exit__(None, None, None)
+        assert cv2.getLogLevel() == log_level
+
+    def test_frame_devide_gray_decode_limited_range(self, frame_editor, tmp_path):
+        # MPEG-4 の動画は輝度がリミテッドレンジ（16-235）で出力される
+        video_path = str(tmp_path / "video.mp4")
+        writer = cv2.VideoWriter(
+            video_path, cv2.VideoWriter_fourcc(*"mp4v"), 10, (320, 240)
+        )
+        for i in range(10):
+            frame = np.zeros((240, 320, 3), dtype=np.uint8)
+            frame[:, 160:] = i * 25
+            writer.write(frame)
+        writer.release()
+
+        batches = {}
+        for gray_decode in [False, True]:
+            batches[gray_decode] = list(
+                frame_editor.frame_devide_generator(
+                    video_path=video_path,
+                    sampling_sec=1,
+                    batch_frames=10,
+                    save_frame=False,
+                    is_crop=False,
+                    gray_decode=gray_decode,
+                )
+            )
+
+        # フルレンジに伸長し、BGR から変換した場合と同じ閾値で二値化できるようにする
+        for gray, bgr in zip(batches[True][0][0], batches[False][0][0]):
+            expected = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+            assert np.abs(gray.astype(int) - expected)[:, 8:-8].max() <= 2
+
+    @patch("cv2.VideoCapture")
+    def test_frame_devide_gray_decode_unsupported(
+        self, mock_video_capture, frame_editor, sample_frame
+    ):
+        mock_cap = Mock()
+        mock_cap.isOpened.return_value = True
+        mock_cap.get.return_value = 30.0
+        mock_cap.set.side_effect = lambda prop, value: (
+            prop != cv2.CAP_PROP_CONVERT_RGB
+        )
+        mock_cap.read.side_effect = [(True, sample_frame)] * 10 + [(False, None)]
+        mock_video_capture.return_value = mock_cap
+
+        batches = list(
+            frame_editor.frame_devide_generator(
+                video_path="dummy.mp4",
+                save_frame=False,
+                is_crop=False,
+                gray_decode=True,
+            )
+        )
+
+        # バックエンドが対応していない場合は BGR のままデコードする
+        assert all(frame.ndim == 3 for frame in batches[0][0])
+
+    @patch("cv2.VideoCapture")
+    def test_frame_devide_gray_decode_fallback(
+        self, mock_video_capture, frame_editor, sample_frame
+    ):
+        mock_cap = Mock()
+        mock_cap.isOpened.return_value = True
+        mock_cap.get.side_effect = lambda prop: {
+            cv2.CAP_PROP_FRAME_WIDTH: 640,
+            cv2.CAP_PROP_FRAME_HEIGHT: 480,
+        }.get(prop, 30.0)
+        packed_frame = np.zeros((480, 1280), dtype=np.uint8)
+        mock_cap.read.side_effect = (
+            [(True, packed_frame)] + [(True, sample_frame)] * 10 + [(False, None)]
+        )
+        mock_video_capture.return_value = mock_cap
+
+        batches = list(
+            frame_editor.frame_devide_generator(
+                video_path="dummy.mp4",
+                save_frame=False,
+                is_crop=False,
+                gray_decode=True,
+            )
+        )
+
+        # 輝度平面として扱えない形式の場合は BGR への変換に戻し、同じフレームを読み直す
+        mock_cap.set.assert_any_call(cv2.CAP_PROP_CONVERT_RGB, 1)
+        mock_cap.set.assert_called_with(cv2.CAP_PROP_POS_FRAMES, 29)
+        assert len(batches[0][0]) == 10
+        assert all(frame.ndim == 3 for frame in batches[0][0])
+
+    def test_frame_devide_invalid_frame_source(self, frame_editor):
+        with pytest.raises(ValueError):
+            next(
+                frame_editor.frame_devide_generator(
+                    video_path="dummy.mp4", frame_source="invalid"
+                )
+            )
+
+    @patch("cores.frame_editor.is_ffmpeg_available", return_value=True)
+    @patch("subprocess.Popen")
+    def test_frame_devide_ffmpeg(
+        self, mock_popen, mock_is_ffmpeg_available, frame_editor, tmp_path
+    ):
+        video_path = str(tmp_path / "video.avi")
+        writer = cv2.VideoWriter(
+            video_path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (320, 240)
+        )
+        for i in range(25):
+            frame = np.zeros((240, 320, 3), dtype=np.uint8)
+            cv2.putText(frame, str(i), (50, 150), 0, 4, (255, 255, 255), 8)
+            writer.write(frame)
+        writer.release()
+        click_points = [[41, 61], [251, 63], [249, 181], [43, 179]]
+
+        # ffmpeg の代わりに、サンプリング対象のフレームから外接矩形を切り出して出力する
+        x, y, w, h = get_roi(click_points, 320, 240)
+        cap = cv2.VideoCapture(video_path)
+        raw_frames = []
+        for n in range(25):
+            _, frame = cap.read()
+            if n % 10 < 3:
+                raw_frames.append(frame[y : y + h, x : x + w].tobytes())
+        cap.release()
+        process = Mock()
+        process.stdout = io.BytesIO(b"".join(raw_frames))
+        process.wait.return_value = 0
+        mock_popen.return_value = process
+
+        batches = {}
+        for frame_source in ["opencv", "ffmpeg"]:
+            batches[frame_source] = list(
+                frame_editor.frame_devide_generator(
+                    video_path=video_path,
+                    sampling_sec=1,
+                    batch_frames=3,
+                    save_frame=False,
+                    click_points=click_points,
+                    frame_source=frame_source,
+                )
+            )
+
+        mock_popen.assert_called_once()
+        assert len(batches["ffmpeg"]) == len(batches["opencv"]) == 3
+        for (ffmpeg_frames, ffmpeg_timestamp), (opencv_frames, opencv_timestamp) in zip(
+            batches["ffmpeg"], batches["opencv"]
+        ):
+            assert ffmpeg_timestamp == opencv_timestamp
+            assert len(ffmpeg_frames) == len(opencv_frames)
+            for ffmpeg_frame, opencv_frame in zip(ffmpeg_frames, opencv_frames):
+                np.testing.assert_array_equal(ffmpeg_frame, opencv_frame)
+
+    @patch("cores.frame_editor.is_ffmpeg_available", return_value=False)
+    @patch("subprocess.Popen")
+    @patch("cv2.VideoCapture")
+    def test_frame_devide_ffmpeg_not_found(
+        self,
+        mock_video_capture,
+        mock_popen,
+        mock_is_ffmpeg_available,
+        frame_editor,
+        sample_frame,
+        sample_click_points,
+    ):
+        mock_cap = Mock()
+        mock_cap.isOpened.return_value = True
+        mock_cap.get.return_value = 30.0
+        mock_cap.read.side_effect = [(True, sample_frame)] * 10 + [(False, None)]
+        mock_video_capture.return_value = mock_cap
+
+        batches = list(
+            frame_editor.frame_devide_generator(
+                video_path="dummy.mp4",
+                save_frame=False,
+                click_points=sample_click_points.tolist(),
+                frame_source="ffmpeg",
+            )
+        )
+
+        # ffmpeg がない場合は OpenCV で取得する
+        mock_popen.assert_not_called()
+        assert len(batches[0][0]) == 10
+
+    @patch("cores.frame_editor.is_ffmpeg_available", return_value=False)
+    def test_benchmark_frame_sources(
+        self, mock_is_ffmpeg_available, frame_editor, sample_click_points
+    ):
+        with patch.object(
+            frame_editor,
+            "frame_devide_generator",
+            side_effect=lambda **kwargs: (batch for batch in [([], "0:00:00")] * 5),
+        ) as mock_generator:
+            elapsed = frame_editor.benchmark_frame_sources(
+                "dummy.mp4", sample_click_points.tolist(), 2, sampling_sec=1
+            )
+
+        # 使用できる取得方法だけを計測する
+        assert list(elapsed.keys()) == ["opencv"]
+        kwargs = mock_generator.call_args.kwargs
+        assert kwargs["frame_source"] == "opencv"
+        assert kwargs["sampling_sec"] == 1
+        assert kwargs["save_frame"] is False
+
     def test_order_points(self, frame_editor, sample_click_points):
         expected_points = sample_click_points.copy()
         for i in range(4):
@@ -91,6 +415,37 @@ class TestFrameEditor:
         assert cropped.shape[0] == frame_editor.crop_height
         assert cropped.shape[1] == frame_editor.crop_width * frame_editor.num_digits
 
+    def test_crop_matches_warp_perspective(self, frame_editor, sample_click_points):
+        image = cv2.GaussianBlur(
+            np.random.randint(0, 255, (720, 1280, 3), dtype=np.uint8), (7, 7), 3
+        )
+        width = frame_editor.crop_width * frame_editor.num_digits
+        height = frame_editor.crop_height
+        M = cv2.getPerspectiveTransform(
+            sample_click_points.astype(np.float32),
+            np.array(
+                [[0, 0], [width, 0], [width, height], [0, height]], dtype=np.float32
+            ),
+        )
+        expected = cv2.warpPerspective(image, M, (width, height))
+
+        cropped = frame_editor.crop(image, sample_click_points)
+
+        assert np.abs(cropped.astype(int) - expected).max() <= 1
+
+    def test_crop_reuses_remap_tables(
+        self, frame_editor, sample_frame, sample_click_points
+    ):
+        with patch(
+            "cv2.getPerspectiveTransform", wraps=cv2.getPerspectiveTransform
+        ) as mock_transform:
+            frame_editor.crop(sample_frame, sample_click_points)
+            frame_editor.crop(sample_frame, sample_click_points.tolist())
+            assert mock_transform.call_count == 1
+
+            frame_editor.crop(sample_frame, (sample_click_points + 1).tolist())
+            assert mock_transform.call_count == 2
+
     def test_crop_invalid_points(self, frame_editor, sample_frame):
         invalid_points = [[0, 0], [0, 1]]
         result = frame_editor.crop(sample_frame, invalid_points)
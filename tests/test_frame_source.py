@@ -0,0 +1,149 @@
+import io
+import sys
+import numpy as np
+from unittest.mock import Mock, patch
+from cores.frame_source import (
+    FfmpegFrameReader,
+    get_roi,
+    get_supported_frame_sources,
+    is_ffmpeg_available,
+)
+
+
+def make_process(data: bytes, returncode: int = 0) -> Mock:
+    process = Mock()
+    process.stdout = io.BytesIO(data)
+    process.wait.return_value = returncode
+    process.poll.return_value = returncode
+    return process
+
+
+class TestFrameSource:
+    def test_get_supported_frame_sources(self):
+        assert get_supported_frame_sources() == ["opencv", "ffmpeg"]
+
+    @patch("shutil.which")
+    def test_is_ffmpeg_available(self, mock_which):
+        mock_which.return_value = "/usr/bin/ffmpeg"
+        assert is_ffmpeg_available() is True
+        mock_which.return_value = None
+        assert is_ffmpeg_available() is False
+
+    def test_get_roi(self):
+        click_points = [[101, 51], [201, 53], [199, 91], [103, 89]]
+        x, y, w, h = get_roi(click_points, 640, 480, margin=4)
+
+        # 色差の間引きに合わせて位置と大きさを偶数に揃え、クリックポイントと余白を含める
+        assert (x, y, w, h) == (96, 46, 110, 50)
+        assert all(v % 2 == 0 for v in (x, y, w, h))
+
+    def test_get_roi_clipped(self):
+        click_points = [[0, 0], [639, 0], [639, 479], [0, 479]]
+        assert get_roi(click_points, 640, 480) == (0, 0, 640, 480)
+
+    def test_build_command(self):
+        reader = FfmpegFrameReader(
+            "video.mp4",
+            interval_frames=150,
+            batch_frames=5,
+            roi=(96, 46, 110, 50),
+            video_skip_sec=10,
+            max_frames=30,
+            gray=True,
+        )
+        command = reader.build_command()
+
+        # 入力の前に -ss を指定してキーフレームからシークする
+        assert command.index("-ss") < command.index("-i")
+        assert command[command.index("-ss") + 1] == "10"
+        assert command[command.index("-frames:v") + 1] == "30"
+        filters = command[command.index("-vf") + 1]
+        assert "select='lt(mod(n\\,150)\\,5)'" in filters
+        assert "crop=110:50:96:46:exact=1" in filters
+        assert command[command.index("-pix_fmt") + 1] == "gray"
+        assert command[-1] == "pipe:1"
+
+    def test_build_command_defaults(self):
+        reader = FfmpegFrameReader(
+            "video.mp4", interval_frames=30, batch_frames=3, roi=(0, 0, 4, 2)
+        )
+        command = reader.build_command()
+
+        assert "-ss" not in command
+        assert "-frames:v" not in command
+        assert command[command.index("-pix_fmt") + 1] == "bgr24"
+
+    @patch("subprocess.Popen")
+    def test_read(self, mock_popen):
+        frames = np.arange(3 * 2 * 4 * 3, dtype=np.uint8).reshape(3, 2, 4, 3)
+        mock_popen.return_value = make_process(frames.tobytes())
+
+        with FfmpegFrameReader(
+            "video.mp4", interval_frames=30, batch_frames=3, roi=(0, 0, 4, 2)
+        ) as reader:
+            read_frames = []
+            while (frame := reader.read()) is not None:
+                read_frames.append(frame.copy())
+                buffer = frame
+
+            # 読み込み用のバッファは使い回す
+            assert reader.read() is None
+            assert reader._buffer is buffer
+
+        assert len(read_frames) == 3
+        for expected, frame in zip(frames, read_frames):
+            np.testing.assert_array_equal(frame, expected)
+        mock_popen.assert_called_once()
+        assert reader._process is None
+
+    @patch("subprocess.Popen")
+    def test_read_incomplete_frame(self, mock_popen):
+        mock_popen.return_value = make_process(bytes(12), returncode=1)
+
+        reader = FfmpegFrameReader(
+            "video.mp4", interval_frames=30, batch_frames=3, roi=(0, 0, 4, 2), gray=True
+        )
+        assert reader.read() is not None
+        assert reader.read() is None
+        reader.close()
+
+    @patch("subprocess.Popen")
+    def test_close_running_process(self, mock_popen):
+        process = make_process(b"")
+        process.poll.return_value = None
+        mock_popen.return_value = process
+
+        reader = FfmpegFrameReader(
+            "video.mp4", interval_frames=30, batch_frames=3, roi=(0, 0, 4, 2)
+        )
+        reader.open()
+        reader.close()
+
+        process.kill.assert_called_once()
+        assert reader._process is None
+
+    def test_read_with_large_stderr(self):
+        # パイプのバッファ（64 KB）を超えるエラー出力の後にフレームを出力して異常終了する
+        script = (
+            "import sys;"
+            "sys.stderr.write('e' * 256 * 1024);"
+            "sys.stderr.flush();"
+            "sys.stdout.buffer.write(bytes(range(8)) * 2)"
+            ";sys.exit(1)"
+        )
+        reader = FfmpegFrameReader(
+            "video.mp4", interval_frames=30, batch_frames=3, roi=(0, 0, 4, 2), gray=True
+        )
+        with patch.object(
+            reader, "build_command", return_value=[sys.executable, "-c", script]
+        ), patch("cores.frame_source.logger") as mock_logger:
+            frames = []
+            while (frame := reader.read()) is not None:
+                frames.append(frame.copy())
+            reader.close()
+
+        assert len(frames) == 2
+        np.testing.assert_array_equal(frames[0].reshape(-1), np.arange(8))
+        message = mock_logger.error.call_args.args[0]
+        assert message.startswith("ffmpeg exited with code 1")
+        assert message.count("e") >= 256 * 1024
@@ -0,0 +1,82 @@
+import pytest
+import threading
+import cv2
+import numpy as np
+from unittest.mock import patch
+from cores.frame_archive import FrameArchive
+from cores.frame_writer import FrameWriter
+
+
+@pytest.fixture
+def frame():
+    return np.random.randint(0, 256, (100, 400, 3), dtype=np.uint8)
+
+
+class TestFrameWriter:
+    @pytest.mark.parametrize("frame_format", ["jpg", "png", "npy"])
+    def test_write(self, frame, frame_format, tmp_path):
+        with FrameWriter(tmp_path, frame_format=frame_format) as writer:
+            for i in range(5):
+                assert writer.write(i, frame)
+
+        assert writer.get_counts() == (5, 0, 0)
+        paths = sorted(tmp_path.glob(f"frame_*.{frame_format}"))
+        assert len(paths) == 5
+        if frame_format == "npy":
+            np.testing.assert_array_equal(np.load(paths[0]), frame)
+        else:
+            assert cv2.imread(str(paths[0])).shape == frame.shape
+        if frame_format == "png":
+            np.testing.assert_array_equal(cv2.imread(str(paths[0])), frame)
+
+    def test_invalid_format(self, tmp_path):
+        with pytest.raises(ValueError):
+            FrameWriter(tmp_path, frame_format="bmp")
+
+    def test_drop_when_full(self, frame, tmp_path):
+        release = threading.Event()
+        original_save = FrameWriter._save
+
+        def slow_save(self, *args):
+            release.wait()
+            return original_save(self, *args)
+
+        with patch.object(FrameWriter, "_save", slow_save):
+            writer = FrameWriter(tmp_path, queue_size=2, block=False)
+            results = [writer.write(i, frame) for i in range(6)]
+            release.set()
+            writer.close()
+
+        assert results.count(False) >= 3
+        written, dropped, failed = writer.get_counts()
+        assert dropped == results.count(False)
+        assert written == results.count(True)
+        assert failed == 0
+
+    def test_close_flushes_queue(self, frame, tmp_path):
+        writer = FrameWriter(tmp_path, frame_format="npy", num_workers=2)
+        for i in range(20):
+            writer.write(i, frame)
+        writer.close()
+        writer.close()
+
+        assert len(list(tmp_path.glob("*.npy"))) == 20
+
+    @patch("cv2.imwrite", return_value=False)
+    def test_write_failure(self, mock_imwrite, frame, tmp_path):
+        with FrameWriter(tmp_path) as writer:
+            writer.write(0, frame)
+
+        assert writer.get_counts() == (0, 0, 1)
+
+    def test_write_archive(self, frame, tmp_path):
+        with FrameWriter(tmp_path, frame_format="archive", num_workers=4) as writer:
+            for i in range(5):
+                writer.write(i * 10, frame, sample_id=i // 2, timestamp=i * 0.5)
+
+        assert writer.get_counts() == (5, 0, 0)
+        archive = FrameArchive(tmp_path)
+        assert len(archive) == 5
+        assert archive.frame_indices.tolist() == [0, 10, 20, 30, 40]
+        assert archive.sample_ids.tolist() == [0, 0, 1, 1, 2]
+        np.testing.assert_array_equal(archive[4], frame)
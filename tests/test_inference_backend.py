@@ -0,0 +1,168 @@
+import json
+import pytest
+from unittest.mock import Mock, patch
+from cores import inference_backend
+from cores.inference_backend import (
+    create_detector,
+    get_available_backends,
+    get_requested_backend,
+    is_backend_available,
+    select_backend,
+)
+from cores.inference_options import resolve_inference_options
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    model_dir = tmp_path / "model"
+    model_dir.mkdir()
+    for extension in ["tflite", "onnx"]:
+        (model_dir / f"model_100x100.{extension}").write_bytes(b"dummy")
+    with patch.object(inference_backend, "MODEL_DIR", model_dir), patch(
+        "cores.cnn.MODEL_DIR", model_dir
+    ):
+        yield model_dir
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    path = tmp_path / "cache" / "backend_benchmark.json"
+    with patch("cores.inference_backend.get_benchmark_cache_path", return_value=path):
+        yield path
+
+
+def fake_benchmark(backend, num_digits, model_filename, options):
+    load_sec = {"tflite": 0.5, "tf": 5.0, "onnx": 0.1}[backend]
+    return {"load_sec": load_sec, "infer_sec": 0.001}, Mock(backend=backend)
+
+
+class TestBackendProbe:
+    @patch("cores.inference_backend.find_spec")
+    def test_is_backend_available(self, mock_find_spec):
+        mock_find_spec.side_effect = lambda name: (
+            object() if name == "onnxruntime" else None
+        )
+
+        assert is_backend_available("onnx")
+        assert not is_backend_available("tflite")
+        assert get_available_backends() == ["onnx"]
+
+    @patch("cores.inference_backend.find_spec", side_effect=ValueError)
+    def test_is_backend_available_error(self, mock_find_spec):
+        assert not is_backend_available("tf")
+
+    def test_get_requested_backend(self, monkeypatch):
+        monkeypatch.delenv("SICHIRIBE_BACKEND", raising=False)
+        assert get_requested_backend(resolve_inference_options(None)) == "auto"
+
+        monkeypatch.setenv("SICHIRIBE_BACKEND", "ONNX")
+        assert get_requested_backend(resolve_inference_options(None)) == "onnx"
+        # 設定で指定した値は環境変数より優先する
+        options = resolve_inference_options({"backend": "tflite"})
+        assert get_requested_backend(options) == "tflite"
+
+        monkeypatch.setenv("SICHIRIBE_BACKEND", "torch")
+        with pytest.raises(ValueError):
+            get_requested_backend(resolve_inference_options(None))
+
+
+class TestSelectBackend:
+    @patch(
+        "cores.inference_backend.get_available_backends",
+        return_value=["tflite", "onnx"],
+    )
+    @patch("cores.inference_backend.benchmark_backend", side_effect=fake_benchmark)
+    def test_benchmark_is_cached(
+        self, mock_benchmark, mock_available, model_dir, cache_path
+    ):
+        options = resolve_inference_options(None)
+
+        backend, detector = select_backend(4, options)
+
+        assert backend == "onnx"
+        assert detector.backend == "onnx"
+        assert mock_benchmark.call_count == 2
+        assert len(json.loads(cache_path.read_text())) == 2
+
+        backend, detector = select_backend(4, options)
+
+        assert backend == "onnx"
+        assert detector is None
+        assert mock_benchmark.call_count == 2
+
+    @patch(
+        "cores.inference_backend.get_available_backends",
+        return_value=["tf", "onnx"],
+    )
+    @patch("cores.inference_backend.benchmark_backend")
+    def test_skip_backend_without_model(
+        self, mock_benchmark, mock_available, model_dir, cache_path
+    ):
+        backend, detector = select_backend(4, resolve_inference_options(None))
+
+        assert backend == "onnx"
+        assert detector is None
+        mock_benchmark.assert_not_called()
+
+    @patch("cores.inference_backend.get_available_backends", return_value=[])
+    def test_no_backend(self, mock_available, model_dir, cache_path):
+        with pytest.raises(ImportError):
+            select_backend(4, resolve_inference_options(None))
+
+
+class TestCreateDetector:
+    @patch("cores.inference_backend.is_backend_available", return_value=False)
+    def test_unavailable_backend(self, mock_available, monkeypatch):
+        monkeypatch.delenv("SICHIRIBE_BACKEND", raising=False)
+        with pytest.raises(ImportError):
+            create_detector(4, None, resolve_inference_options({"backend": "tf"}))
+
+    @patch("cores.inference_backend.get_backend_class")
+    @patch("cores.inference_backend.is_backend_available", return_value=True)
+    def test_explicit_backend(
+        self, mock_available, mock_get_class, model_dir, monkeypatch
+    ):
+        monkeypatch.delenv("SICHIRIBE_BACKEND", raising=False)
+        options = resolve_inference_options({"backend": "tflite"})
+
+        create_detector(4, None, options)
+
+        mock_get_class.assert_called_once_with("tflite")
+        kwargs = mock_get_class.return_value.call_args.kwargs
+        assert kwargs["model_filename"] == "model_100x100.tflite"
+
+    @patch("cores.inference_backend.select_backend")
+    @patch("cores.inference_backend.get_backend_class")
+    @patch("cores.inference_backend.is_backend_available", return_value=True)
+    def test_backend_from_model_extension(
+        self, mock_available, mock_get_class, mock_select, monkeypatch
+    ):
+        monkeypatch.delenv("SICHIRIBE_BACKEND", raising=False)
+
+        create_detector(4, "custom.onnx", resolve_inference_options(None))
+
+        mock_select.assert_not_called()
+        mock_get_class.assert_called_once_with("onnx")
+
+    @patch("cores.inference_backend.select_backend")
+    @patch("cores.inference_backend.get_backend_class")
+    @patch(
+        "cores.inference_backend.is_backend_available",
+        side_effect=lambda backend: backend == "tflite",
+    )
+    def test_model_extension_backend_not_installed(
+        self, mock_available, mock_get_class, mock_select, monkeypatch
+    ):
+        monkeypatch.delenv("SICHIRIBE_BACKEND", raising=False)
+
+        # 他のランタイムやデフォルトのモデルに切り替えずにエラーにする
+        with pytest.raises(ImportError, match="onnxruntime"):
+            create_detector(4, "custom.onnx", resolve_inference_options(None))
+        mock_select.assert_not_called()
+        mock_get_class.assert_not_called()
+
+    def test_unsupported_model_extension(self, monkeypatch):
+        monkeypatch.delenv("SICHIRIBE_BACKEND", raising=False)
+
+        with pytest.raises(ValueError):
+            create_detector(4, "custom.h5", resolve_inference_options(None))
@@ -0,0 +1,86 @@
+import pytest
+import argparse
+from unittest.mock import patch
+from cores.inference_options import (
+    add_inference_arguments,
+    get_default_inference_options,
+    is_valid_inference_options,
+    pop_inference_arguments,
+    resolve_inference_options,
+    split_threads,
+)
+
+
+class TestInferenceOptions:
+    def test_default_is_valid(self):
+        assert is_valid_inference_options(get_default_inference_options())
+
+    @pytest.mark.parametrize(
+        "options, expected",
+        [
+            ({}, True),
+            ({"num_threads": 2, "graph_optimization": "basic"}, True),
+            ({"providers": ["CPUExecutionProvider"]}, True),
+            ({"num_threads": -1}, False),
+            ({"graph_optimization": "fast"}, False),
+            ({"xnnpack": "yes"}, False),
+            ({"early_exit": True, "early_exit_confidence": 0.9}, True),
+            ({"early_exit_confidence": 1.5}, False),
+            ({"micro_batch_frames": 0}, False),
+            ({"aggregation": "log"}, True),
+            ({"aggregation": "max"}, False),
+            ({"cache_size": 0}, True),
+            ({"cache_size": -1}, False),
+            ({"unknown": 1}, False),
+            ([], False),
+        ],
+    )
+    def test_is_valid_inference_options(self, options, expected):
+        assert is_valid_inference_options(options) is expected
+
+    def test_resolve_inference_options(self):
+        options = resolve_inference_options({"num_threads": 2})
+
+        assert options == {**get_default_inference_options(), "num_threads": 2}
+        with pytest.raises(ValueError):
+            resolve_inference_options({"num_threads": "2"})
+
+    @patch("cores.inference_options.os.cpu_count", return_value=8)
+    def test_split_threads(self, mock_cpu_count):
+        assert split_threads(None, 1)["num_threads"] == 0
+
+        options = split_threads(None, 4)
+        assert options["num_threads"] == 2
+        assert options["inter_op_threads"] == 1
+
+        assert split_threads({"num_threads": 3}, 4)["num_threads"] == 3
+        assert split_threads(None, 16)["num_threads"] == 1
+
+    def test_pop_inference_arguments(self):
+        parser = argparse.ArgumentParser()
+        add_inference_arguments(parser)
+        args = vars(
+            parser.parse_args(
+                ["--inference-threads", "2", "--disable-xnnpack", "--providers", "A"]
+            )
+        )
+
+        options = pop_inference_arguments(args)
+
+        assert options == {"num_threads": 2, "xnnpack": False, "providers": ["A"]}
+        assert args == {}
+
+    @pytest.mark.parametrize(
+        "argv, expected",
+        [
+            ([], {}),
+            (["--early-exit"], {"early_exit": True}),
+            (["--no-early-exit"], {"early_exit": False}),
+        ],
+    )
+    def test_pop_early_exit(self, argv, expected):
+        parser = argparse.ArgumentParser()
+        add_inference_arguments(parser)
+
+        # --no-early-exit は設定ファイルで有効にした早期終了を無効にできる
+        assert pop_inference_arguments(vars(parser.parse_args(argv))) == expected
@@ -0,0 +1,148 @@
+import pytest
+import time
+import numpy as np
+from unittest.mock import Mock
+from cores.frame_editor import FrameEditor
+from cores.live_pipeline import LivePipeline
+
+
+@pytest.fixture
+def click_points():
+    return [[0, 0], [400, 0], [400, 100], [0, 100]]
+
+
+@pytest.fixture
+def frame_capture(sample_frame):
+    capture = Mock()
+    capture.get_fresh_frames.side_effect = lambda n: [
+        (sample_frame, time.time()) for _ in range(n)
+    ]
+    return capture
+
+
+@pytest.fixture
+def detector():
+    detector = Mock()
+    detector.prepare_batch.side_effect = lambda frames, th: np.zeros(
+        (len(frames) * 4, 100, 100, 1), dtype=np.float32
+    )
+    detector.predict_prepared.return_value = (1234, 0.0)
+    detector.last_confidences = [1.0] * 4
+    detector.last_entropies = [0.0] * 4
+    return detector
+
+
+def create_pipeline(frame_capture, detector, click_points, **kwargs):
+    params = {
+        "frame_capture": frame_capture,
+        "frame_editor": FrameEditor(num_digits=4),
+        "detector": detector,
+        "click_points": click_points,
+        "batch_frames": 3,
+        "sampling_sec": 0.05,
+        "total_sampling_sec": 0.22,
+    }
+    params.update(kwargs)
+    return LivePipeline(**params)
+
+
+class TestLivePipeline:
+    @pytest.mark.timeout(5)
+    def test_results(self, frame_capture, detector, click_points):
+        pipeline = create_pipeline(frame_capture, detector, click_points)
+        pipeline.start()
+        results = list(pipeline.results())
+        pipeline.join()
+
+        assert 3 <= len(results) <= 6
+        value, failed_rate, timestamp, first_frame, confidences, entropies = results[0]
+        assert value == 1234
+        assert failed_rate == 0.0
+        assert confidences == [1.0] * 4
+        assert entropies == [0.0] * 4
+        assert timestamp == "0:00:00"
+        assert first_frame.shape == (100, 400, 3)
+        assert pipeline.error is None
+        # 1サンプル分のフレームはまとめて前処理される
+        assert len(detector.prepare_batch.call_args[0][0]) == 3
+
+    @pytest.mark.timeout(5)
+    def test_save_frames(self, frame_capture, detector, click_points, tmp_path):
+        pipeline = create_pipeline(
+            frame_capture, detector, click_points, frames_dir=tmp_path
+        )
+        pipeline.start()
+        results = list(pipeline.results())
+        pipeline.join()
+
+        assert len(list(tmp_path.glob("frame_*.jpg"))) == 3 * len(results)
+
+    @pytest.mark.timeout(5)
+    def test_stop(self, frame_capture, detector, click_points):
+        pipeline = create_pipeline(
+            frame_capture, detector, click_points, total_sampling_sec=60
+        )
+        pipeline.start()
+        assert pipeline.get_result(timeout=1) is not None
+        pipeline.stop()
+        list(pipeline.results())
+        pipeline.join()
+
+    @pytest.mark.timeout(5)
+    def test_capture_failure(self, frame_capture, detector, click_points):
+        frame_capture.get_fresh_frames.side_effect = None
+        frame_capture.get_fresh_frames.return_value = []
+        pipeline = create_pipeline(frame_capture, detector, click_points)
+        pipeline.start()
+        results = list(pipeline.results())
+        pipeline.join()
+
+        assert results == []
+        assert pipeline.error is not None
+
+    @pytest.mark.timeout(5)
+    def test_inference_failure(self, frame_capture, detector, click_points):
+        detector.predict_prepared.side_effect = RuntimeError("boom")
+        pipeline = create_pipeline(
+            frame_capture, detector, click_points, total_sampling_sec=60
+        )
+        pipeline.start()
+        results = list(pipeline.results())
+        pipeline.join()
+
+        assert results == []
+        assert pipeline.error == "boom"
+
+    @pytest.mark.timeout(5)
+    def test_change_detection(self, frame_capture, detector, click_points):
+        detector.num_digits = 4
+        detector.predict_changed.return_value = (1234, 0.0)
+        pipeline = create_pipeline(
+            frame_capture, detector, click_points, change_threshold=0.05
+        )
+        pipeline.start()
+        results = list(pipeline.results())
+        pipeline.join()
+
+        assert len(results) == detector.predict_changed.call_count
+        detector.predict_prepared.assert_not_called()
+        # 同じフレームが続くため、2回目以降は変化した桁がない
+        first_changed = detector.predict_changed.call_args_list[0][0][1]
+        last_changed = detector.predict_changed.call_args_list[-1][0][1]
+        assert first_changed.all()
+        assert not last_changed.any()
+
+    @pytest.mark.timeout(5)
+    def test_save_frames_npy(self, frame_capture, detector, click_points, tmp_path):
+        pipeline = create_pipeline(
+            frame_capture,
+            detector,
+            click_points,
+            frames_dir=tmp_path,
+            frame_format="npy",
+        )
+        pipeline.start()
+        results = list(pipeline.results())
+        pipeline.join()
+
+        assert len(list(tmp_path.glob("frame_*.npy"))) == 3 * len(results)
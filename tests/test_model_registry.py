@@ -0,0 +1,121 @@
+import pytest
+import threading
+from unittest.mock import Mock, patch
+from cores import model_registry
+from cores.model_registry import clear_detectors, get_detector, warm_up
+from gui.workers.model_warmup_worker import ModelWarmupWorker
+
+
+@pytest.fixture(autouse=True)
+def registry():
+    clear_detectors()
+    yield
+    clear_detectors()
+
+
+@pytest.fixture
+def mock_cnn_init():
+    with patch(
+        "cores.model_registry.cnn_init", side_effect=lambda *args: Mock()
+    ) as mock:
+        yield mock
+
+
+class TestModelRegistry:
+    def test_reuse_same_model(self, mock_cnn_init):
+        detector = get_detector(4)
+
+        assert get_detector(4) is detector
+        # 既定値と同じ設定は同じモデルとみなす
+        assert get_detector(4, inference_options={"backend": "auto"}) is detector
+        mock_cnn_init.assert_called_once()
+
+    def test_separate_models(self, mock_cnn_init):
+        detector = get_detector(4)
+
+        assert get_detector(3) is not detector
+        assert get_detector(4, "model_100x100.onnx") is not detector
+        assert get_detector(4, inference_options={"backend": "onnx"}) is not detector
+        assert mock_cnn_init.call_count == 4
+
+    def test_concurrent_access(self, mock_cnn_init):
+        detectors = []
+        threads = [
+            threading.Thread(target=lambda: detectors.append(get_detector(4)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert all(d is detectors[0] for d in detectors)
+        mock_cnn_init.assert_called_once()
+
+    def test_invalid_options(self, mock_cnn_init):
+        with pytest.raises(ValueError):
+            get_detector(4, inference_options={"backend": "invalid"})
+        mock_cnn_init.assert_not_called()
+
+    def test_failed_init_is_not_registered(self, mock_cnn_init):
+        mock_cnn_init.side_effect = [FileNotFoundError, Mock()]
+        with pytest.raises(FileNotFoundError):
+            get_detector(4)
+
+        assert get_detector(4) is not None
+        assert mock_cnn_init.call_count == 2
+
+    def test_warm_up(self, mock_cnn_init):
+        detector = warm_up(4)
+
+        detector.ensure_model_loaded.assert_called_once()
+        assert get_detector(4) is detector
+
+    def test_clear_detectors(self, mock_cnn_init):
+        detector = get_detector(4)
+        clear_detectors()
+
+        assert get_detector(4) is not detector
+        assert len(model_registry._detectors) == 1
+
+
+class TestModelWarmupWorker:
+    @patch("gui.workers.model_warmup_worker.SettingsManager")
+    def test_get_targets(self, mock_settings_manager):
+        mock_settings_manager.return_value.load_default.side_effect = [
+            {"num_digits": 4, "inference": {"backend": "onnx"}},
+            {"num_digits": 4, "inference": {"backend": "onnx"}},
+            {"num_digits": 3},
+        ]
+        worker = ModelWarmupWorker(["replay", "live", "live"])
+
+        assert worker.get_targets() == [(4, {"backend": "onnx"}), (3, None)]
+
+    @patch("gui.workers.model_warmup_worker.SettingsManager")
+    def test_get_targets_skips_broken_settings(self, mock_settings_manager):
+        mock_settings_manager.return_value.load_default.side_effect = [
+            KeyError("num_digits"),
+            {"num_digits": 4},
+        ]
+        worker = ModelWarmupWorker()
+
+        assert worker.get_targets() == [(4, None)]
+
+    @patch("gui.workers.model_warmup_worker.warm_up")
+    def test_run(self, mock_warm_up):
+        worker = ModelWarmupWorker()
+        with patch.object(
+            worker, "get_targets", return_value=[(4, None), (3, {"backend": "onnx"})]
+        ):
+            worker.run()
+
+        assert mock_warm_up.call_count == 2
+        mock_warm_up.assert_any_call(3, inference_options={"backend": "onnx"})
+
+    @patch("gui.workers.model_warmup_worker.warm_up", side_effect=ImportError)
+    def test_run_ignores_errors(self, mock_warm_up):
+        worker = ModelWarmupWorker()
+        with patch.object(worker, "get_targets", return_value=[(4, None), (3, None)]):
+            worker.run()
+
+        assert mock_warm_up.call_count == 2
@@ -0,0 +1,134 @@
+import pytest
+import queue
+import threading
+import numpy as np
+from unittest.mock import Mock, patch
+from cores.parallel_replay import split_segments, parallel_replay_generator
+
+
+class FakeProcess:
+    def __init__(self, target, args, daemon):
+        self.thread = threading.Thread(target=target, args=args, daemon=daemon)
+
+    def start(self):
+        self.thread.start()
+
+    def is_alive(self):
+        return self.thread.is_alive()
+
+    def terminate(self):
+        pass
+
+    def join(self):
+        self.thread.join()
+
+
+class FakeContext:
+    def Queue(self):
+        q = queue.Queue()
+        q.close = lambda: None
+        return q
+
+    def Process(self, target, args, daemon):
+        return FakeProcess(target, args, daemon)
+
+
+def fake_replay_segment(
+    segment_index, settings, first_sample, end_sample, binarize_th, q
+):
+    # 後ろの区間ほど先に結果が届くようにしても順序が保たれることを確認する
+    for i in range(3):
+        timestamp = f"{segment_index}-{i}"
+        payload = (np.zeros(1), segment_index, 0.0, timestamp, [1.0], [0.0])
+        q.put(("result", segment_index, payload))
+    q.put(("done", segment_index, None))
+
+
+def failing_replay_segment(
+    segment_index, settings, first_sample, end_sample, binarize_th, q
+):
+    q.put(("error", segment_index, "boom"))
+
+
+@pytest.fixture
+def settings():
+    return {
+        "num_digits": 4,
+        "video_path": "dummy.mp4",
+        "video_skip_sec": 0,
+        "sampling_sec": 10,
+        "batch_frames": 10,
+        "save_frame": False,
+        "out_dir": "dummy",
+        "click_points": [[0, 0], [1, 0], [1, 1], [0, 1]],
+        "inference": {"backend": "onnx"},
+    }
+
+
+class TestSplitSegments:
+    @patch("cv2.VideoCapture")
+    def test_split_segments(self, mock_video_capture):
+        mock_cap = Mock()
+        # 30fps で 100 秒の動画
+        mock_cap.get.side_effect = [30.0, 3000.0]
+        mock_video_capture.return_value = mock_cap
+
+        segments = split_segments("dummy.mp4", 5, 10, 4)
+
+        # 5 秒の位置から 300 フレームごとの 10 サンプルを、サンプルの番号で分割する
+        assert segments == [(0, 2), (2, 5), (5, 7), (7, None)]
+
+    @patch("cv2.VideoCapture")
+    def test_split_segments_fractional_fps(self, mock_video_capture):
+        mock_cap = Mock()
+        # 29.97fps で 100 秒の動画。サンプリング間隔は 299 フレーム
+        mock_cap.get.side_effect = [29.97, 2997.0]
+        mock_video_capture.return_value = mock_cap
+
+        segments = split_segments("dummy.mp4", 0, 10, 2)
+
+        assert segments == [(0, 5), (5, None)]
+
+    @patch("cv2.VideoCapture")
+    def test_split_segments_short_video(self, mock_video_capture):
+        mock_cap = Mock()
+        mock_cap.get.side_effect = [30.0, 300.0]
+        mock_video_capture.return_value = mock_cap
+
+        segments = split_segments("dummy.mp4", 0, 10, 8)
+
+        assert segments == [(0, None)]
+
+    @patch("cv2.VideoCapture")
+    def test_split_segments_unknown_length(self, mock_video_capture):
+        mock_cap = Mock()
+        mock_cap.get.return_value = 0.0
+        mock_video_capture.return_value = mock_cap
+
+        assert split_segments("dummy.mp4", 3, 10, 4) == [(0, None)]
+
+
+class TestParallelReplayGenerator:
+    @patch("cores.parallel_replay._replay_segment", fake_replay_segment)
+    @patch("cores.parallel_replay.mp.get_context", return_value=FakeContext())
+    @patch(
+        "cores.parallel_replay.split_segments",
+        return_value=[(0, 10), (10, 20), (20, None)],
+    )
+    def test_results_in_order(self, mock_split, mock_context, settings):
+        results = list(parallel_replay_generator(settings, num_workers=3))
+
+        timestamps = [timestamp for _, _, _, timestamp, _, _ in results]
+        assert timestamps == [f"{s}-{i}" for s in range(3) for i in range(3)]
+
+    @patch("cores.parallel_replay._replay_segment", failing_replay_segment)
+    @patch("cores.parallel_replay.mp.get_context", return_value=FakeContext())
+    @patch("cores.parallel_replay.split_segments", return_value=[(0, None)])
+    def test_segment_error(self, mock_split, mock_context, settings):
+        with pytest.raises(RuntimeError):
+            list(parallel_replay_generator(settings, num_workers=1))
+
+    def test_requires_click_points(self, settings):
+        settings["click_points"] = []
+        with pytest.raises(ValueError):
+            next(parallel_replay_generator(settings, num_workers=2))
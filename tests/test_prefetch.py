@@ -0,0 +1,77 @@
+import pytest
+import threading
+import time
+from cores.prefetch import prefetch_generator
+
+
+def counting_generator(num_items, state, delay_sec=0.0):
+    state["threads"] = set()
+    state["produced"] = 0
+    state["closed"] = False
+    try:
+        for i in range(num_items):
+            time.sleep(delay_sec)
+            state["threads"].add(threading.current_thread().name)
+            state["produced"] += 1
+            yield i
+    finally:
+        state["closed"] = True
+
+
+class TestPrefetchGenerator:
+    def test_yields_all_items_in_order(self):
+        state = {}
+        assert list(prefetch_generator(counting_generator(20, state), 2)) == list(
+            range(20)
+        )
+        # 先読みスレッドで実行される
+        assert state["threads"] == {"prefetch"}
+        assert state["closed"]
+
+    def test_disabled(self):
+        state = {}
+        assert list(prefetch_generator(counting_generator(5, state), 0)) == list(
+            range(5)
+        )
+        assert state["threads"] == {threading.current_thread().name}
+
+    def test_backpressure(self):
+        state = {}
+        items = prefetch_generator(counting_generator(100, state), 2)
+        assert next(items) == 0
+        time.sleep(0.3)
+
+        # 消費されていない要素はキューの上限と受け渡し中の1件までしか先読みしない
+        assert state["produced"] <= 1 + 2 + 1
+        items.close()
+
+    def test_close_stops_producer(self):
+        state = {}
+        items = prefetch_generator(counting_generator(100, state), 2)
+        assert next(items) == 0
+        items.close()
+
+        # close が返った時点で元のジェネレータは閉じられている
+        assert state["closed"]
+        assert state["produced"] < 100
+        assert not any(t.name == "prefetch" for t in threading.enumerate())
+
+    def test_error_is_raised_in_consumer(self):
+        def failing_generator():
+            yield 1
+            raise RuntimeError("decode failed")
+
+        items = prefetch_generator(failing_generator(), 2)
+        assert next(items) == 1
+        with pytest.raises(RuntimeError, match="decode failed"):
+            next(items)
+
+    def test_overlaps_producer_and_consumer(self):
+        state = {}
+        start = time.perf_counter()
+        for _ in prefetch_generator(counting_generator(6, state, 0.05), 2):
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+
+        # 逐次処理では 0.6 秒かかる
+        assert elapsed < 0.5
@@ -0,0 +1,214 @@
+import pytest
+import cv2
+import numpy as np
+from unittest.mock import Mock, patch
+from cores.frame_editor import FrameEditor
+from cores.replay_sweep import (
+    expand_sweep_grid,
+    sweep_frame_generator,
+    sweep_replay,
+)
+from cores.stream_export import ResultStreamWriter, read_stream
+
+
+@pytest.fixture
+def video_path(tmp_path):
+    # フレームごとに画素値が異なる 10fps, 95フレームの動画
+    path = str(tmp_path / "video.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (64, 48))
+    for i in range(95):
+        writer.write(np.full((48, 64, 3), i * 2, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+@pytest.fixture
+def click_points():
+    return [[0, 0], [63, 0], [63, 47], [0, 47]]
+
+
+@pytest.fixture
+def settings(video_path):
+    return {
+        "video_path": video_path,
+        "num_digits": 4,
+        "sampling_sec": 3,
+        "batch_frames": 5,
+        "video_skip_sec": 0,
+        "skip_mode": "grab",
+    }
+
+
+class TestExpandSweepGrid:
+    def test_expand(self, settings):
+        configs = expand_sweep_grid(
+            settings, {"sampling_sec": [2, 3], "binarize_th": [None, 128]}
+        )
+
+        assert len(configs) == 4
+        assert [(c["sampling_sec"], c["binarize_th"]) for c in configs] == [
+            (2, None),
+            (2, 128),
+            (3, None),
+            (3, 128),
+        ]
+        assert all(c["num_digits"] == 4 for c in configs)
+
+    def test_empty_grid(self, settings):
+        assert expand_sweep_grid(settings, {}) == [settings]
+
+    @pytest.mark.parametrize(
+        "grid", [{"video_path": ["a.mp4"]}, {"sampling_sec": []}, {"num_digits": 4}]
+    )
+    def test_invalid_grid(self, settings, grid):
+        with pytest.raises(ValueError):
+            expand_sweep_grid(settings, grid)
+
+
+class TestSweepFrameGenerator:
+    @pytest.mark.parametrize("skip_mode", ["read", "grab", "seek", "auto"])
+    def test_matches_frame_devide_generator(self, settings, click_points, skip_mode):
+        configs = expand_sweep_grid(
+            settings,
+            {
+                "sampling_sec": [2, 3],
+                "batch_frames": [3, 5],
+                "video_skip_sec": [0, 1],
+                "num_digits": [3, 4],
+            },
+        )
+        sizes = [20] * len(configs)
+
+        swept = {i: [] for i in range(len(configs))}
+        for index, frames, timestamp in sweep_frame_generator(
+            settings["video_path"], configs, sizes, click_points, skip_mode
+        ):
+            swept[index].append((frames, timestamp))
+
+        # 設定ごとに個別にデコードした結果と一致する
+        for i, config in enumerate(configs):
+            frame_editor = FrameEditor(config["num_digits"], 20, 20)
+            expected = list(
+                frame_editor.frame_devide_generator(
+                    video_path=config["video_path"],
+                    video_skip_sec=config["video_skip_sec"],
+                    sampling_sec=config["sampling_sec"],
+                    batch_frames=config["batch_frames"],
+                    save_frame=False,
+                    click_points=click_points,
+                    skip_mode="read",
+                )
+            )
+            assert [t for _, t in swept[i]] == [t for _, t in expected]
+            for (frames, _), (expected_frames, _) in zip(swept[i], expected):
+                assert len(frames) == len(expected_frames)
+                assert all(
+                    np.array_equal(a, b) for a, b in zip(frames, expected_frames)
+                )
+                assert frames[0].shape == (20, 20 * config["num_digits"], 3)
+
+    def test_decodes_only_sampled_frames(self, settings, click_points):
+        configs = expand_sweep_grid(settings, {"batch_frames": [2, 5]})
+
+        video_capture = cv2.VideoCapture
+        captures = []
+
+        def open_capture(path):
+            captures.append(Mock(wraps=video_capture(path)))
+            return captures[-1]
+
+        with patch("cv2.VideoCapture", side_effect=open_capture):
+            batches = list(
+                sweep_frame_generator(
+                    settings["video_path"], configs, [20, 20], click_points, "grab"
+                )
+            )
+
+        # サンプリング区間が重なる設定でも動画は1回だけ開いてデコードする
+        assert len(captures) == 1
+        assert captures[0].read.call_count == 5 * 4
+        assert len(batches) == 8
+
+    def test_gray_decode(self, settings, click_points):
+        batches = list(
+            sweep_frame_generator(
+                settings["video_path"],
+                [settings],
+                [20],
+                click_points,
+                "grab",
+                gray_decode=True,
+            )
+        )
+
+        assert len(batches) == 4
+        assert all(
+            frame.shape == (20, 80) for _, frames, _ in batches for frame in frames
+        )
+
+    def test_invalid_skip_mode(self, settings, click_points):
+        with pytest.raises(ValueError):
+            list(
+                sweep_frame_generator(
+                    settings["video_path"], [settings], [20], click_points, "invalid"
+                )
+            )
+
+
+class TestSweepReplay:
+    @patch("cores.replay_sweep.get_detector")
+    def test_sweep_replay(self, mock_get_detector, settings, click_points, tmp_path):
+        detector = Mock(crop_size=20)
+        detector.predict_with_confidence.return_value = (
+            1234,
+            0.0,
+            [1.0] * 4,
+            [0.0] * 4,
+        )
+        mock_get_detector.return_value = detector
+        configs = expand_sweep_grid(settings, {"binarize_th": [None, 128]})
+
+        writers = [ResultStreamWriter(tmp_path / f"config_{i:02d}") for i in range(2)]
+
+        sweep_replay(configs, click_points, writers, binarize_th=64)
+        for writer in writers:
+            writer.close()
+
+        # 結果は設定ごとのストリームファイルに書き込む
+        records = [list(read_stream(writer.path)) for writer in writers]
+        assert [len(r) for r in records] == [4, 4]
+        assert [r["results"] for r in records[0]] == [1234] * 4
+        assert [r["timestamps"] for r in records[0]] == [
+            "0:00:00",
+            "0:00:03",
+            "0:00:06",
+            "0:00:09",
+        ]
+        thresholds = [c[0][1] for c in detector.predict_with_confidence.call_args_list]
+        assert thresholds.count(None) == 4
+        assert thresholds.count(128) == 4
+        assert 64 not in thresholds
+
+    @patch("cores.replay_sweep.get_detector")
+    def test_default_binarize_th(self, mock_get_detector, settings, click_points):
+        detector = Mock(crop_size=20)
+        detector.predict_with_confidence.return_value = (0, 0.0, [], [])
+        mock_get_detector.return_value = detector
+
+        sweep_replay([settings], click_points, [Mock()], binarize_th=64)
+
+        assert all(
+            c[0][1] == 64 for c in detector.predict_with_confidence.call_args_list
+        )
+
+    def test_different_videos(self, settings, click_points):
+        with pytest.raises(ValueError):
+            sweep_replay(
+                [settings, {**settings, "video_path": "other.mp4"}],
+                click_points,
+                [Mock(), Mock()],
+            )
+        with pytest.raises(ValueError):
+            sweep_replay([], click_points, [])
+        with pytest.raises(ValueError):
+            sweep_replay([settings], click_points, [])
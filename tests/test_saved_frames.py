@@ -0,0 +1,114 @@
+import pytest
+import cv2
+import numpy as np
+from cores.frame_archive import FrameArchiveWriter
+from cores.export_utils import export
+from cores.frame_writer import FrameWriter
+from cores.saved_frames import get_frame_dirs, saved_frames_generator
+from cores.settings_manager import SettingsManager
+
+
+@pytest.fixture
+def frame():
+    return np.full((100, 400, 3), 128, dtype=np.uint8)
+
+
+def save_frame_files(frame_dir, frame_indices, frame, ext="png"):
+    frame_dir.mkdir(parents=True, exist_ok=True)
+    for i in frame_indices:
+        if ext == "npy":
+            np.save(frame_dir / f"frame_{i:06d}.npy", frame)
+        else:
+            cv2.imwrite(str(frame_dir / f"frame_{i:06d}.{ext}"), frame)
+
+
+class TestSavedFrames:
+    @pytest.mark.parametrize("ext", ["jpg", "png", "npy"])
+    def test_frame_files(self, frame, ext, tmp_path):
+        save_frame_files(tmp_path, [0, 1, 2, 30, 31, 32, 60, 61], frame, ext)
+
+        samples = list(
+            saved_frames_generator(tmp_path, sampling_sec=10, video_skip_sec=5)
+        )
+
+        assert [len(frames) for frames, _ in samples] == [3, 3, 2]
+        assert [timestamp for _, timestamp in samples] == [
+            "0:00:05",
+            "0:00:15",
+            "0:00:25",
+        ]
+        assert samples[0][0][0].shape == frame.shape
+
+    @pytest.mark.parametrize("ext", ["png", "npy"])
+    def test_frame_files_with_sample_id(self, frame, ext, tmp_path):
+        # live と同様にサンプルをまたいで連番で保存し、サンプル 1 の1枚目は破棄された場合
+        with FrameWriter(tmp_path, frame_format=ext) as writer:
+            for i in [0, 1, 3, 4, 5]:
+                writer.write(i, frame, sample_id=i // 2)
+
+        samples = list(saved_frames_generator(tmp_path, sampling_sec=10))
+
+        assert [len(frames) for frames, _ in samples] == [2, 1, 2]
+        assert [timestamp for _, timestamp in samples] == [
+            "0:00:00",
+            "0:00:10",
+            "0:00:20",
+        ]
+
+    def test_live_output(self, frame, tmp_path):
+        # live.py と同じく、設定ファイルと通し番号のフレームを出力する
+        live_manager = SettingsManager("live")
+        settings = {k: v["default"] for k, v in live_manager.required_keys.items()}
+        settings.update(out_dir=str(tmp_path), sampling_sec=5)
+        export(settings, format="json", out_dir=tmp_path, prefix="settings")
+        writer = FrameWriter(tmp_path / "frames", frame_format="png")
+        for i, sample_id in enumerate([0, 0, 0, 1, 1, 2, 2, 2]):
+            writer.write(i, frame, sample_id=sample_id, timestamp=i * 0.1)
+        writer.close()
+
+        settings = SettingsManager("replay").load(
+            tmp_path / "settings.json", fill_defaults=["video_path", "video_skip_sec"]
+        )
+        samples = list(
+            saved_frames_generator(
+                tmp_path / "frames",
+                sampling_sec=settings["sampling_sec"],
+                video_skip_sec=settings["video_skip_sec"],
+            )
+        )
+
+        assert [len(frames) for frames, _ in samples] == [3, 2, 3]
+        assert [timestamp for _, timestamp in samples] == [
+            "0:00:00",
+            "0:00:05",
+            "0:00:10",
+        ]
+
+    def test_frame_archive(self, frame, tmp_path):
+        with FrameArchiveWriter(tmp_path) as writer:
+            for i in range(6):
+                writer.append(frame, i, sample_id=i // 3, timestamp=(i // 3) * 10.0)
+
+        samples = list(saved_frames_generator(tmp_path))
+
+        assert [len(frames) for frames, _ in samples] == [3, 3]
+        assert [timestamp for _, timestamp in samples] == ["0:00:00", "0:00:10"]
+
+    def test_segments(self, frame, tmp_path):
+        save_frame_files(tmp_path / "segment_00", [0, 1, 30, 31], frame)
+        save_frame_files(tmp_path / "segment_01", [0, 1], frame)
+
+        assert get_frame_dirs(tmp_path) == [
+            tmp_path / "segment_00",
+            tmp_path / "segment_01",
+        ]
+        samples = list(saved_frames_generator(tmp_path, sampling_sec=10))
+        assert [timestamp for _, timestamp in samples] == [
+            "0:00:00",
+            "0:00:10",
+            "0:00:20",
+        ]
+
+    def test_not_found(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            next(saved_frames_generator(tmp_path))
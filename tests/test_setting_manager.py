@@ -2,6 +2,7 @@ from cores.settings_manager import SettingsManager
 from pathlib import Path
 import json
 import os
+import pytest
 
 
 class TestSettingsManager:
@@ -40,6 +41,20 @@ class TestSettingsManager:
         output = self.setting_manager.load(self.setting_path)
         assert output == expected_setting
 
+    def test_load_setting_fill_defaults(self):
+        replay_manager = SettingsManager("replay")
+        with pytest.raises(KeyError):
+            replay_manager.load(self.setting_path)
+
+        # ライブ解析の設定を再解析に使う場合は、動画に関するキーに既定値を使う
+        output = replay_manager.load(
+            self.setting_path, fill_defaults=["video_path", "video_skip_sec"]
+        )
+        assert output["video_path"] == ""
+        assert output["video_skip_sec"] == 0
+        assert output["sampling_sec"] == 10
+        assert "device_num" not in output
+
     def test_validate_setting(self):
         assert self.setting_manager.validate(self.expected_setting) is True
 
@@ -53,3 +68,86 @@ class TestSettingsManager:
         expected_setting = self.expected_setting.copy()
         expected_setting.pop("this_is")
         assert output == expected_setting
+
+
+class TestOptionalSettings:
+    def setup_class(self):
+        self.setting_manager = SettingsManager("replay")
+        self.settings = {
+            "video_path": "tests",
+            "video_skip_sec": 0,
+            "num_digits": 4,
+            "sampling_sec": 10,
+            "batch_frames": 10,
+            "format": "csv",
+            "save_frame": False,
+            "out_dir": "tests",
+            "click_points": [],
+        }
+
+    def test_validate_without_optional_keys(self):
+        assert self.setting_manager.validate(self.settings) is True
+
+    def test_validate_optional_keys(self):
+        assert self.setting_manager.validate({**self.settings, "workers": 4}) is True
+        assert self.setting_manager.validate({**self.settings, "workers": 0}) is False
+        assert (
+            self.setting_manager.validate({**self.settings, "prefetch_batches": 0})
+            is True
+        )
+        assert (
+            self.setting_manager.validate({**self.settings, "prefetch_batches": -1})
+            is False
+        )
+        assert (
+            self.setting_manager.validate({**self.settings, "gray_decode": True})
+            is True
+        )
+        assert (
+            self.setting_manager.validate({**self.settings, "gray_decode": 1}) is False
+        )
+        assert (
+            self.setting_manager.validate({**self.settings, "frame_source": "ffmpeg"})
+            is True
+        )
+        assert (
+            self.setting_manager.validate({**self.settings, "frame_source": "pyav"})
+            is False
+        )
+        assert (
+            self.setting_manager.validate({**self.settings, "frame_format": "npy"})
+            is True
+        )
+        assert (
+            self.setting_manager.validate({**self.settings, "frame_format": "bmp"})
+            is False
+        )
+        assert (
+            self.setting_manager.validate(
+                {**self.settings, "inference": {"num_threads": 2}}
+            )
+            is True
+        )
+        assert (
+            self.setting_manager.validate(
+                {**self.settings, "inference": {"num_threads": -1}}
+            )
+            is False
+        )
+
+    def test_remove_non_require_keys_keeps_optional(self):
+        output = self.setting_manager.remove_non_require_keys(
+            {**self.settings, "workers": 4, "this_is": "missing"}
+        )
+        assert output == {**self.settings, "workers": 4}
+
+    def test_merge_runtime_options(self):
+        output = self.setting_manager.merge_runtime_options(
+            {**self.settings, "workers": 4, "skip_mode": "seek"},
+            {"workers": 2, "skip_mode": None, "gray_decode": None},
+        )
+
+        # 引数で指定した値、設定ファイルの値、既定値の順に優先する
+        assert output["workers"] == 2
+        assert output["skip_mode"] == "seek"
+        assert output["gray_decode"] is False
@@ -0,0 +1,148 @@
+import csv
+import json
+import pytest
+from unittest.mock import patch
+from cores.export_utils import build_data_records, export
+from cores.stream_export import (
+    ResultStreamWriter,
+    finalize_stream,
+    get_supported_stream_formats,
+    read_stream,
+    resolve_stream_format,
+)
+from gui.utils.exporter import export_result
+
+
+@pytest.fixture
+def data_dict():
+    return {
+        "results": [1234, 1235, None],
+        "failed_rates": [0.0, 0.25, 1.0],
+        "timestamps": ["0:00:00", "0:00:03", "0:00:06"],
+        "confidences": [[1.0, 0.9, 0.8, 0.7], [0.5] * 4, [0.0] * 4],
+        "entropies": [[0.0] * 4, [0.1] * 4, [0.2] * 4],
+    }
+
+
+def write_stream(out_dir, stream_format, records, **kwargs):
+    with ResultStreamWriter(out_dir, stream_format=stream_format, **kwargs) as writer:
+        for record in records:
+            writer.write(record)
+    return writer.path
+
+
+class TestStreamExport:
+    def test_resolve_stream_format(self):
+        assert resolve_stream_format("csv") == "csv"
+        assert resolve_stream_format("json") == "ndjson"
+        assert resolve_stream_format("json", "binary") == "binary"
+        with pytest.raises(ValueError):
+            resolve_stream_format("json", "csv")
+        with pytest.raises(ValueError):
+            resolve_stream_format("json", "xml")
+
+    def test_invalid_stream_format(self, tmp_path):
+        with pytest.raises(ValueError):
+            ResultStreamWriter(tmp_path, stream_format="xml")
+
+    @pytest.mark.parametrize("stream_format", ["ndjson", "binary"])
+    def test_read_stream(self, tmp_path, data_dict, stream_format):
+        records = build_data_records(data_dict)
+        path = write_stream(tmp_path, stream_format, records)
+
+        assert list(read_stream(path)) == records
+
+    @pytest.mark.parametrize("stream_format", get_supported_stream_formats())
+    def test_finalize_matches_export(self, tmp_path, data_dict, stream_format):
+        records = build_data_records(data_dict)
+        export(records, format="csv", out_dir=tmp_path / "expected", prefix="result")
+        export(records, format="json", out_dir=tmp_path / "expected", prefix="result")
+
+        formats = ["csv"] if stream_format == "csv" else ["csv", "json"]
+        for format in formats:
+            path = write_stream(tmp_path / "stream", stream_format, records)
+            finalize_stream(path, format, tmp_path / format, "result")
+
+            # 終了時に export と同じ内容のファイルに変換し、ストリームファイルは削除する
+            expected = (tmp_path / "expected" / f"result.{format}").read_text()
+            assert (tmp_path / format / f"result.{format}").read_text() == expected
+            assert not path.exists()
+
+    def test_finalize_empty(self, tmp_path):
+        path = write_stream(tmp_path, "ndjson", [])
+        finalize_stream(path, "json", tmp_path, "result")
+
+        assert json.loads((tmp_path / "result.json").read_text()) == []
+
+    def test_finalize_csv_stream_to_json(self, tmp_path, data_dict):
+        path = write_stream(tmp_path, "csv", build_data_records(data_dict))
+
+        with pytest.raises(ValueError):
+            finalize_stream(path, "json", tmp_path, "result")
+
+    @pytest.mark.parametrize("stream_format", ["ndjson", "binary"])
+    def test_read_incomplete_stream(self, tmp_path, data_dict, stream_format):
+        records = build_data_records(data_dict)
+        path = write_stream(tmp_path, stream_format, records)
+
+        # 書き込み途中で異常終了した場合を再現する
+        with open(path, "r+b") as f:
+            f.truncate(path.stat().st_size - 5)
+
+        assert list(read_stream(path)) == records[:-1]
+
+    @patch("os.fsync")
+    def test_flush_schedule(self, mock_fsync, tmp_path, data_dict):
+        records = build_data_records(data_dict)
+        writer = ResultStreamWriter(
+            tmp_path, stream_format="ndjson", flush_sec=0, fsync_sec=3600
+        )
+        writer.write(records[0])
+
+        # フラッシュ済みの結果は閉じる前に読み込める
+        assert list(read_stream(writer.path)) == records[:1]
+        mock_fsync.assert_not_called()
+
+        writer.fsync_sec = 0
+        writer.write(records[1])
+        mock_fsync.assert_called_once()
+
+        writer.close()
+        assert mock_fsync.call_count == 2
+        with pytest.raises(ValueError):
+            writer.write(records[2])
+
+    def test_csv_stream(self, tmp_path, data_dict):
+        records = build_data_records(data_dict)
+        path = write_stream(tmp_path, "csv", records)
+
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        assert [row["timestamps"] for row in rows] == data_dict["timestamps"]
+
+
+class TestExportResult:
+    def test_export_result_from_stream(self, tmp_path, data_dict):
+        records = build_data_records(data_dict)
+        path = write_stream(tmp_path, "ndjson", records)
+
+        export_result(
+            {
+                "results": [],
+                "failed_rates": [],
+                "timestamps": [],
+                "format": "json",
+                "out_dir": str(tmp_path),
+                "result_stream": str(path),
+            }
+        )
+
+        assert json.loads((tmp_path / "result.json").read_text()) == records
+        assert not path.exists()
+
+    def test_export_result_without_stream(self, tmp_path, data_dict):
+        export_result({**data_dict, "format": "json", "out_dir": str(tmp_path)})
+
+        assert json.loads((tmp_path / "result.json").read_text()) == (
+            build_data_records(data_dict)
+        )
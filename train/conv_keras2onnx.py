@@ -2,17 +2,22 @@ import tensorflow as tf
 from tensorflow.keras.models import load_model
 import subprocess
 import shutil
+import sys
+
+# モデルの入力サイズ（例: python train/conv_keras2onnx.py 28）
+model_size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+model_base = f"model/model_{model_size}x{model_size}"
 
 # Kerasモデルのロード
-model_path = "model/model_100x100.keras"
+model_path = model_base + ".keras"
 model = load_model(model_path)
 
 # SavedModel形式で保存
-saved_model_path = "model/model_100x100"
+saved_model_path = model_base
 tf.saved_model.save(model, saved_model_path)
 
 # ONNX形式に変換
-onnx_model_path = "model/model_100x100.onnx"
+onnx_model_path = model_base + ".onnx"
 subprocess.run(
     [
         "python",
@@ -1,8 +1,12 @@
 from tensorflow.keras.models import load_model
 from tensorflow.lite.TFLiteConverter import from_keras_model
+import sys
+
+# モデルの入力サイズ（例: python train/conv_keras2tf.py 28）
+model_size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
 
 # Kerasモデルの読み込み
-model_path = "model/model_100x100.keras"
+model_path = f"model/model_{model_size}x{model_size}.keras"
 model = load_model(model_path)
 
 # TFLite Converterを使って変換
@@ -10,7 +14,7 @@ converter = from_keras_model(model)
 tflite_model = converter.convert()
 
 # 変換後のモデルを保存
-filename = "model/model_100x100.tflite"
+filename = f"model/model_{model_size}x{model_size}.tflite"
 with open(filename, "wb") as f:
     f.write(tflite_model)
 
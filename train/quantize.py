@@ -0,0 +1,208 @@
+# 学習済みモデルを INT8 に量子化し、test.py と同じテストデータで精度を比較する
+#
+# ONNX Runtime の静的量子化と TFLite の整数量子化を、保存済みの桁画像を代表データとして行う。
+# 入出力は float32 のまま残すため、cores/cnn_onnx.py と cores/cnn_tflite.py はそのまま使える。
+#
+# 使い方: python train/quantize.py [onnx|tflite] [入力サイズ]（省略時は両方、100x100）
+
+import glob
+import json
+import os
+import sys
+import cv2
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+# ===========
+# 設定
+# ===========
+# 代表データとして使う桁画像のフォルダ（クラスごとのサブフォルダ）
+calibration_data_path = "datasets"
+num_calibration_images = 300  # 量子化の校正に使う画像の枚数
+
+model_size = next((int(arg) for arg in sys.argv[1:] if arg.isdigit()), 100)
+# 量子化前のモデル（拡張子なし）
+float_model_base = f"model/model_{model_size}x{model_size}"
+int8_model_base = float_model_base + "_int8"  # 量子化後のモデル（拡張子なし）
+report_path = int8_model_base + "_report.json"  # 精度の比較結果の保存先
+
+image_width = model_size
+image_height = model_size
+
+folder = [
+    "0",
+    "1",
+    "2",
+    "3",
+    "4",
+    "5",
+    "6",
+    "7",
+    "8",
+    "9",
+    "blank",
+]
+
+
+# ===========
+# データ読み込み
+# ===========
+def load_dataset(data_path):
+    """桁画像とラベルを読み込み、推論時と同じ形式 (N, H, W, 1) の float32 に正規化する"""
+    images = []
+    labels = []
+    for index, name in enumerate(folder):
+        files = glob.glob(os.path.join(data_path, name, "*.jpg"))
+        for file in files:
+            img = cv2.imread(file, cv2.IMREAD_GRAYSCALE)
+            img = cv2.resize(
+                img, (image_width, image_height), interpolation=cv2.INTER_NEAREST
+            )
+            images.append(img.reshape(image_height, image_width, 1))
+            labels.append(index)
+    images = np.array(images, dtype=np.float32) / 255.0
+    return images, np.array(labels)
+
+
+def split_dataset(images, labels):
+    """test.py と同じ分割で校正用とテスト用に分ける"""
+    X_calib, X_test, _, Y_test = train_test_split(
+        images, labels, test_size=0.1, random_state=42
+    )
+    rng = np.random.default_rng(0)
+    indices = rng.permutation(len(X_calib))[:num_calibration_images]
+    return X_calib[indices], X_test, Y_test
+
+
+# ===========
+# ONNX Runtime の静的量子化
+# ===========
+def quantize_onnx(calibration_images):
+    from onnxruntime.quantization import (
+        CalibrationDataReader,
+        QuantFormat,
+        QuantType,
+        quantize_static,
+    )
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+    import onnxruntime as ort
+
+    float_model_path = float_model_base + ".onnx"
+    int8_model_path = int8_model_base + ".onnx"
+    preprocessed_path = int8_model_base + "_preprocessed.onnx"
+    input_name = ort.InferenceSession(float_model_path).get_inputs()[0].name
+
+    class DigitDataReader(CalibrationDataReader):
+        def __init__(self, images):
+            self.iterator = iter(images)
+
+        def get_next(self):
+            image = next(self.iterator, None)
+            if image is None:
+                return None
+            return {input_name: image[np.newaxis]}
+
+    # 量子化の前にグラフを最適化し、形状を推論しておく
+    quant_pre_process(float_model_path, preprocessed_path)
+    quantize_static(
+        preprocessed_path,
+        int8_model_path,
+        DigitDataReader(calibration_images),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+    os.remove(preprocessed_path)
+    print(f"ONNX INT8 model saved as {int8_model_path}")
+    return float_model_path, int8_model_path
+
+
+def predict_onnx(model_path, images):
+    import onnxruntime as ort
+
+    session = ort.InferenceSession(model_path)
+    input_name = session.get_inputs()[0].name
+    return session.run(None, {input_name: images})[0].argmax(axis=1)
+
+
+# ===========
+# TFLite の整数量子化
+# ===========
+def quantize_tflite(calibration_images):
+    import tensorflow as tf
+    from tensorflow.keras.models import load_model
+
+    model = load_model(float_model_base + ".keras")
+
+    def representative_dataset():
+        for image in calibration_images:
+            yield [image[np.newaxis]]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    tflite_model = converter.convert()
+
+    int8_model_path = int8_model_base + ".tflite"
+    with open(int8_model_path, "wb") as f:
+        f.write(tflite_model)
+    print(f"TFLite INT8 model saved as {int8_model_path}")
+    return float_model_base + ".tflite", int8_model_path
+
+
+def predict_tflite(model_path, images):
+    import tensorflow as tf
+
+    interpreter = tf.lite.Interpreter(model_path=model_path)
+    input_index = interpreter.get_input_details()[0]["index"]
+    interpreter.resize_tensor_input(input_index, list(images.shape))
+    interpreter.allocate_tensors()
+    interpreter.set_tensor(input_index, images)
+    interpreter.invoke()
+    output_index = interpreter.get_output_details()[0]["index"]
+    return interpreter.get_tensor(output_index).argmax(axis=1)
+
+
+# ===========
+# 精度の比較
+# ===========
+def evaluate(predict, float_model_path, int8_model_path, X_test, Y_test):
+    float_pred = predict(float_model_path, X_test)
+    int8_pred = predict(int8_model_path, X_test)
+    result = {
+        "float_model": float_model_path,
+        "int8_model": int8_model_path,
+        "num_test_images": int(len(X_test)),
+        "float_accuracy": float(np.mean(float_pred == Y_test)),
+        "int8_accuracy": float(np.mean(int8_pred == Y_test)),
+        "agreement": float(np.mean(float_pred == int8_pred)),
+    }
+    print(f"===== {os.path.basename(int8_model_path)} =====")
+    print(f"Float accuracy: {result['float_accuracy']*100:.2f}%")
+    print(f"INT8 accuracy: {result['int8_accuracy']*100:.2f}%")
+    print(f"Agreement with float model: {result['agreement']*100:.2f}%")
+    return result
+
+
+if __name__ == "__main__":
+    targets = [arg for arg in sys.argv[1:] if not arg.isdigit()] or ["onnx", "tflite"]
+
+    images, labels = load_dataset(calibration_data_path)
+    if len(images) == 0:
+        raise FileNotFoundError(f"No images found in {calibration_data_path}")
+    calibration_images, X_test, Y_test = split_dataset(images, labels)
+    print(f"校正用: {len(calibration_images)} 枚、テスト用: {len(X_test)} 枚")
+
+    report = []
+    if "onnx" in targets:
+        model_paths = quantize_onnx(calibration_images)
+        report.append(evaluate(predict_onnx, *model_paths, X_test, Y_test))
+    if "tflite" in targets:
+        model_paths = quantize_tflite(calibration_images)
+        report.append(evaluate(predict_tflite, *model_paths, X_test, Y_test))
+
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Report saved as {report_path}")
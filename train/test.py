@@ -5,6 +5,7 @@ from tensorflow.keras.utils import load_img, img_to_array, to_categorical
 from tensorflow.keras.models import load_model
 import matplotlib.pyplot as plt
 import os
+import sys
 
 # 評価用ライブラリ
 from sklearn.metrics import confusion_matrix, classification_report
@@ -14,10 +15,11 @@ import seaborn as sns
 # 設定
 # ===========
 test_data_path = "datasets"  # テストに使用するデータセット(例: 同じフォルダを流用)
-model_path = "model/model_100x100.keras"  # train.py で保存したモデル
+model_size = int(sys.argv[1]) if len(sys.argv) > 1 else 100  # モデルの入力サイズ
+model_path = f"model/model_{model_size}x{model_size}.keras"  # train.py で保存したモデル
 
-image_width = 100
-image_height = 100
+image_width = model_size
+image_height = model_size
 color_setting = 1  # 1:モノクロ、3:カラー
 
 folder = [
@@ -11,6 +11,7 @@ from tensorflow.keras.layers import Conv2D, MaxPooling2D
 from tensorflow.keras.layers import Dense, Dropout, Flatten
 from tensorflow.keras.optimizers import Adam
 import matplotlib.pyplot as plt
+import sys
 import time
 
 
@@ -19,8 +20,10 @@ import time
 # からデータセットをダウンロードして解凍し、train_data_pathにフォルダ名を入力してください。
 train_data_path = "datasets"  # zipファイルを解凍後の、データセットのフォルダ名
 
-image_width = 100  # 必要に応じて変更してください。「28」を指定した場合、縦の高さ28ピクセルの画像に変換します。
-image_height = 100  # 必要に応じて変更してください。「28」を指定した場合、横の幅28ピクセルの画像に変換します。
+# 入力サイズは引数で指定できます（例: python train/train.py 28）。28・48 などの小さいモデルは切り出しと推論が速くなります。
+model_size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+image_width = model_size  # 必要に応じて変更してください。「28」を指定した場合、縦の高さ28ピクセルの画像に変換します。
+image_height = model_size  # 必要に応じて変更してください。「28」を指定した場合、横の幅28ピクセルの画像に変換します。
 # 画像のサイズは、原寸大や長方形などでも試してみましたが、少ない学習回数で実際の正解率が高いのは28*28の正方形でした。
 color_setting = 1  # ここを変更。データセット画像のカラー指定：「1」はモノクロ・グレースケール。「3」はカラーとして画像を処理。
 
@@ -86,7 +89,7 @@ model.add(
         16,
         (3, 3),
         padding="same",
-        input_shape=(image_width, image_height, color_setting),
+        input_shape=(image_height, image_width, color_setting),
         activation="relu",
     )
 )
@@ -145,7 +148,8 @@ print("Computation time（計算時間）:{0:.3f} sec（秒）".format(time.time
 
 # 学習済みモデル（モデル構造と学習済みの重み）の保存
 
-model.save("model/model_100x100.keras")
+# 入力サイズごとに model_{幅}x{高さ}.keras として保存し、推論時は --model-size で選択する
+model.save(f"model/model_{image_width}x{image_height}.keras")
 # model.save('keras_cnn_7segment_digits_gray28*28_model.keras')
 # model.save('keras_cnn_7segment_digits_color28*28_model.keras')
 # #カラー形式の学習済みモデルの例：color_setting = 3 にした場合